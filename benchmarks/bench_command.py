@@ -0,0 +1,68 @@
+"""Compare IGV.command throughput with and without connection reuse.
+
+Also measures IGV.batch, which pipelines all the commands at once.
+
+Runs against the TCPRequestHandler stand-in used by the unit tests::
+
+    $ python benchmarks/bench_command.py 2000
+
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from igvcontrol import helpers
+from igvcontrol.tests.test_helpers import TCPRequestHandler, TCPServer
+
+
+def one_session_per_command(host, port, command):
+    """Send command the way IGV.command did before connection pooling."""
+    with helpers.TelnetManager(host, port) as t:
+        t.write(bytes(command, "ascii"))
+        return str(t.read_until(b"\n"), "ascii")
+
+
+def commands_per_second(send, n):
+    """Return how many times per second send() can be called."""
+    start = time.time()
+    for i in range(n):
+        send("goto chr1:{}\n".format(i + 1))
+
+    return n / (time.time() - start)
+
+
+def main(n=1000):
+    server = TCPServer(("localhost", 0), TCPRequestHandler)
+    host, port = server.server_address
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    try:
+        before = commands_per_second(
+            lambda c: one_session_per_command(host, port, c), n)
+        controller = helpers.IGV(host, port,
+                                 pool=helpers.ConnectionPool())
+        after = commands_per_second(controller.command, n)
+
+        start = time.time()
+        controller.batch(["goto chr1:{}".format(i + 1) for i in range(n)])
+        pipelined = n / (time.time() - start)
+        controller.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print("{} commands".format(n))
+    print("one session per command: {:10.0f} commands/s".format(before))
+    print("pooled connection:       {:10.0f} commands/s".format(after))
+    print("pipelined batch:         {:10.0f} commands/s".format(pipelined))
+    print("speedup:                 {:10.1f}x / {:.1f}x".format(
+        after / before, pipelined / before))
+
+
+if __name__ == "__main__":
+    main(*[int(_) for _ in sys.argv[1:2]])
@@ -0,0 +1,67 @@
+"""Time the filters on millions of variants.
+
+Filters a synthetic store by a BED-like list of intervals and chromosomes,
+and a synthetic VCF by QUAL/FILTER/INFO conditions::
+
+    $ python benchmarks/bench_filter.py 2000000 20000  # variants, intervals
+
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from igvcontrol import filters, helpers
+from bench_vcf import write_vcf
+
+
+def random_store(count):
+    store = helpers.VariantStore()
+    for _ in range(count):
+        store.append("chr{}".format(random.randint(1, 22)),
+                     random.randint(1, 200000000))
+
+    return store
+
+
+def random_intervals(count):
+    for _ in range(count):
+        start = random.randint(0, 200000000)
+        yield ("chr{}".format(random.randint(1, 22)), start,
+               start + random.randint(100, 5000))
+
+
+def main(count=2000000, intervals=20000):
+    store = random_store(count)
+    regions = filters.IntervalIndex.from_intervals(random_intervals(intervals))
+
+    start = time.time()
+    kept = filters.VariantFilter(regions=regions,
+                                 chroms=["1", "2", "X"]).apply(store)
+    print("regions and chroms: {} of {} variants in {:.2f}s".format(
+        len(kept), count, time.time() - start))
+
+    records = count // 10
+    with tempfile.NamedTemporaryFile("w", suffix=".vcf",
+                                     delete=False) as vcffile:
+        write_vcf(vcffile, records, 10)
+    try:
+        variants = helpers.Variants(vcffile.name)
+        start = time.time()
+        kept = filters.VariantFilter(
+            expressions=["QUAL>=30", "FILTER==PASS", "INFO/DP>50"]).apply(
+                variants)
+        elapsed = time.time() - start
+    finally:
+        os.remove(vcffile.name)
+
+    print("QUAL/FILTER/INFO: {} of {} records in {:.2f}s ({:.0f} "
+          "records/s)".format(len(kept), records, elapsed,
+                              records / elapsed))
+
+
+if __name__ == "__main__":
+    main(*[int(_) for _ in sys.argv[1:3]])
@@ -0,0 +1,71 @@
+"""Compare records/s of the PyVCF path and the fast VCF line parser.
+
+Writes a synthetic VCF with many samples to a temporary file::
+
+    $ python benchmarks/bench_vcf.py 20000 1000  # records, samples
+
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from igvcontrol import helpers
+
+HEADER = """##fileformat=VCFv4.0
+##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">
+##INFO=<ID=AF,Number=.,Type=Float,Description="Allele Frequency">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype Quality">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">
+"""
+
+
+def write_vcf(vcffile, records, samples):
+    """Write a VCF with records lines of samples genotypes each."""
+    vcffile.write(HEADER)
+    vcffile.write("\t".join(
+        ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO",
+         "FORMAT"] + ["S{}".format(_) for _ in range(samples)]) + "\n")
+
+    genotypes = ["0/0:40:12", "0/1:35:20", "1/1:50:18", "./.:.:."]
+    position = 0
+    for i in range(records):
+        position += random.randint(1, 5000)
+        vcffile.write("\t".join(
+            [str(i % 22 + 1), str(position), ".", "A", "G", "50", "PASS",
+             "DP=100;AF=0.5", "GT:GQ:DP"] +
+            [random.choice(genotypes) for _ in range(samples)]) + "\n")
+
+
+def records_per_second(generator):
+    start = time.time()
+    count = sum(1 for _ in generator)
+
+    return count / (time.time() - start)
+
+
+def main(records=5000, samples=500):
+    with tempfile.NamedTemporaryFile("w", suffix=".vcf",
+                                     delete=False) as vcffile:
+        write_vcf(vcffile, records, samples)
+
+    try:
+        variants = helpers.Variants(vcffile.name)
+        pyvcf = records_per_second(
+            variants.vcf_generator(variants.records()))
+        fast = records_per_second(variants.vcf_line_generator())
+    finally:
+        os.remove(vcffile.name)
+
+    print("{} records x {} samples".format(records, samples))
+    print("PyVCF records: {:12.0f} records/s".format(pyvcf))
+    print("fast path:     {:12.0f} records/s".format(fast))
+    print("speedup:       {:12.1f}x".format(fast / pyvcf))
+
+
+if __name__ == "__main__":
+    main(*[int(_) for _ in sys.argv[1:3]])
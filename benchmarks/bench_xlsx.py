@@ -0,0 +1,70 @@
+"""Compare rows/s and peak memory of xlrd and the streaming XLSX reader.
+
+Writes a synthetic workbook to a temporary file::
+
+    $ python benchmarks/bench_xlsx.py 200000  # rows
+
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from igvcontrol import helpers, xlsx
+
+
+def rows(count):
+    yield ("Chr", "Start", "End", "Ref", "Alt", "Gene", "Depth")
+    position = 0
+    for i in range(count):
+        position += random.randint(1, 5000)
+        yield ("chr{}".format(i % 22 + 1), position, position, "A", "G",
+               "GENE{}".format(i % 500), random.randint(10, 200))
+
+
+def measure(load):
+    """Return (rows/s, peak MB) of reading every variant from load()."""
+    tracemalloc.start()
+    start = time.time()
+    count = sum(1 for _ in load())
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return count / elapsed, peak / 1024 / 1024
+
+
+def main(count=50000):
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as book:
+        pass
+    xlsx.write_xlsx(book.name, [("variants", rows(count))])
+
+    try:
+        def with_xlrd():
+            from xlrd import open_workbook
+            sheet = open_workbook(book.name).sheet_by_index(0)
+            return helpers.Variants.xls_generator(sheet)
+
+        def streamed():
+            variants = helpers.Variants(book.name)
+            variants.loadxls()
+            return variants.variants
+
+        xlrd_speed, xlrd_peak = measure(with_xlrd)
+        stream_speed, stream_peak = measure(streamed)
+    finally:
+        os.remove(book.name)
+
+    print("{} rows".format(count))
+    print("xlrd:     {:10.0f} rows/s {:8.1f} MB peak".format(xlrd_speed,
+                                                            xlrd_peak))
+    print("streamed: {:10.0f} rows/s {:8.1f} MB peak".format(stream_speed,
+                                                            stream_peak))
+
+
+if __name__ == "__main__":
+    main(*[int(_) for _ in sys.argv[1:2]])
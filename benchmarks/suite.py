@@ -0,0 +1,283 @@
+"""Benchmark the parsers and the socket throughput, and compare baselines.
+
+Every case runs in a fresh process, on synthetic files written to a
+temporary directory and against a mock IGV (igvcontrol.mockigv) that answers
+after a configurable latency, so it needs no network nor IGV::
+
+    $ python benchmarks/suite.py --save baseline.json
+    $ python benchmarks/suite.py --compare baseline.json
+
+Each case reports its throughput (records/s or commands/s), that of its
+fastest run (it's repeated for --min-time seconds, in --repeat
+processes), and the peak RSS of its process. --compare exits with status
+1 if a case got slower, or bigger, than the baseline by more than
+--tolerance.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from igvcontrol import helpers, mockigv, xlsx
+from bench_vcf import write_vcf
+
+
+def write_tab(path, records):
+    """Write a TAB file of records variants, with a header line."""
+    with open(path, "w") as tabfile:
+        tabfile.write("Chr\tStart\tEnd\tRef\tAlt\tGene\n")
+        position = 0
+        for i in range(records):
+            position += random.randint(1, 5000)
+            tabfile.write("chr{0}\t{1}\t{1}\tA\tG\tGENE{2}\n".format(
+                i % 22 + 1, position, i % 500))
+
+
+def xlsx_rows(records):
+    yield ("Chr", "Position", "Gene")
+    position = 0
+    for i in range(records):
+        position += random.randint(1, 5000)
+        yield ("chr{}".format(i % 22 + 1), position,
+               "GENE{}".format(i % 500))
+
+
+def count_variants(path):
+    """Return how many variants helpers.Variants reads from path."""
+    return sum(1 for _ in helpers.Variants(path))
+
+
+def bench_tab(directory, size):
+    path = os.path.join(directory, "variants.tab")
+    if not os.path.exists(path):
+        write_tab(path, size["records"])
+
+    start = time.time()
+    count = count_variants(path)
+
+    return count, time.time() - start, "records/s"
+
+
+def bench_vcf(directory, size):
+    path = os.path.join(directory, "variants.vcf")
+    if not os.path.exists(path):
+        with open(path, "w") as vcffile:
+            write_vcf(vcffile, size["records"], size["samples"])
+
+    start = time.time()
+    count = count_variants(path)
+
+    return count, time.time() - start, "records/s"
+
+
+def bench_xlsx(directory, size):
+    path = os.path.join(directory, "variants.xlsx")
+    if not os.path.exists(path):
+        xlsx.write_xlsx(path, [("variants", xlsx_rows(size["records"]))])
+
+    start = time.time()
+    count = count_variants(path)
+
+    return count, time.time() - start, "records/s"
+
+
+def igv_server(latency):
+    return mockigv.MockIGV(latency=latency, keep_requests=False).start()
+
+
+def bench_command(directory, size):
+    server = igv_server(size["latency"])
+    try:
+        igv = helpers.IGV(*server.server_address,
+                          pool=helpers.ConnectionPool())
+        start = time.time()
+        for i in range(size["commands"]):
+            igv.command("goto chr1:{}".format(i + 1))
+        elapsed = time.time() - start
+        igv.close()
+    finally:
+        server.stop()
+
+    return size["commands"], elapsed, "commands/s"
+
+
+def bench_batch(directory, size):
+    server = igv_server(size["latency"])
+    try:
+        igv = helpers.IGV(*server.server_address,
+                          pool=helpers.ConnectionPool())
+        start = time.time()
+        igv.batch(["goto chr1:{}".format(i + 1)
+                   for i in range(size["commands"])])
+        elapsed = time.time() - start
+        igv.close()
+    finally:
+        server.stop()
+
+    return size["commands"], elapsed, "commands/s"
+
+
+CASES = {
+    "tab": bench_tab,
+    "vcf": bench_vcf,
+    "xlsx": bench_xlsx,
+    "command": bench_command,
+    "batch": bench_batch}
+
+
+def run_case(name, size, seed=0, min_time=5.0):
+    """Run case name in this process. Return its fastest run as a dict.
+
+    The case runs again, on the files written by the first run, until
+    min_time seconds are spent timing it. Other processes slow some runs
+    down but never speed any up, so the fastest run is the one telling how
+    fast the code is.
+    """
+    random.seed(seed)
+    best, spent = None, 0.0
+    directory = tempfile.mkdtemp()
+    try:
+        while best is None or spent < min_time:
+            count, elapsed, unit = CASES[name](directory, size)
+            spent += elapsed
+            rate = count / elapsed if elapsed else float("inf")
+            if best is None or rate > best["rate"]:
+                best = {"count": count, "seconds": elapsed, "unit": unit,
+                        "rate": rate}
+    finally:
+        shutil.rmtree(directory)
+
+    # Kilobytes on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best["peak_rss_mb"] = peak / 1024
+
+    return best
+
+
+def run(names, size, repeat=3, min_time=5.0):
+    """Return the best of repeat runs of each case, each in a new process.
+
+    A spawned process starts with nothing loaded, so its peak RSS is the
+    one of the case alone.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(run_case, (name, size, 0,
+                                                  min_time)))
+        best = max(runs, key=lambda _: _["rate"])
+        best["peak_rss_mb"] = min(_["peak_rss_mb"] for _ in runs)
+        results[name] = best
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Return the lines of a report, and the names of the regressed cases."""
+    lines, regressed = [], []
+    for name, result in results.items():
+        before = baseline.get(name)
+        line = "{:8} {:12.0f} {:10} {:8.1f} MB".format(
+            name, result["rate"], result["unit"], result["peak_rss_mb"])
+        if before is None:
+            lines.append(line)
+            continue
+
+        speed = result["rate"] / before["rate"] - 1
+        memory = result["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        line += "  {:+6.1%} speed {:+6.1%} memory".format(speed, memory)
+        if speed < -tolerance or memory > tolerance:
+            regressed.append(name)
+            line += "  REGRESSION"
+        lines.append(line)
+
+    return lines, regressed
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parsers and the socket throughput")
+    parser.add_argument("cases", nargs="*", metavar="CASE",
+                        help="Cases to run, all of them by default: " +
+                        ", ".join(CASES))
+    parser.add_argument("--records", type=int, default=100000,
+                        help="Variants in the TAB and XLSX files")
+    parser.add_argument("--vcf-records", type=int, default=5000,
+                        help="Records in the VCF file")
+    parser.add_argument("--samples", type=int, default=500,
+                        help="Samples in the VCF file")
+    parser.add_argument("--commands", type=int, default=2000,
+                        help="Commands sent to the mock IGV")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="Seconds the mock IGV takes to answer")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs of each case, keeping the best")
+    parser.add_argument("--min-time", type=float, default=5.0,
+                        help="Seconds to keep repeating each case in a " +
+                        "process, keeping the fastest. Defaults to 5")
+    parser.add_argument("--save", metavar="FILE",
+                        help="Save the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Compare with a baseline saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Change allowed before a regression, 0.2 " +
+                        "is 20%%. Defaults to 0.2")
+
+    cmd_args = parser.parse_args(args)
+    unknown = set(cmd_args.cases) - set(CASES)
+    if unknown:
+        parser.error("unknown cases: {}".format(", ".join(sorted(unknown))))
+
+    return cmd_args
+
+
+def main(cmd_args):
+    size = {"records": cmd_args.records, "samples": cmd_args.samples,
+            "commands": cmd_args.commands, "latency": cmd_args.latency}
+    names = cmd_args.cases or list(CASES)
+
+    vcf_size = dict(size, records=cmd_args.vcf_records)
+    results = {}
+    for name in names:
+        results.update(run([name], vcf_size if name == "vcf" else size,
+                           cmd_args.repeat, cmd_args.min_time))
+
+    baseline = {}
+    if cmd_args.compare:
+        with open(cmd_args.compare) as baseline_file:
+            saved = json.load(baseline_file)
+        baseline = saved["results"]
+        if saved["size"] != size or saved["vcf_records"] != \
+                cmd_args.vcf_records:
+            print("Warning: the baseline used other sizes: {}".format(
+                saved["size"]))
+
+    lines, regressed = compare(results, baseline, cmd_args.tolerance)
+    print("{} on Python {}".format(platform.platform(),
+                                   platform.python_version()))
+    print("\n".join(lines))
+
+    if cmd_args.save:
+        with open(cmd_args.save, "w") as baseline_file:
+            json.dump({"size": size, "vcf_records": cmd_args.vcf_records,
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "results": results}, baseline_file, indent=2)
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,615 @@
+"""Control IGV through asyncio streams, without blocking the caller."""
+import asyncio
+from collections import Counter, deque
+import socket
+import threading
+import time
+
+try:
+    from igvcontrol import helpers
+except ImportError:
+    import helpers
+
+
+class AsyncIGV():
+
+    """IGV wrapper that talks to the batch port through asyncio streams.
+
+    It offers the same commands as helpers.IGV, but as coroutines::
+
+        >>> igv = AsyncIGV(port=60151)
+        >>> await igv.goto("chr1:123456", timeout=5)
+        True
+
+    timeout (seconds, None to wait forever) applies to every command that
+    doesn't set its own. A command that times out or is cancelled closes
+    the connection, as a late answer from IGV would be taken for the answer
+    of the next command. With a stats.Stats as stats, commands are timed.
+
+    With a policy.Policy as policy, commands without a timeout get the one
+    of the policy, and are retried and held back as it says (see
+    helpers.IGV).
+    """
+
+    def __init__(self, host="localhost", port=60151, timeout=None,
+                 connect_timeout=1, stats=None, policy=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.stats = stats
+        self.policy = policy
+        self.reader = None
+        self.writer = None
+        self._lock = None
+
+    @property
+    def lock(self):
+        # Created on first use, so it belongs to the loop running commands.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def is_open(self):
+        return self.writer is not None
+
+    @property
+    def endpoint(self):
+        return "{}:{}".format(self.host, self.port)
+
+    async def open(self, timer=None):
+        """Connect to IGV unless a connection is already open."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port),
+                self.connect_timeout)
+            if timer is not None:
+                timer.mark("connect")
+
+    async def close(self):
+        """Close the connection to IGV, freeing its batch port."""
+        self._drop()
+
+    def _drop(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def check_igv(self, timeout=None):
+        """Return True if a copy of IGV is reachable."""
+
+        response = await self.command("echo", timeout)
+
+        if response.startswith("echo"):
+            return True
+
+        self._drop()
+        return False
+
+    async def command(self, command, timeout=None):
+        """Return the response from IGV for command."""
+        if not command.endswith("\n"):
+            command += "\n"
+
+        return (await self.send_many([command], timeout))[0]
+
+    async def batch(self, commands, timeout=None):
+        """Return a CommandResult for each command, sent as a pipeline."""
+        commands = [_ if _.endswith("\n") else _ + "\n" for _ in commands]
+        responses = await self.send_many(commands, timeout)
+
+        return [helpers.CommandResult(c.rstrip("\n"), r, helpers.is_ok(r))
+                for c, r in zip(commands, responses)]
+
+    async def goto(self, position, timeout=None):
+        """Return "True" if IGV answered "OK" to a goto command."""
+
+        response = await self.command("goto {}".format(position), timeout)
+
+        return response.startswith("OK")
+
+    async def load(self, filepath, timeout=None):
+        """Return "True" if IGV answered "OK" to a load command."""
+
+        response = await self.command("load {}".format(filepath), timeout)
+
+        return response.startswith("OK")
+
+    async def snapshot(self, filename="", timeout=None):
+        """Return "True" if IGV answered "OK" to a snapshot command."""
+
+        response = await self.command(
+            "snapshot {}".format(filename).strip(), timeout)
+
+        return response.startswith("OK")
+
+    async def send_many(self, commands, timeout=None, window=64):
+        """Return the response lines for commands, in the same order.
+
+        Same contract as helpers.Connection.send_many. Raise socket.timeout
+        if IGV doesn't answer them all in timeout seconds.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        async with self.lock:
+            if self.policy is None:
+                return await self._attempt(commands, timeout, window)
+
+            attempt = 0
+            while True:
+                policy_timeout = self.policy.start(commands)
+                started = time.time()
+                try:
+                    responses = await self._attempt(
+                        commands, policy_timeout if timeout is None
+                        else timeout, window)
+                except (OSError, EOFError) as error:
+                    delay = self.policy.failed(commands, error, attempt)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                else:
+                    if None in responses:
+                        # Don't replay a list that broke halfway.
+                        self.policy.failed(commands, EOFError(),
+                                           self.policy.retries)
+                    else:
+                        self.policy.succeeded(commands,
+                                              time.time() - started)
+                    return responses
+
+    async def _attempt(self, commands, timeout, window):
+        """Send commands once, timed if there are stats."""
+        timer = self.stats.timer(self.is_open) if self.stats else None
+        outcome = "error"
+        try:
+            responses = await asyncio.wait_for(
+                self._send_many(commands, window, timer), timeout)
+            if None not in responses:
+                outcome = "ok" if all(
+                    helpers.is_ok(_) for _ in responses) else "igv_error"
+            return responses
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            self._drop()
+            raise socket.timeout(
+                "IGV didn't answer in {} seconds".format(timeout))
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            self._drop()
+            raise
+        finally:
+            if timer is not None:
+                self.stats.record(self.host, self.port, commands, timer,
+                                  outcome)
+
+    async def _send_many(self, commands, window, timer=None):
+        retries = 1 if self.is_open else 0
+        responses = []
+        while True:
+            try:
+                await self.open(timer)
+                pending = 0
+                for command in commands:
+                    self.writer.write(command.encode("ascii"))
+                    pending += 1
+                    if pending == window:
+                        await self.writer.drain()
+                        responses.append(await self._readline())
+                        pending -= 1
+                        if timer is not None:
+                            timer.mark_once("first_byte")
+
+                await self.writer.drain()
+                if timer is not None:
+                    timer.mark("write")
+                while pending:
+                    responses.append(await self._readline())
+                    pending -= 1
+                    if timer is not None:
+                        timer.mark_once("first_byte")
+
+                return responses
+            except (OSError, EOFError):
+                self._drop()
+                if responses:
+                    # Part of the list reached IGV. Don't replay it.
+                    return responses + [None] * (
+                        len(commands) - len(responses))
+                if not retries:
+                    raise
+                retries -= 1
+
+    async def _readline(self):
+        line = await self.reader.readline()
+        helpers.quick_ack(self.writer.get_extra_info("socket"))
+        if not line:
+            raise EOFError("IGV closed the connection")
+
+        return line.decode("ascii").rstrip("\r\n")
+
+
+async def broadcast(clients, command, timeout=None):
+    """Send command to every AsyncIGV in clients at the same time.
+
+    Return the responses in the order of clients. A client that failed
+    gets the exception raised instead of its response.
+    """
+    return await asyncio.gather(
+        *[_.command(command, timeout) for _ in clients],
+        return_exceptions=True)
+
+
+async def hammer(clients, commands):
+    """Have every AsyncIGV in clients send that many gotos, all at once.
+
+    Each client sends its next goto as soon as the last one is answered.
+    Return a Counter of the outcomes: "ok", "igv_error" for answers other
+    than OK and "error" for commands failed or not answered.
+    """
+    outcomes = Counter()
+
+    async def send(client):
+        for i in range(commands):
+            try:
+                ok = await client.goto("chr1:{}".format(i + 1))
+            except (OSError, EOFError):
+                outcomes["error"] += 1
+            else:
+                outcomes["ok" if ok else "igv_error"] += 1
+        await client.close()
+
+    await asyncio.gather(*[send(_) for _ in clients])
+
+    return outcomes
+
+
+class IGVGroup():
+
+    """Several copies of IGV driven as one, to keep their views in step.
+
+    It offers the coroutines of AsyncIGV, and sends every command to all
+    the clients (AsyncIGV) at once, so a step takes as long as the slowest
+    IGV rather than the sum of them::
+
+        >>> group = IGVGroup([AsyncIGV(port=60151), AsyncIGV(port=60152)],
+        ...                  deadline=5)
+        >>> await group.goto("chr1:123456")
+        True
+
+    The IGVs share a deadline of timeout seconds, or deadline if the
+    command has none. Those without an answer by then are stragglers: their
+    command is cancelled, which drops their connection, and they are
+    counted in stragglers and passed to on_straggler(client, error). An IGV
+    failing counts the same. Without any deadline, each client waits as
+    long as its own timeout or policy says.
+
+    A response is the one all the IGVs agree on. Otherwise it's the first
+    error among them, "ERROR host:port ..." for the IGVs that didn't
+    answer, so goto() is True only if every IGV went there. If none of
+    them answered, the error of the first one is raised.
+    """
+
+    def __init__(self, clients, deadline=None, on_straggler=None):
+        self.clients = list(clients)
+        self.deadline = deadline
+        self.on_straggler = on_straggler
+        self.stragglers = Counter()
+
+    @property
+    def endpoint(self):
+        return ", ".join(_.endpoint for _ in self.clients)
+
+    async def close(self):
+        """Close the connections to every IGV."""
+        for client in self.clients:
+            await client.close()
+
+    async def check_igv(self, timeout=None):
+        """Return True if every IGV in the group is reachable."""
+        response = await self.command("echo", timeout)
+
+        return response.startswith("echo")
+
+    async def command(self, command, timeout=None):
+        """Return the response from the IGVs for command."""
+        if not command.endswith("\n"):
+            command += "\n"
+
+        return (await self.send_many([command], timeout))[0]
+
+    async def batch(self, commands, timeout=None):
+        """Return a CommandResult for each command, sent as a pipeline."""
+        commands = [_ if _.endswith("\n") else _ + "\n" for _ in commands]
+        responses = await self.send_many(commands, timeout)
+
+        return [helpers.CommandResult(c.rstrip("\n"), r, helpers.is_ok(r))
+                for c, r in zip(commands, responses)]
+
+    async def goto(self, position, timeout=None):
+        """Return "True" if every IGV answered "OK" to a goto command."""
+
+        response = await self.command("goto {}".format(position), timeout)
+
+        return response.startswith("OK")
+
+    async def load(self, filepath, timeout=None):
+        """Return "True" if every IGV answered "OK" to a load command."""
+
+        response = await self.command("load {}".format(filepath), timeout)
+
+        return response.startswith("OK")
+
+    async def snapshot(self, filename="", timeout=None):
+        """Return "True" if every IGV answered "OK" to a snapshot command."""
+
+        response = await self.command(
+            "snapshot {}".format(filename).strip(), timeout)
+
+        return response.startswith("OK")
+
+    async def broadcast(self, commands, timeout=None):
+        """Send commands to every IGV and wait up to the deadline.
+
+        Return, in the order of clients, the responses of each IGV, or the
+        exception it failed with (socket.timeout for stragglers).
+        """
+        deadline = self.deadline if timeout is None else timeout
+        tasks = [asyncio.ensure_future(_.send_many(commands))
+                 for _ in self.clients]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        for client, task in zip(self.clients, tasks):
+            if task in pending:
+                error = socket.timeout(
+                    "IGV didn't answer in {} seconds".format(deadline))
+            else:
+                error = task.exception()
+            if error is None:
+                results.append(task.result())
+                continue
+
+            results.append(error)
+            self.stragglers[client.endpoint] += 1
+            if self.on_straggler is not None:
+                self.on_straggler(client, error)
+
+        return results
+
+    async def send_many(self, commands, timeout=None):
+        """Return the responses of the group to commands, in order."""
+        results = await self.broadcast(commands, timeout)
+        answered = [_ for _ in results if not isinstance(_, Exception)]
+        if not answered:
+            raise results[0]
+
+        responses = []
+        for i in range(len(commands)):
+            answers = [
+                "ERROR {} {}".format(client.endpoint, result)
+                if isinstance(result, Exception) else result[i]
+                for client, result in zip(self.clients, results)]
+            responses.append(next(
+                (_ for _ in answers if not helpers.is_ok(_)), answers[0]))
+
+        return responses
+
+
+def make_controller(endpoints=None, stats=None, policy=None, deadline=None,
+                    on_straggler=None):
+    """Return an AsyncIGV for one (host, port) in endpoints, or an IGVGroup.
+
+    Without endpoints, it's the IGV at localhost:60151. Each client gets its
+    own copy of policy, as the IGVs answer at their own pace.
+    """
+    endpoints = list(endpoints or [("localhost", 60151)])
+    if len(endpoints) == 1:
+        return AsyncIGV(*endpoints[0], stats=stats, policy=policy)
+
+    clients = [AsyncIGV(host, port, stats=stats,
+                        policy=policy.copy() if policy is not None else None)
+               for host, port in endpoints]
+
+    return IGVGroup(clients, deadline, on_straggler)
+
+
+class Dispatcher():
+
+    """Run coroutines on an event loop living in a background thread.
+
+    It lets synchronous code (the Tk main loop, the key reading loop of the
+    command line) send commands to AsyncIGV without waiting for IGV::
+
+        >>> dispatcher = Dispatcher()
+        >>> future = dispatcher.submit(igv.goto("chr1:123456"))
+        >>> future.cancel()  # The user moved on to another variant.
+
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule coroutine and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout=None):
+        """Wait for coroutine to finish and return its result."""
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self):
+        """Cancel the pending coroutines and stop the loop."""
+        if self.loop.is_closed():
+            return
+
+        self.run(self._cancel_all())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    @staticmethod
+    async def _cancel_all():
+        tasks = [_ for _ in asyncio.all_tasks()
+                 if _ is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Coalescer():
+
+    """Send IGV only the last of a burst of gotos.
+
+    Holding an arrow key asks for a new variant many times a second, far
+    faster than IGV loads them. While a goto is on its way, later ones
+    wait here, and each new one replaces (cancels) the one waiting, so
+    IGV goes from the first variant of the burst straight to the last::
+
+        >>> coalescer = Coalescer(igv, dispatcher)
+        >>> coalescer.goto("chr1:100")  # Sent now.
+        >>> coalescer.goto("chr1:200")  # Cancelled by the next one.
+        >>> coalescer.goto("chr1:300")  # Sent when IGV answers chr1:100.
+
+    goto() returns a concurrent.futures.Future with the result of the
+    goto, cancelled if it was replaced or cancelled before being sent.
+    """
+
+    def __init__(self, client, dispatcher):
+        self.client = client
+        self.dispatcher = dispatcher
+        self.sent = 0
+        self.dropped = 0
+        self._pending = None
+        self._task = None
+
+    def goto(self, locus):
+        """Ask IGV to go to locus as soon as it's free."""
+        return self.dispatcher.submit(self._goto(locus))
+
+    async def _goto(self, locus):
+        # Only touched from the loop, where _send() runs.
+        future = asyncio.get_event_loop().create_future()
+        if self._pending is not None and not self._pending[1].done():
+            self._pending[1].cancel()
+            self.dropped += 1
+        self._pending = (locus, future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._send())
+
+        return await future
+
+    async def _send(self):
+        while self._pending is not None:
+            locus, future = self._pending
+            self._pending = None
+            if future.done():
+                # Cancelled by the caller before being sent.
+                continue
+
+            self.sent += 1
+            try:
+                result = await self.client.goto(locus)
+            except Exception as error:
+                # Left in the future, not to stop the gotos after it.
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+class Prefetcher():
+
+    """Warm the loci after the one on screen in a second copy of IGV.
+
+    IGV answers one batch client at a time and shows whatever it goes to,
+    so the look-ahead runs in another IGV (a headless one will do) with the
+    same tracks loaded. Moving it to the next loci while the user reviews
+    the current one pulls their reads into the OS page cache and the HTTP
+    caches of remote BAMs, so they show up sooner in the IGV being used::
+
+        >>> prefetcher = Prefetcher(AsyncIGV(port=60152), dispatcher)
+        >>> prefetcher.update(variants, index)  # After each goto.
+
+    Loci are warmed in order, window of them at a time. A jump away drops
+    the ones left of the previous window, and the one being loaded.
+    """
+
+    def __init__(self, client, dispatcher, window=3, timeout=None):
+        self.client = client
+        self.dispatcher = dispatcher
+        self.window = window
+        self.timeout = timeout
+        # Recently warmed, not to warm them again when stepping forward.
+        self.warmed = deque(maxlen=4 * max(window, 1))
+        self._pending = deque()
+        self._current = None
+        self._task = None
+
+    def update(self, variants, index):
+        """Warm the window of loci after variants[index].
+
+        Return a concurrent.futures.Future, done once the new window is
+        scheduled.
+        """
+        loci = []
+        for next_index in range(index + 1, index + 1 + self.window):
+            try:
+                loci.append(":".join(variants[next_index]))
+            except IndexError:
+                break
+
+        # The state is only touched from the loop, where _warm() runs.
+        return self.dispatcher.submit(self._update(loci))
+
+    def cancel(self):
+        """Forget the pending loci and stop warming the current one."""
+        return self.dispatcher.submit(self._update([]))
+
+    async def _update(self, loci):
+        self._pending = deque(_ for _ in loci
+                              if _ not in self.warmed and _ != self._current)
+        if self._current is not None and self._current not in loci:
+            # The user jumped away from what's being loaded.
+            self._task.cancel()
+            self._task = None
+            self._current = None
+
+        if self._pending and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._warm())
+
+    async def _warm(self):
+        try:
+            while self._pending:
+                self._current = self._pending.popleft()
+                try:
+                    await self.client.goto(self._current, self.timeout)
+                except (OSError, EOFError, asyncio.TimeoutError):
+                    # A missing prefetching IGV only costs the speedup.
+                    self._pending.clear()
+                    break
+                self.warmed.append(self._current)
+        finally:
+            if self._task is asyncio.current_task():
+                self._current = None
@@ -0,0 +1,184 @@
+"""Keep the variants parsed from a file on disk, to reopen it instantly."""
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+try:
+    from igvcontrol import helpers
+except ImportError:
+    import helpers
+
+
+# magic, version, byte order, codes typecode, positions typecode,
+# size of the chromosome names block, number of variants.
+HEADER = struct.Struct("<4sBcccQQ")
+MAGIC = b"IGVC"
+VERSION = 1
+SUFFIX = ".vidx"
+
+
+def default_directory():
+    """Return $IGVCONTROL_CACHE or the igvcontrol dir in the user cache."""
+    return os.environ.get("IGVCONTROL_CACHE") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or
+        os.path.join(os.path.expanduser("~"), ".cache"), "igvcontrol")
+
+
+def _padding(offset):
+    return -offset % 8
+
+
+class VariantCache():
+
+    """A directory of VariantStores saved as memory-mappable files.
+
+    A file is cached under a name made from its absolute path, size and
+    modification time, so a changed file is parsed again and its stale
+    entry removed. Cached files are mmapped rather than read, and once the
+    directory grows beyond max_bytes the least recently used are deleted::
+
+        >>> cache = VariantCache()
+        >>> variants = helpers.Variants("path/to/file.vcf", cache=cache)
+
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+
+    def path(self, filename):
+        """Return the cache file for the current contents of filename."""
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        source = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        version = hashlib.sha1("{}:{}".format(
+            stat.st_size, stat.st_mtime).encode("ascii")).hexdigest()
+
+        return os.path.join(self.directory,
+                            "{}-{}{}".format(source, version[:16], SUFFIX))
+
+    def get(self, filename):
+        """Return the cached VariantStore for filename, or None."""
+        try:
+            path = self.path(filename)
+            with open(path, "rb") as cached:
+                buffer = mmap.mmap(cached.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            store = self._load(buffer)
+        except (ValueError, TypeError, struct.error):
+            buffer.close()
+            self._remove(path)
+            return None
+
+        # Mark it as recently used.
+        os.utime(path, None)
+
+        return store
+
+    def put(self, filename, store):
+        """Save store as the variants in filename."""
+        path = self.path(filename)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Entries for older versions of the file are useless now.
+        prefix = os.path.basename(path).split("-")[0]
+        for entry in self._entries():
+            if os.path.basename(entry).startswith(prefix) and entry != path:
+                self._remove(entry)
+
+        handle, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, "wb") as cached:
+            self._dump(store, cached)
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries beyond max_bytes."""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = os.stat(entry)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(_[1] for _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(entry)
+            total -= size
+
+    def clear(self):
+        """Delete every entry in the cache."""
+        for entry in self._entries():
+            self._remove(entry)
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        return [os.path.join(self.directory, _) for _ in names
+                if _.endswith(SUFFIX)]
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _dump(store, cached):
+        chroms = "\n".join(store.chroms).encode("utf-8")
+        codes = array(helpers.typecode(store.codes), store.codes)
+        positions = array(helpers.typecode(store.positions), store.positions)
+
+        cached.write(HEADER.pack(
+            MAGIC, VERSION, sys.byteorder[0].encode("ascii"),
+            codes.typecode.encode("ascii"), positions.typecode.encode("ascii"),
+            len(chroms), len(store)))
+        offset = HEADER.size
+        for block in (chroms, codes.tobytes()):
+            cached.write(block)
+            offset += len(block)
+            cached.write(b"\0" * _padding(offset))
+            offset += _padding(offset)
+        cached.write(positions.tobytes())
+
+    @staticmethod
+    def _load(buffer):
+        (magic, version, byteorder, codes_type, positions_type,
+         chroms_size, count) = HEADER.unpack_from(buffer)
+        if (magic, version, byteorder) != (
+                MAGIC, VERSION, sys.byteorder[0].encode("ascii")):
+            raise ValueError("Not a cache file for this version and machine")
+
+        view = memoryview(buffer)
+        offset = HEADER.size
+        chroms = bytes(view[offset:offset + chroms_size]).decode("utf-8")
+        offset += chroms_size + _padding(offset + chroms_size)
+
+        arrays = []
+        for code in (codes_type.decode("ascii"),
+                     positions_type.decode("ascii")):
+            size = count * array(code).itemsize
+            arrays.append(view[offset:offset + size].cast(code))
+            offset += size + _padding(offset + size)
+            if len(arrays[-1]) != count:
+                raise ValueError("Truncated cache file")
+
+        return helpers.VariantStore.from_arrays(
+            chroms.split("\n") if chroms else [], *arrays)
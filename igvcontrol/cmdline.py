@@ -1,12 +1,20 @@
 """Provide access through command line to IGV controlling."""
-import readchar
+import argparse
+import sys
+import time
 
-from igvcontrol.guimode import guimode
-from igvcontrol import helpers
+# Each mode imports what it needs when it runs (asyncio, the parsers,
+# readchar, the GUI...), so scripts, headless servers and --help start
+# sooner.
+from igvcontrol import policy
+
+# Keys marking the variant on screen, and the mark they give.
+MARK_KEYS = {"f": "flagged", "r": "reviewed", "u": None}
 
 
 def move_index(index, max_point):
     """Return the new index according to the key pressed."""
+    import readchar
 
     c = readchar.readkey()
 
@@ -15,6 +23,10 @@ def move_index(index, max_point):
              readchar.key.CTRL_D,
              readchar.key.CTRL_Z):
         return "QUIT"
+    elif c in ("g", "G", "/"):
+        return "JUMP"
+    elif c.lower() in MARK_KEYS:
+        return "MARK " + c.lower()
     elif c == (readchar.key.RIGHT):
         if index < max_point:
             index += 1
@@ -25,47 +37,343 @@ def move_index(index, max_point):
     return index
 
 
-def text_mode(variants):
-    """Launch the IVG-control in text mode."""
-    controller = helpers.IGV()
+def max_index(variants):
+    """Return how far right move_index can go without reading all variants.
+
+    Until the length of variants is known there is no limit: walking past
+    the last one raises an IndexError that completes the index.
+    """
+    if getattr(variants, "complete", True):
+        return len(variants)
+    return sys.maxsize
+
+
+def sheet_argument(value):
+    """Return a --sheet value as an index if it's a number, else a name."""
+    return int(value) if value.isdigit() else value
+
+
+def columns_argument(value):
+    """Return the 0-based numbers of --columns given as letters: "C,D"."""
+    from igvcontrol import xlsx
+
+    columns = tuple(xlsx.column_number(_.strip()) for _ in value.split(","))
+    if len(columns) != 2 or min(columns) < 0:
+        raise argparse.ArgumentTypeError(
+            "Expected the chromosome and position columns, e.g. A,B")
+
+    return columns
+
+
+def endpoint_argument(value):
+    """Return the (host, port) of an --igv value: "host:port" or "port"."""
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "localhost", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Expected the batch port of IGV, e.g. 60151 or otherhost:60151")
+
+
+def report_straggler(client, error):
+    """Tell that the IGV behind client fell behind the others."""
+    print("IGV on {} didn't follow: {}".format(
+        client.endpoint, str(error) or "timed out"))
+
+
+def expression_argument(value):
+    """Return a --filter value, if it's a valid QUAL/FILTER/INFO condition."""
+    from igvcontrol import filters
+
+    try:
+        filters.FieldPredicate(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+    return value
+
+
+def make_filter(cmd_args):
+    """Return the filters.VariantFilter in cmd_args, or None."""
+    if not (cmd_args.bed or cmd_args.chroms or cmd_args.filter):
+        return None
+
+    from igvcontrol import filters
+
+    regions = None
+    if cmd_args.bed:
+        regions = filters.IntervalIndex.from_bed(cmd_args.bed)
+
+    return filters.VariantFilter(regions, cmd_args.chroms,
+                                 cmd_args.filter or ())
+
+
+def ask_jump(navigator, index, goto):
+    """Ask where to jump, and return the index of that variant.
+
+    None if it isn't in the list: an empty answer, a bad one (explained)
+    or a gene name, which is passed to goto for IGV to find it.
+    """
+    query = input("\nGo to (number, chr:position, chr or gene): ").strip()
+    if not query:
+        return None
+
+    try:
+        found = navigator.jump(query, index)
+    except ValueError as error:
+        print(error)
+        return None
+
+    if found is None:
+        goto(query)
+
+    return found
+
+
+def mark_variant(review, variant, key):
+    """Give variant the mark of key in review, and tell it."""
+    if review is None:
+        print("Marks are saved in a session, which needs the cache")
+        return
+
+    review.mark(variant, MARK_KEYS[key])
+    print("{} {}".format(":".join(variant), MARK_KEYS[key] or "unmarked"))
+
+
+def text_mode(variants, prefetch_port=None, prefetch_window=3,
+              igv_stats=None, igv_policy=None, endpoints=None, deadline=None,
+              review=None, track_list=None):
+    """Launch the IVG-control in text mode.
+
+    With prefetch_port, the IGV listening there warms the next
+    prefetch_window variants while the current one is reviewed. igv_stats
+    times the commands, and igv_policy sets their timeouts and retries.
+    With several (host, port) endpoints, every IGV follows the variants,
+    each getting at most deadline seconds to answer. A session.Session
+    review saves the position and the marks, and starts where it was left.
+    The tracks.Tracks in track_list are loaded into every IGV first, the
+    one prefetching included.
+    """
+    # asyncio alone takes most of the time to import igvcontrol.
+    from igvcontrol import asyncigv, navigation, tracks
+
+    controller = asyncigv.make_controller(endpoints, igv_stats, igv_policy,
+                                          deadline, report_straggler)
+    # Commands run in the background, so keys are read while IGV moves.
+    dispatcher = asyncigv.Dispatcher()
+    # Keys held down only send IGV the variant they stop at.
+    coalescer = asyncigv.Coalescer(controller, dispatcher)
+    prefetcher = None
+    if prefetch_port:
+        prefetcher = asyncigv.Prefetcher(
+            asyncigv.AsyncIGV(port=prefetch_port), dispatcher,
+            window=prefetch_window)
 
     # Test the IGV is running and accepting
     try:
-        controller.check_igv()
+        dispatcher.run(controller.check_igv())
     except OSError:
         # Be mild about timeouts because IGV timeouts a lot.
-        print("IGV was not detected " +
-              "on ip {}, port {}".format(controller.host,
-                                         controller.port))
+        print("IGV was not detected on {}".format(controller.endpoint))
 
-    print("Press <- or ->, [q] to quit")
+    if track_list:
+        # The IGV prefetching shows nothing, but needs the reads too.
+        loader = tracks.TrackLoader(controller, *(
+            [prefetcher.client] if prefetcher is not None else []))
+        started = time.time()
+        results = dispatcher.run(loader.load(track_list))
+        print("\n".join(tracks.summary(results, track_list,
+                                       time.time() - started)))
 
-    all_variants = list(variants)
+    print("Press <- or ->, [g] to go to a variant, [f]lag, [r]eviewed, " +
+          "[u]nmark, [q] to quit")
 
+    navigator = navigation.Navigator(variants)
     index = 0
+    moved = None
+    if review is not None:
+        moved = review.restore(navigator)
     while True:
-        index = move_index(index, len(all_variants))
+        if moved is None:
+            moved = move_index(index, max_index(variants))
+        if moved == "JUMP":
+            moved = ask_jump(navigator, index, coalescer.goto)
+            if moved is None:
+                continue
+        elif str(moved).startswith("MARK"):
+            try:
+                mark_variant(review, variants[index], moved.split()[1])
+            except IndexError:
+                pass
+            moved = None
+            continue
+        index, moved = moved, None
 
         if index == "QUIT":
+            dispatcher.run(controller.close())
+            if prefetcher is not None:
+                dispatcher.run(prefetcher.client.close())
+            dispatcher.stop()
+            if review is not None:
+                review.close()
             break
 
         try:
-            this_variant = all_variants[index]
-            controller.goto(":".join(this_variant))
+            this_variant = variants[index]
         except IndexError:
             # The list overflowed on the right.
             print("No more variants to view. Press [q] to quit")
-        except OSError:
-            # IGV is flawed somehow in the socket connection.
-            pass
+        else:
+            # IGV failing in the socket connection is not fatal. Errors are
+            # left in the returned future.
+            coalescer.goto(":".join(this_variant))
+            if prefetcher is not None:
+                prefetcher.update(variants, index)
+            if review is not None:
+                review.moved(index, this_variant)
+                if review.mark_of(this_variant):
+                    print("{} {}".format(":".join(this_variant),
+                                         review.mark_of(this_variant)))
+
+
+def snapshot_mode(variants, directory, endpoints=None, igv_stats=None,
+                  igv_policy=None):
+    """Save a snapshot of every variant in directory, showing progress.
+
+    The IGVs at endpoints, localhost:60151 without them, share the work.
+    """
+    from igvcontrol import snapshots
+
+    def progress(finished, total, rate):
+        sys.stderr.write("\r{} of {} variants ({:.1f} snapshots/s)".format(
+            finished, total, rate))
+        sys.stderr.flush()
+
+    job = snapshots.SnapshotJob(variants, directory,
+                                endpoints or [("localhost", 60151)],
+                                progress=progress, stats=igv_stats,
+                                policy=igv_policy)
+    report = job.run()
+    sys.stderr.write("\n")
+
+    print("{} snapshots saved in {}, {} already there.".format(
+        report.done, job.directory, report.skipped))
+    if report.failed:
+        print("{} failed (run again to retry them):".format(
+            len(report.failed)))
+        for name in report.failed:
+            print("  " + name)
+
+    return not report.failed
+
+
+def load_test_mode(clients, commands, endpoints=None, igv_stats=None,
+                   igv_policy=None, mock_options=None):
+    """Have that many clients send that many gotos each, and tell the rate.
+
+    The gotos go to the IGVs at endpoints, spread among them, or to a
+    mockigv.MockIGV started with mock_options. Return True if none failed.
+    """
+    from igvcontrol import asyncigv, mockigv
+
+    server = None
+    if not endpoints:
+        # Not keeping the requests, which would grow without end.
+        server = mockigv.MockIGV(keep_requests=False,
+                                 **(mock_options or {})).start()
+        endpoints = [("localhost", server.port)]
+
+    igv_clients = [
+        asyncigv.AsyncIGV(*endpoints[i % len(endpoints)], stats=igv_stats,
+                          policy=igv_policy.copy() if igv_policy else None)
+        for i in range(clients)]
+    dispatcher = asyncigv.Dispatcher()
+    started = time.time()
+    try:
+        outcomes = dispatcher.run(asyncigv.hammer(igv_clients, commands))
+    finally:
+        elapsed = time.time() - started
+        dispatcher.stop()
+        if server is not None:
+            server.stop()
+
+    total = sum(outcomes.values())
+    print("{} clients sent {} commands in {:.2f} s: {:.0f} commands/s".format(
+        clients, total, elapsed, total / elapsed if elapsed else 0))
+    failed = total - outcomes["ok"]
+    if failed:
+        print("{} failed: {} answered ERROR, {} not answered".format(
+            failed, outcomes["igv_error"], outcomes["error"]))
+
+    return not failed
+
+
+def latency_argument(value):
+    """Return a --mock-latency value as latencies by command."""
+    from igvcontrol import mockigv
+
+    try:
+        return mockigv.parse_latencies(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def report_stats(igv_stats, trace_path=None):
+    """Print the timings of the commands sent, and save their trace."""
+    print(igv_stats.summary())
+    if trace_path:
+        igv_stats.export(trace_path)
+        print("Trace of the commands saved in {}".format(trace_path))
+
+
+def make_policy(cmd_args):
+    """Return the policy.Policy set by the options in cmd_args."""
+    initial = {}
+    if cmd_args.timeout is not None:
+        initial.update({"goto": cmd_args.timeout, "echo": cmd_args.timeout,
+                        None: cmd_args.timeout})
+    if cmd_args.load_timeout is not None:
+        initial["load"] = cmd_args.load_timeout
+
+    return policy.Policy(initial, adaptive=not cmd_args.fixed_timeouts,
+                         retries=cmd_args.retries,
+                         cooldown=cmd_args.cooldown)
 
 
 def main(cmd_args):
     """Launch the controller either through tkinter or command line."""
-    if cmd_args.gui:
+    igv_stats = None
+    if cmd_args.stats or cmd_args.trace or cmd_args.load_test:
+        from igvcontrol import stats
+        igv_stats = stats.Stats(trace=bool(cmd_args.trace))
+
+    try:
+        return run(cmd_args, igv_stats, make_policy(cmd_args))
+    finally:
+        if igv_stats is not None:
+            report_stats(igv_stats, cmd_args.trace)
+
+
+def run(cmd_args, igv_stats=None, igv_policy=None):
+    """Run the mode chosen in cmd_args."""
+    if cmd_args.load_test:
+        return load_test_mode(
+            cmd_args.load_test, cmd_args.load_test_commands, cmd_args.igv,
+            igv_stats, igv_policy,
+            {"latency": cmd_args.mock_latency or 0,
+             "errors": cmd_args.mock_errors, "serial": cmd_args.mock_serial})
+    elif cmd_args.gui:
         # Here we launch the GUI.
-        guimode()
+        from igvcontrol.guimode import guimode
+        guimode(cmd_args.prefetch_port, cmd_args.prefetch_window, igv_stats,
+                igv_policy, cmd_args.igv, cmd_args.deadline, cmd_args.resume,
+                cmd_args.cache_dir, cmd_args.no_cache, cmd_args.session)
     else:
+        from igvcontrol import cache, filters, helpers, session, tracks
+
+        if not cmd_args.variants and cmd_args.resume and cmd_args.session:
+            # The files of the review.
+            cmd_args.variants = session.sources_of(cmd_args.session)
         if not cmd_args.variants:
             # No GUI and no FilePath provided.
             variants_path = input(
@@ -73,23 +381,216 @@ def main(cmd_args):
             if variants_path.lower() in ("q", ""):
                 print("Cannot work without variants. Exiting.")
                 return False
-            cmd_args.variants = variants_path
+            cmd_args.variants = [variants_path]
+
+        variants_cache = None
+        if not cmd_args.no_cache:
+            variants_cache = cache.VariantCache(cmd_args.cache_dir)
+
+        track_list = None
+        if cmd_args.tracks:
+            try:
+                track_list = tracks.read_tracks(cmd_args.tracks)
+            except OSError as error:
+                print("Can't read the tracks: {}".format(error))
+                return False
 
-        variants = helpers.Variants(cmd_args.variants)
+        paths = helpers.expand_paths(cmd_args.variants)
+        try:
+            review = open_session(cmd_args, paths)
+        except ValueError as error:
+            print("{}. Give another --session".format(error))
+            return False
+        if cmd_args.export:
+            if review is None:
+                print("There is no review to export without the cache. " +
+                      "Give its --session")
+                return False
+            print("Saved {} variants to {}".format(
+                review.export(cmd_args.export), cmd_args.export))
+            return True
+
+        options = {"cache": variants_cache, "region": cmd_args.region,
+                   "sheet": cmd_args.sheet, "columns": cmd_args.columns}
+        variant_filter = make_filter(cmd_args)
+        try:
+            if len(paths) == 1:
+                variants = helpers.Variants(paths[0], **options)
+                if variant_filter is not None:
+                    variants = variant_filter.apply(variants)
+            else:
+                variants = helpers.VariantSet(paths,
+                                              processes=cmd_args.processes,
+                                              variant_filter=variant_filter,
+                                              **options)
+        except filters.NotVCFError as error:
+            # --filter on a TAB or Excel file.
+            make_parser().error(str(error))
+
+        if cmd_args.sort or cmd_args.cluster:
+            from igvcontrol import sorting
+            variants = sorting.sort_variants(variants)
+        if cmd_args.cluster:
+            variants = sorting.Clusters(variants, cmd_args.cluster)
+
+        if cmd_args.snapshot_dir:
+            return snapshot_mode(variants, cmd_args.snapshot_dir,
+                                 cmd_args.igv, igv_stats, igv_policy)
 
         # Here we launch the command line with variants.")
-        text_mode(variants)
+        text_mode(variants, cmd_args.prefetch_port, cmd_args.prefetch_window,
+                  igv_stats, igv_policy, cmd_args.igv, cmd_args.deadline,
+                  review, track_list)
 
 
-if __name__ == "__main__":
-    import argparse
+def open_session(cmd_args, paths):
+    """Return the session.Session of reviewing paths, or None.
 
+    Sessions are kept in the cache dir unless --session tells where, so
+    there are none with --no-cache alone.
+    """
+    from igvcontrol import session
+
+    path = cmd_args.session
+    if path is None and not cmd_args.no_cache:
+        path = session.default_path(paths, cmd_args.cache_dir)
+    if path is None:
+        return None
+
+    review = session.Session(path, paths,
+                             resume=cmd_args.resume or bool(cmd_args.export))
+    for source in review.changed:
+        print("{} changed since the review began".format(source))
+
+    return review
+
+
+def make_parser():
+    """Return the argparse.ArgumentParser of the command line."""
     parser = argparse.ArgumentParser(description="Manage IGV through sockets.")
-    parser.add_argument("--variants",
+    parser.add_argument("--variants", nargs="+",
                         help="Path to file with variants. It works with VCF " +
-                        "or TAB files.")
+                        "or TAB files, gzipped or not. Several files (or " +
+                        "globs) are merged in genomic order.")
+    parser.add_argument("--processes", type=int,
+                        help="Parse several files with this many processes. " +
+                        "Defaults to the number of cores.")
+    parser.add_argument("--region",
+                        help="Only view the variants in a region, e.g. " +
+                        "chr7:1-2000000. Bgzipped files with a tabix or " +
+                        "CSI index are only read around the region.")
+    parser.add_argument("--bed",
+                        help="Only view the variants in the regions of " +
+                        "this BED file")
+    parser.add_argument("--chroms", nargs="+",
+                        help="Only view the variants on these chromosomes")
+    parser.add_argument("--filter", action="append",
+                        type=expression_argument,
+                        help="Only view the VCF records meeting a " +
+                        "condition, e.g. QUAL>=30, FILTER==PASS, " +
+                        "INFO/DP>10 or INFO/SOMATIC. Repeat it to add more")
+    parser.add_argument("--sort", action="store_true",
+                        help="View the variants in genomic order, not in " +
+                        "the order of the file. Files too big for memory " +
+                        "are sorted in chunks on disk")
+    parser.add_argument("--cluster", type=int, metavar="BASES",
+                        help="Sort, and view together the variants " +
+                        "within this many bases, e.g. 200")
+    parser.add_argument("--sheet", type=sheet_argument, default=0,
+                        help="Sheet of Excel files to read, by name or " +
+                        "0-based number. Defaults to the first one.")
+    parser.add_argument("--columns", type=columns_argument, default=(0, 1),
+                        help="Columns of Excel files with the chromosome " +
+                        "and the position. Defaults to A,B")
     parser.add_argument("--gui", action="store_true",
                         help="Launch a Tkinter Gui to control IGV")
-    args = parser.parse_args()
+    parser.add_argument("--igv", nargs="+", type=endpoint_argument,
+                        metavar="[HOST:]PORT",
+                        help="IGVs to browse with, all of them moving to " +
+                        "each variant, or sharing the snapshots of " +
+                        "--snapshot-dir. Defaults to 60151")
+    parser.add_argument("--tracks", nargs="+", metavar="TRACK",
+                        help="BAMs, BEDs, a genome and so to load into " +
+                        "every IGV before browsing, or files (.txt, .list " +
+                        "or .tracks) listing them, one per line. Each " +
+                        "track is loaded once")
+    parser.add_argument("--deadline", type=float,
+                        help="Seconds all the IGVs of --igv get to answer. " +
+                        "Those late are reported and left behind")
+    parser.add_argument("--snapshot-dir",
+                        help="Don't browse: save a snapshot of every " +
+                        "variant in this directory and exit. Run it again " +
+                        "to resume.")
+    parser.add_argument("--load-test", type=int, metavar="CLIENTS",
+                        help="Don't browse: measure how many commands " +
+                        "per second this many clients at once get " +
+                        "answered, by the IGVs of --igv or by a mock IGV")
+    parser.add_argument("--load-test-commands", type=int, default=1000,
+                        help="Commands each client sends in --load-test. " +
+                        "Defaults to 1000")
+    parser.add_argument("--mock-latency", type=latency_argument,
+                        help="Seconds the mock IGV takes to answer, or a " +
+                        "distribution: uniform:LOW:HIGH, normal:MEAN:SD " +
+                        "or exponential:MEAN. Prefix VERB= to set them " +
+                        "by command, e.g. goto=0.05,load=uniform:1:3")
+    parser.add_argument("--mock-errors", type=float, default=0.0,
+                        help="Fraction of the commands the mock IGV " +
+                        "answers ERROR")
+    parser.add_argument("--mock-serial", action="store_true",
+                        help="Have the mock IGV answer one command at a " +
+                        "time, as IGV does")
+    parser.add_argument("--prefetch-port", type=int,
+                        help="Port of a second IGV, with the same tracks " +
+                        "loaded, that goes ahead to the next variants so " +
+                        "they load faster")
+    parser.add_argument("--prefetch-window", type=int, default=3,
+                        help="How many variants ahead to prefetch. " +
+                        "Defaults to 3")
+    parser.add_argument("--timeout", type=float,
+                        help="Seconds to wait for IGV to answer a command " +
+                        "before its usual time is known. Defaults to 10")
+    parser.add_argument("--load-timeout", type=float,
+                        help="The same, for loading tracks. Defaults to 120")
+    parser.add_argument("--fixed-timeouts", action="store_true",
+                        help="Don't adapt the timeouts to the time IGV " +
+                        "takes to answer each command")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="Times to retry a command that failed, if " +
+                        "sending it twice is harmless. Defaults to 2")
+    parser.add_argument("--cooldown", type=float, default=10.0,
+                        help="Seconds to leave IGV alone after it failed " +
+                        "3 times in a row. Defaults to 10")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print the p50/p95/p99 times of the IGV " +
+                        "commands, and how many failed, on exit")
+    parser.add_argument("--trace",
+                        help="Save the timings of every IGV command to " +
+                        "this file, as CSV or (.json) JSON")
+    parser.add_argument("--cache-dir",
+                        help="Where to keep parsed variants to reopen files " +
+                        "faster. Defaults to $IGVCONTROL_CACHE or " +
+                        "~/.cache/igvcontrol")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse the variants file from scratch")
+    parser.add_argument("--session",
+                        help="File saving the position and the marks of " +
+                        "the review. Defaults to one for each set of " +
+                        "files, in the cache dir")
+    parser.add_argument("--resume", action="store_true",
+                        help="Go back to the variant the last review of " +
+                        "these files (or of --session) was left at. Its " +
+                        "marks are kept either way")
+    parser.add_argument("--export",
+                        help="Don't browse: save the variants flagged or " +
+                        "reviewed to this .tab or .vcf file and exit")
 
-    main(args)
+    return parser
+
+
+def parse_args(argv=None):
+    """Return the options in argv (sys.argv by default)."""
+    return make_parser().parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,251 @@
+"""Keep only the variants worth reviewing: by region, chromosome or field."""
+from array import array
+from bisect import bisect_right
+import operator
+import re
+
+try:
+    from igvcontrol import helpers
+except ImportError:
+    import helpers
+
+OPERATORS = {"==": operator.eq, "=": operator.eq, "!=": operator.ne,
+             ">=": operator.ge, "<=": operator.le, ">": operator.gt,
+             "<": operator.lt}
+EXPRESSION = re.compile(
+    r"^\s*(QUAL|FILTER|INFO[./]([^\s=!<>]+))\s*"
+    r"(?:(==|!=|>=|<=|=|>|<)\s*([^\s=!<>]\S*))?\s*$")
+
+
+class NotVCFError(ValueError):
+
+    """QUAL, FILTER or INFO conditions were given for a file not a VCF."""
+
+
+def chrom_name(chrom):
+    """Return chrom without its "chr" prefix, so "chr7" and "7" match."""
+    return chrom[3:] if chrom[:3].lower() == "chr" else chrom
+
+
+class IntervalIndex():
+
+    """Genomic intervals, merged and sorted, to look positions up quickly.
+
+    Each chromosome keeps the starts and ends of its intervals in arrays.
+    A position is found by bisecting the starts, so checking millions of
+    variants against thousands of intervals takes seconds::
+
+        >>> index = IntervalIndex.from_bed("exome.bed")
+        >>> ("chr7", 55249071) in index
+        True
+
+    Intervals are 0-based and end excluded, as in BED. Positions are
+    1-based, as in VCF.
+    """
+
+    def __init__(self):
+        self.starts = {}
+        self.ends = {}
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """Return an IntervalIndex with the (chrom, start, end) intervals."""
+        by_chrom = {}
+        for chrom, start, end in intervals:
+            by_chrom.setdefault(chrom_name(chrom), []).append(
+                (int(start), int(end)))
+
+        index = cls()
+        for chrom, chrom_intervals in by_chrom.items():
+            starts, ends = array("I"), array("I")
+            for start, end in sorted(chrom_intervals):
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            index.starts[chrom] = starts
+            index.ends[chrom] = ends
+
+        return index
+
+    @classmethod
+    def from_bed(cls, filename):
+        """Return an IntervalIndex with the intervals in a BED file."""
+        def intervals():
+            with helpers.open_text(filename) as bed:
+                for line in bed:
+                    if line.startswith(("#", "track", "browser")) or \
+                            not line.strip():
+                        continue
+                    yield line.split("\t", 3)[:3]
+
+        return cls.from_intervals(intervals())
+
+    def __len__(self):
+        return sum(len(_) for _ in self.starts.values())
+
+    def __contains__(self, variant):
+        chrom, position = variant
+        return self.contains(chrom_name(chrom), int(position))
+
+    def contains(self, name, position):
+        """Return True if position (1-based) of chrom_name name is inside."""
+        starts = self.starts.get(name)
+        if starts is None:
+            return False
+
+        i = bisect_right(starts, position - 1) - 1
+
+        return i >= 0 and position - 1 < self.ends[name][i]
+
+
+class FieldPredicate():
+
+    """A condition on the QUAL, FILTER or INFO of a VCF line.
+
+    Written as "QUAL>=30", "FILTER==PASS", "INFO/DP>10" (or "INFO.DP>10")
+    and "INFO/SOMATIC" for flags. Values that look like numbers are compared
+    as numbers, and INFO fields with several values ("AF=0.1,0.6") match if
+    any of them does. FILTER==x is true if x is among the filters of the
+    line, and FILTER!=x if it isn't. Missing values (".") never match.
+    """
+
+    def __init__(self, expression):
+        match = EXPRESSION.match(expression)
+        if not match:
+            raise ValueError("Not a QUAL, FILTER or INFO condition: {}".format(
+                expression))
+
+        self.expression = expression
+        field, self.key, symbol, value = match.groups()
+        self.field = field if self.key is None else "INFO"
+        self.operator = OPERATORS[symbol] if symbol else None
+        if self.operator is None and self.field != "INFO":
+            raise ValueError("{} needs a value to compare with".format(field))
+        self.value = self._number(value) if value is not None else None
+
+    def __repr__(self):
+        return "FieldPredicate({!r})".format(self.expression)
+
+    def matches(self, qual, filters, info):
+        """Return True if the fields of a VCF line meet the condition.
+
+        info is a dict of the INFO fields, flags mapped to True.
+        """
+        if self.field == "QUAL":
+            return qual != "." and self._compare(qual)
+        elif self.field == "FILTER":
+            names = filters.split(";")
+            if self.operator is operator.eq:
+                return self.value in names
+            elif self.operator is operator.ne:
+                return self.value not in names
+            return any(self._compare(_) for _ in names)
+
+        value = info.get(self.key)
+        if self.operator is None:
+            return value is not None
+        if value is None or value is True:
+            return False
+
+        return any(self._compare(_) for _ in value.split(",") if _ != ".")
+
+    def _compare(self, text):
+        try:
+            return self.operator(self._number(text), self.value)
+        except TypeError:
+            # A number and a word: never equal.
+            return self.operator is operator.ne
+
+    @staticmethod
+    def _number(text):
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+class VariantFilter():
+
+    """Keep the variants in regions, on chroms and meeting expressions.
+
+    regions is an IntervalIndex, chroms a list of chromosome names ("chr"
+    prefixes optional) and expressions a list of FieldPredicate strings,
+    all of which must be met::
+
+        >>> variant_filter = VariantFilter(
+        ...     regions=IntervalIndex.from_bed("exome.bed"),
+        ...     expressions=["QUAL>=30", "FILTER==PASS"])
+        >>> store = variant_filter.apply(Variants("calls.vcf"))
+
+    Filters on the location run on the VariantStore of the variants, which
+    can come from the cache. Expressions need the fields of the records, so
+    they are checked while the lines of the VCF are read, without splitting
+    the samples.
+    """
+
+    def __init__(self, regions=None, chroms=None, expressions=()):
+        self.regions = regions
+        self.chroms = set(chrom_name(_) for _ in chroms) if chroms else None
+        self.predicates = [FieldPredicate(_) for _ in expressions]
+        self._needs_info = any(_.field == "INFO" for _ in self.predicates)
+
+    def apply(self, variants):
+        """Return a VariantStore with the variants that pass the filter.
+
+        Raise NotVCFError if there are field conditions and variants don't
+        come from a VCF.
+        """
+        if self.predicates:
+            if getattr(variants, "format", None) != "vcf":
+                raise NotVCFError("QUAL, FILTER and INFO conditions need a "
+                                  "VCF file: {}".format(
+                                      getattr(variants, "filename",
+                                              variants)))
+            return helpers.VariantStore.from_iterable(
+                variants.vcf_locus(_) for _ in variants.vcf_lines()
+                if self.line_matches(_))
+
+        if isinstance(variants, helpers.VariantStore):
+            store = variants
+        elif hasattr(variants, "to_store"):
+            store = variants.to_store()
+        else:
+            store = variants.store
+
+        return store.select(self.mask(store))
+
+    def mask(self, store):
+        """Return a boolean per variant of store, True if it's kept.
+
+        Only the regions and chroms are checked.
+        """
+        names = [chrom_name(_) for _ in store.chroms]
+        allowed = [self.chroms is None or _ in self.chroms for _ in names]
+        if self.regions is None:
+            return [allowed[_] for _ in store.codes]
+
+        contains = self.regions.contains
+        return [allowed[code] and contains(names[code], position)
+                for code, position in zip(store.codes, store.positions)]
+
+    def line_matches(self, line):
+        """Return True if a VCF data line passes the filter."""
+        fields = line.split("\t", 8)
+        name = chrom_name(fields[0])
+        if self.chroms is not None and name not in self.chroms:
+            return False
+        if self.regions is not None and not self.regions.contains(
+                name, int(fields[1])):
+            return False
+
+        info = {}
+        if self._needs_info and fields[7].rstrip("\n") != ".":
+            for item in fields[7].rstrip("\n").split(";"):
+                key, _, value = item.partition("=")
+                info[key] = value if _ else True
+
+        qual, filters = fields[5], fields[6].rstrip("\n")
+
+        return all(_.matches(qual, filters, info) for _ in self.predicates)
@@ -1,17 +1,29 @@
 """GUI for IGV controller."""
 try:
     import tkinter as tk
-    from tkinter.filedialog import askopenfilename
+    from tkinter.filedialog import askopenfilenames
     from tkinter import ttk
 except:
     import Tkinter as tk
-    from tkFileDialog import askopenfilename
+    from tkFileDialog import askopenfilenames
     import ttk
 
+import asyncio
+import time
+
 try:
-    import helpers
+    import asyncigv
+    import cache
+    import navigation
+    import session
+    import tracks
+    import worker
 except:
-    from igvcontrol import helpers
+    from igvcontrol import (asyncigv, cache, navigation, session, tracks,
+                            worker)
+
+# Milliseconds between two looks at the events of the background work.
+POLL_INTERVAL = 50
 
 class StatusBar(ttk.Frame, object):
     def __init__(self, parent):
@@ -33,31 +45,92 @@ class StatusBar(ttk.Frame, object):
         self.progress.pack(side="left", fill="x")
         #self.progress.grid(column=2, row=0, sticky="e")
 
+        # Shown while a file is read.
+        self.progressbar = ttk.Progressbar(self, length=120, maximum=1.0)
+        self.cancel_btn = ttk.Button(self, text="Cancel")
+
+    def start_loading(self, cancel):
+        """Show the progress bar, and a button calling cancel()."""
+        self.progressbar.configure(mode="indeterminate", value=0)
+        self.progressbar.pack(side="left", padx=3)
+        self.cancel_btn.configure(command=cancel)
+        self.cancel_btn.pack(side="left")
+
+    def show_progress(self, done, total=None):
+        """Fill the bar to done/total, or just move it without a total."""
+        if total:
+            self.progressbar.configure(mode="determinate",
+                                       value=done / total)
+        else:
+            self.progressbar.step(0.05)
+
+    def stop_loading(self):
+        self.progressbar.pack_forget()
+        self.cancel_btn.pack_forget()
+
 
 class MainApp():
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, prefetch_port=None, prefetch_window=3,
+                 stats=None, policy=None, endpoints=None, deadline=None,
+                 resume=False, cache_dir=None, no_cache=False,
+                 session_path=None, *args, **kwargs):
         self.parent = parent
         self.parent.resizable(0, 0)
         self.parent.title("IGV Control")
 
         self.parent.option_add('*tearOff', tk.FALSE)
 
-        self.controller = helpers.IGV()
+        # One IGV, or several following the same variants.
+        self.controller = asyncigv.make_controller(
+            endpoints, stats, policy, deadline, self._straggler)
+        # IGV commands run in the background to keep the window responsive.
+        self.dispatcher = asyncigv.Dispatcher()
+        # Clicks faster than IGV only send it the variant they stop at.
+        self.coalescer = asyncigv.Coalescer(self.controller, self.dispatcher)
+        # And so does reading files, which hands its events to _poll().
+        self.worker = worker.Worker()
+        self.loading = None
+        # Searches get their own, not to wait behind a file being indexed.
+        self.searcher = worker.Worker()
+        self.jumping = None
+        self.navigator = None
+        self.variants = None
+        self.viewed = None
+        # The position and marks of the review of each file opened, which
+        # starts where the last one was left with resume. Kept in
+        # session_path or, unless no_cache, in the cache dir.
+        self.resume = resume
+        self.session_path = session_path
+        self.review = None
+        # Parsed variants are kept in cache_dir, unless no_cache.
+        self.cache_dir = cache_dir
+        self.no_cache = no_cache
+        # Another IGV warms the next variants while one is reviewed.
+        self.prefetcher = None
+        if prefetch_port:
+            self.prefetcher = asyncigv.Prefetcher(
+                asyncigv.AsyncIGV(port=prefetch_port), self.dispatcher,
+                window=prefetch_window)
+        # Remembers the tracks loaded into every IGV, not to load them twice.
+        self.loader = tracks.TrackLoader(self.controller, *(
+            [self.prefetcher.client] if self.prefetcher is not None else []))
 
-        # Test the IGV is running and accepting
-        try:
-            self.controller.check_igv()
-        except OSError:
-            # Be mild about timeouts because IGV timeouts a lot.
-            print("IGV was not detected " +
-                  "on ip {}, port {}".format(self.controller.host,
-                                             self.controller.port))
+        # Test the IGV is running and accepting, without waiting for it.
+        self.dispatcher.submit(self.controller.check_igv()).add_done_callback(
+            lambda future: self.worker.events.put(("igv", None, future)))
 
         self._menubar()
         self._mainframe()
         self.statusbar = StatusBar(self.parent)
 
         self.statusbar.grid(column=0, row=2, columnspan=2, sticky="w")
+        self.parent.after(POLL_INTERVAL, self._poll)
+
+        # Arrows work as the buttons, and can be held down.
+        self.parent.bind("<Left>", lambda event: self._key(event,
+                                                           self.prev_btn))
+        self.parent.bind("<Right>", lambda event: self._key(event,
+                                                            self.next_btn))
 
     def _menubar(self):
         menubar = tk.Menu(self.parent)
@@ -65,6 +138,8 @@ class MainApp():
         menu_file = tk.Menu(menubar)
         menubar.add_cascade(menu=menu_file, label='File')
         menu_file.add_command(label='New...', command=self.new_file)
+        menu_file.add_command(label='Load tracks...',
+                              command=self.load_tracks)
 
     def _mainframe(self):
         self.mainframe = ttk.Frame(self.parent, padding="3 3 12 12")
@@ -83,21 +158,228 @@ class MainApp():
                                    command=self.next_item)
         self.next_btn.grid(column=1, row=0, sticky="e")
 
+        # Number, locus, chromosome or gene to go to.
+        self.query = tk.StringVar()
+        self.query_entry = ttk.Entry(self.mainframe, width=24,
+                                     textvariable=self.query)
+        self.query_entry.grid(column=0, row=1, sticky="we")
+        self.query_entry.bind("<Return>", lambda event: self.jump())
+        self.go_btn = ttk.Button(self.mainframe, text="Go",
+                                 command=self.jump)
+        self.go_btn.grid(column=1, row=1, sticky="e")
+
+        self.flag_btn = ttk.Button(self.mainframe, text="Flag",
+                                   state=("disabled",),
+                                   command=lambda: self.mark("flagged"))
+        self.flag_btn.grid(column=0, row=2, sticky="w")
+        self.review_btn = ttk.Button(self.mainframe, text="Reviewed",
+                                     state=("disabled",),
+                                     command=lambda: self.mark("reviewed"))
+        self.review_btn.grid(column=1, row=2, sticky="e")
+
     def new_file(self):
-        variants_file = askopenfilename(
-            filetypes=(("Tabbed files", ("*.tab", "*.txt")),
-                       ("VCF files", "*.vcf"),
+        variants_files = askopenfilenames(
+            filetypes=(("Tabbed files", ("*.tab", "*.txt", "*.tab.gz")),
+                       ("VCF files", ("*.vcf", "*.vcf.gz")),
                        ("Excel files", ("*.xls", "*.xlsx")),
                        ("All files", "*")))
 
-        if variants_file:
-            self.variants = list(helpers.Variants(variants_file))
-            self.variants_index = 0
+        if not variants_files:
+            return
+
+        if self.loading is not None:
+            # Only the last file asked for matters.
+            self.loading.cancel()
+        self.variants = None
+        self.navigator = None
+        if self.review is not None:
+            self.review.close()
+        self.review = None
+        review_path = self.session_path
+        if review_path is None and not self.no_cache:
+            review_path = session.default_path(variants_files, self.cache_dir)
+        if review_path is not None:
+            try:
+                self.review = session.Session(review_path, variants_files,
+                                              self.resume)
+            except ValueError as error:
+                # Not overwritten: the review goes on without being saved.
+                print(error)
+
+        # Read in the background: files read as they are viewed are ready
+        # at once, others (and sets of files, merged in genomic order) once
+        # parsed.
+        variants_cache = None
+        if not self.no_cache:
+            variants_cache = cache.VariantCache(self.cache_dir)
+        self.loading = self.worker.submit(worker.load_variants,
+                                          list(variants_files),
+                                          variants_cache)
+        if len(variants_files) == 1:
             # Set a maximum of 22 chars
-            self.statusbar.info_label.set(variants_file[-22:])
+            self.statusbar.info_label.set(variants_files[0][-22:])
+        else:
+            self.statusbar.info_label.set(
+                "{} files".format(len(variants_files)))
+        self.statusbar.progress_label.set("Reading...")
+        self.statusbar.start_loading(self.cancel_loading)
+        self.prev_btn.state(statespec=("disabled",))
+        self.next_btn.state(statespec=("disabled",))
+        self.flag_btn.state(statespec=("disabled",))
+        self.review_btn.state(statespec=("disabled",))
+
+    def load_tracks(self):
+        """Load the tracks chosen, or listed in the files chosen, into IGV."""
+        paths = askopenfilenames(
+            filetypes=(("Tracks", ("*.bam", "*.cram", "*.bed", "*.bed.gz",
+                                   "*.bw", "*.bigwig", "*.vcf.gz")),
+                       ("Lists of tracks", ("*.txt", "*.list", "*.tracks")),
+                       ("Genomes", ("*.genome", "*.fa", "*.fasta", "*.json")),
+                       ("All files", "*")))
+        if not paths:
+            return
+
+        try:
+            track_list = tracks.read_tracks(paths)
+        except OSError as error:
+            self.statusbar.progress_label.set(
+                "Can't read the tracks: {}".format(error))
+            return
+
+        started = time.time()
+        self.statusbar.progress_label.set("Loading tracks...")
+        self.dispatcher.submit(self.loader.load(track_list)).add_done_callback(
+            lambda future: self.worker.events.put(
+                ("tracks", None, (future, track_list, started))))
+
+    def cancel_loading(self):
+        if self.loading is not None:
+            self.loading.cancel()
+
+    def jump(self):
+        """Go to the variant typed in the search box, in one IGV move."""
+        query = self.query.get().strip()
+        if not query:
+            return
+        if self.navigator is None:
+            # No variants: IGV can still go to a locus or a gene.
+            self.coalescer.goto(query)
+            return
+
+        # A locus search reads the whole list the first time.
+        navigator, viewed = self.navigator, self.viewed
+        self.jumping = self.searcher.submit(
+            lambda job: (navigator, query, navigator.jump(query, viewed)))
+
+    def mark(self, mark):
+        """Give the variant on screen mark, or take it away if it had it."""
+        item = self.variants[self.viewed]
+        if self.review.mark_of(item) == mark:
+            mark = None
+        self.review.mark(item, mark)
+        self._show_item(item)
+
+    def _poll(self):
+        """Handle the events of the background work, and look again later."""
+        try:
+            for kind, job, value in self.worker.poll():
+                if kind == "igv":
+                    self._igv_checked(value)
+                elif kind == "tracks":
+                    self._tracks_loaded(*value)
+                elif job is self.loading:
+                    self._loading_event(kind, value)
+            for kind, job, value in self.searcher.poll():
+                if job is self.jumping:
+                    self._jump_event(kind, value)
+        finally:
+            # Even after an error, or no later event would be handled.
+            self.parent.after(POLL_INTERVAL, self._poll)
+
+    def _igv_checked(self, future):
+        try:
+            future.result()
+        except (OSError, EOFError, asyncio.TimeoutError):
+            # Be mild about timeouts because IGV timeouts a lot.
+            print("IGV was not detected on {}".format(
+                self.controller.endpoint))
+
+    def _tracks_loaded(self, future, track_list, started):
+        try:
+            lines = tracks.summary(future.result(), track_list,
+                                   time.time() - started)
+        except Exception as error:
+            lines = ["Can't load the tracks: {}".format(error)]
+        # The failures, if any, go to the console.
+        self.statusbar.progress_label.set(lines[0])
+        for line in lines[1:]:
+            print(line)
+
+    def _loading_event(self, kind, value):
+        if kind == "ready" or (kind == "done" and value is not
+                               self.variants):
+            self._set_variants(value)
+        elif kind == "progress":
+            self.statusbar.show_progress(*value)
+            if self.variants is None:
+                self.statusbar.progress_label.set("Reading...")
+            else:
+                self._show_position()
+
+        if kind in ("done", "error", "cancelled"):
+            self.loading = None
+            self.statusbar.stop_loading()
+            if kind == "error":
+                self.statusbar.progress_label.set("Can't read it: {}".format(
+                    value))
+            elif self.variants is None:
+                self.statusbar.progress_label.set("Cancelled")
+            else:
+                self._show_position()
+
+    def _jump_event(self, kind, value):
+        self.jumping = None
+        if kind == "error":
+            self.statusbar.progress_label.set(str(value))
+        elif kind == "done":
+            navigator, query, index = value
+            if index is None:
+                if query is not None:
+                    # Not in the list, as a gene name: IGV looks it up.
+                    self.coalescer.goto(query)
+            elif navigator is self.navigator:
+                self.variants_index = index
+                self.prev_btn.state(statespec=(
+                    "!disabled" if index else "disabled",))
+                self.next_item()
+
+    def _set_variants(self, variants):
+        self.navigator = navigation.Navigator(variants)
+        self.variants = variants
+        self.variants_index = 0
+        self.viewed = None
+        self._show_position()
+        self.prev_btn.state(statespec=("disabled",))
+        self.next_btn.state(statespec=("!disabled",))
+        if self.review is not None and self.review.locus is not None:
+            # Back to the variant the review was left at, found as a jump.
+            navigator, review = self.navigator, self.review
+            self.jumping = self.searcher.submit(
+                lambda job: (navigator, None, review.restore(navigator)))
+
+    def _show_position(self):
+        if self.viewed is None:
             self.statusbar.progress_label.set("{} variants".format(
-                len(self.variants)))
-            self.next_btn.state(statespec=("!disabled",))
+                self._count()))
+        else:
+            self.statusbar.progress_label.set("{} of {}".format(
+                self.viewed + 1, self._count()))
+
+    def _key(self, event, button):
+        # The arrows move the cursor of the search box.
+        if event.widget is not self.query_entry and button.instate(
+                ["!disabled"]):
+            button.invoke()
 
     def next_item(self):
         self._view_item(self.variants[self.variants_index])
@@ -106,7 +388,7 @@ class MainApp():
         if self.variants_index > 0:
             self.prev_btn.state(statespec=("!disabled",))
 
-        if self.variants_index == len(self.variants) - 1:
+        if self._is_last(self.variants_index):
             # Disable the NEXT button at the last element.
             self.next_btn.state(statespec=("disabled",))
         else:
@@ -122,21 +404,52 @@ class MainApp():
         if self.variants_index == 0:
             self.prev_btn.state(statespec=("disabled",))
 
-    def _view_item(self, item):
-        self.statusbar.info_label.set(item)
-        self.statusbar.progress_label.set("{} of {}".format(
-            self.variants_index + 1, len(self.variants)))
+    def _count(self):
+        """Return the number of variants, or those seen so far and a "+"."""
+        if self.variants.complete:
+            return str(len(self.variants))
+        return "{}+".format(self.variants.indexed)
+
+    def _is_last(self, index):
         try:
-            self.controller.goto(":".join(item))
-        except OSError:
-            # IGV always timesout, even working properly.
-            pass
+            self.variants[index + 1]
+        except IndexError:
+            return True
+        return False
+
+    @staticmethod
+    def _straggler(client, error):
+        # Called from the dispatcher thread, where Tk can't be touched.
+        print("IGV on {} didn't follow: {}".format(
+            client.endpoint, str(error) or "timed out"))
+
+    def _show_item(self, item):
+        mark = self.review.mark_of(item) if self.review is not None else None
+        self.statusbar.info_label.set(
+            "{} ({})".format(":".join(item), mark) if mark else item)
+
+    def _view_item(self, item):
+        self._show_item(item)
+        self.viewed = self.variants_index
+        if self.review is not None:
+            self.review.moved(self.viewed, item)
+            self.flag_btn.state(statespec=("!disabled",))
+            self.review_btn.state(statespec=("!disabled",))
+        self._show_position()
+        # Don't wait for IGV, which always timesouts even working properly.
+        self.coalescer.goto(":".join(item))
+        if self.prefetcher is not None:
+            self.prefetcher.update(self.variants, self.variants_index)
 
 
-def guimode():
+def guimode(prefetch_port=None, prefetch_window=3, stats=None, policy=None,
+            endpoints=None, deadline=None, resume=False, cache_dir=None,
+            no_cache=False, session_path=None):
     """Launch the IGV-control as a TK GUI."""
     root = tk.Tk()
-    app = MainApp(root)
+    app = MainApp(root, prefetch_port, prefetch_window, stats, policy,
+                  endpoints, deadline, resume, cache_dir, no_cache,
+                  session_path)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,20 +1,35 @@
 """Provide access through command line to IGV controlling."""
+from array import array
+from collections import namedtuple
+from concurrent.futures import as_completed
+import glob
+import gzip
+from itertools import compress
+import os
+import socket
 import telnetlib
+import threading
+import time
 
-import vcf
+try:
+    from igvcontrol import tabix, xlsx
+except ImportError:
+    import tabix
+    import xlsx
 
 
 class TelnetManager():
 
     """A Context Manager to deal with Sockets through Telnet."""
 
-    def __init__(self, host="localhost", port=23):
+    def __init__(self, host="localhost", port=23, timeout=1):
         self.host = host
         self.port = port
+        self.timeout = timeout
         self.telnet = None
 
     def __enter__(self):
-        self.telnet = telnetlib.Telnet(self.host, self.port, 1)
+        self.telnet = telnetlib.Telnet(self.host, self.port, self.timeout)
 
         return self.telnet
 
@@ -22,13 +37,281 @@ class TelnetManager():
         self.telnet.close()
 
 
+CommandResult = namedtuple("CommandResult", ["command", "response", "ok"])
+# Linux only. Elsewhere, answers are acknowledged when the OS sees fit.
+TCP_QUICKACK = getattr(socket, "TCP_QUICKACK", None)
+# Cells telling the first row of a tab file or a sheet is its header.
+HEADER_WORDS = ("start", "end", "alt", "ref", "chrom", "pos", "position")
+
+
+def is_ok(response):
+    """Return True if response is a successful answer from IGV."""
+    return bool(response) and not response.lower().startswith("error")
+
+
+def quick_ack(sock):
+    """Acknowledge at once what sock received, where the OS allows it.
+
+    IGV may write each answer as soon as the one before is acknowledged
+    (Nagle's algorithm), and a delayed ACK would hold the answers left to
+    a pipelined list of commands for up to 40 ms each. The OS goes back
+    to delaying them, so it's set again after every read.
+    """
+    if TCP_QUICKACK is not None and sock is not None:
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, TCP_QUICKACK, 1)
+        except OSError:
+            pass
+
+
+class Connection():
+
+    """A persistent Telnet session to IGV that reconnects when it breaks.
+
+    timeout is for connecting. Answers are waited for as long as send_many
+    is told, or forever. With a stats.Stats as stats, every call to
+    send_many is timed.
+    """
+
+    def __init__(self, host="localhost", port=60151, timeout=1, stats=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.stats = stats
+        self.telnet = None
+        self.last_used = 0
+        self.lock = threading.RLock()
+
+    @property
+    def is_open(self):
+        return self.telnet is not None
+
+    def open(self, timer=None):
+        """Return the Telnet session, connecting to IGV if needed."""
+        if self.telnet is None:
+            self.telnet = telnetlib.Telnet(self.host, self.port, self.timeout)
+            # Commands are small, and answered before the next is sent.
+            self.telnet.sock.setsockopt(socket.IPPROTO_TCP,
+                                        socket.TCP_NODELAY, 1)
+            if timer is not None:
+                timer.mark("connect")
+
+        return self.telnet
+
+    def close(self):
+        """Close the session. The next command will open a new one."""
+        with self.lock:
+            if self.telnet is not None:
+                self.telnet.close()
+                self.telnet = None
+
+    def close_if_idle(self, idle_timeout):
+        """Close the session if it hasn't been used for idle_timeout secs."""
+        with self.lock:
+            if self.is_open and time.time() - self.last_used > idle_timeout:
+                self.close()
+                return True
+        return False
+
+    def send(self, command, timeout=None):
+        """Return the response line from IGV for command, without the EOL."""
+        return self.send_many([command], timeout=timeout)[0]
+
+    def send_many(self, commands, window=64, timeout=None):
+        """Return the response lines for commands, in the same order.
+
+        Commands are written back-to-back, with at most window of them
+        waiting for an answer, so the whole list costs about one round-trip.
+
+        If a reused session turns out to be broken (IGV restarted or dropped
+        the socket) before anything was answered, it is reopened and the
+        commands sent once more. If it breaks halfway through, the commands
+        left unanswered get None instead of a response.
+
+        If IGV takes longer than timeout seconds to answer, socket.timeout is
+        raised and the session closed, without sending anything again.
+        """
+        with self.lock:
+            retries = 1 if self.is_open else 0
+            timer = self.stats.timer(self.is_open) if self.stats else None
+            responses = []
+            while True:
+                try:
+                    self._send_many(commands, window, responses, timer,
+                                    timeout)
+                    break
+                except socket.timeout as error:
+                    # IGV may still be working on them.
+                    self.close()
+                    self._record(commands, timer, error)
+                    raise
+                except (OSError, EOFError) as error:
+                    self.close()
+                    if responses:
+                        # Part of the list reached IGV. Don't replay it.
+                        responses.extend(
+                            [None] * (len(commands) - len(responses)))
+                        break
+                    if not retries:
+                        self._record(commands, timer, error)
+                        raise
+                    retries -= 1
+
+            self.last_used = time.time()
+            self._record(commands, timer, responses)
+
+        return responses
+
+    def _record(self, commands, timer, result):
+        if timer is None:
+            return
+
+        if isinstance(result, socket.timeout):
+            outcome = "timeout"
+        elif isinstance(result, Exception) or None in result:
+            outcome = "error"
+        elif not all(is_ok(_) for _ in result):
+            outcome = "igv_error"
+        else:
+            outcome = "ok"
+        self.stats.record(self.host, self.port, commands, timer, outcome)
+
+    def _send_many(self, commands, window, responses, timer=None,
+                   timeout=None):
+        """Write commands and append each response line to responses."""
+        t = self.open(timer)
+        sent = pending = 0
+        while sent < len(commands) or pending:
+            if sent < len(commands) and pending <= window // 2:
+                # Many commands per write, as each small write would wait
+                # for IGV to acknowledge the one before.
+                chunk = commands[sent:sent + window - pending]
+                self._write(t, "".join(chunk))
+                sent += len(chunk)
+                pending += len(chunk)
+                if sent == len(commands) and timer is not None:
+                    timer.mark("write")
+                continue
+
+            responses.append(self._readline(t, timeout))
+            pending -= 1
+            if timer is not None:
+                timer.mark_once("first_byte")
+
+        if t.eof:
+            # IGV hung up on us. Don't reuse this session.
+            self.close()
+
+    @staticmethod
+    def _write(t, command):
+        try:
+            t.write(bytes(command, "ascii"))
+        except TypeError:
+            t.write(command)
+
+    @staticmethod
+    def _readline(t, timeout=None):
+        response = t.read_until(b"\n", timeout)
+        quick_ack(t.sock)
+        try:
+            response = str(response, "ascii")
+        except TypeError:
+            pass
+
+        if t.eof and not response:
+            raise EOFError("IGV closed the connection")
+        if not t.eof and not response.endswith("\n"):
+            raise socket.timeout(
+                "IGV didn't answer in {} seconds".format(timeout))
+
+        return response.rstrip("\r\n")
+
+
+class ConnectionPool():
+
+    """Keep one persistent Connection per IGV host and port.
+
+    IGV serves its batch port to one client at a time, so sessions left
+    unused for idle_timeout seconds are closed by a background thread.
+    """
+
+    def __init__(self, idle_timeout=30):
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def get(self, host, port, timeout=1, stats=None):
+        """Return the shared Connection to host:port.
+
+        A stats given here times the connection from now on.
+        """
+        with self.lock:
+            key = (host, port)
+            if key not in self.connections:
+                self.connections[key] = Connection(host, port, timeout)
+            if stats is not None:
+                self.connections[key].stats = stats
+            self._start_reaper()
+
+            return self.connections[key]
+
+    def evict_idle(self):
+        """Close the sessions idle for longer than idle_timeout."""
+        with self.lock:
+            connections = list(self.connections.values())
+
+        return len([_ for _ in connections
+                    if _.close_if_idle(self.idle_timeout)])
+
+    def close_all(self):
+        """Close every session in the pool."""
+        with self.lock:
+            connections = list(self.connections.values())
+
+        for connection in connections:
+            connection.close()
+
+    def _start_reaper(self):
+        if self.reaper is None or not self.reaper.is_alive():
+            self.reaper = threading.Thread(target=self._reap)
+            self.reaper.daemon = True
+            self.reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2.0, 1))
+            self.evict_idle()
+
+
+POOL = ConnectionPool()
+
+
 class IGV():
 
-    """IGV wrapper to control the program through a socket."""
+    """IGV wrapper to control the program through a socket.
+
+    Commands share a persistent connection taken from pool (the module wide
+    POOL by default) instead of connecting once per command. With a
+    stats.Stats as stats, they are timed.
 
-    def __init__(self, host="localhost", port=60151):
+    With a policy.Policy as policy, commands wait for IGV as long as they
+    usually take, idempotent ones are retried, and IGV isn't tried for a
+    while once it fails repeatedly. Without it, IGV has 1 second to accept
+    the connection and all the time it needs to answer.
+    """
+
+    def __init__(self, host="localhost", port=60151, pool=None, stats=None,
+                 policy=None):
         self.host = host
         self.port = port
+        self.pool = pool if pool is not None else POOL
+        self.stats = stats
+        self.policy = policy
+
+    @property
+    def connection(self):
+        return self.pool.get(self.host, self.port, stats=self.stats)
 
     def check_igv(self):
         """Return True if a copy of IGV is reachable."""
@@ -37,22 +320,60 @@ class IGV():
 
         if response.startswith("echo"):
             return True
+
+        # Something answered, but not IGV. Start afresh next time.
+        self.close()
         return False
 
+    def close(self):
+        """Close the connection to IGV, freeing its batch port."""
+        self.connection.close()
+
     def command(self, command):
         """Return the response from IGV for command."""
-        response = ""
         if not command.endswith("\n"):
             command += "\n"
-        with TelnetManager(self.host, self.port) as t:
+
+        return self.send_many([command])[0]
+
+    def batch(self, commands):
+        """Return a CommandResult for each command, sent as a pipeline."""
+        commands = [_ if _.endswith("\n") else _ + "\n" for _ in commands]
+        responses = self.send_many(commands)
+
+        return [CommandResult(c.rstrip("\n"), r, is_ok(r))
+                for c, r in zip(commands, responses)]
+
+    def send_many(self, commands):
+        """Return the responses to commands, following the policy."""
+        if self.policy is None:
+            return self.connection.send_many(commands)
+
+        attempt = 0
+        while True:
+            timeout = self.policy.start(commands)
+            started = time.time()
             try:
-                t.write(bytes(command, "ascii"))
-                response = str(t.read_until(b"\n"), "ascii")
-            except TypeError:
-                t.write(command)
-                response = t.read_until("\n")
+                responses = self.connection.send_many(commands,
+                                                      timeout=timeout)
+            except (OSError, EOFError) as error:
+                delay = self.policy.failed(commands, error, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+            else:
+                if None in responses:
+                    # The session broke halfway. Don't replay the commands.
+                    self.policy.failed(commands, EOFError(),
+                                       self.policy.retries)
+                else:
+                    self.policy.succeeded(commands, time.time() - started)
+                return responses
 
-        return response
+    def pipeline(self):
+        """Return a Pipeline that sends its commands through batch()."""
+        return Pipeline(self)
 
     def goto(self, position):
         """Return "True" if IGV answered "OK" to a goto command."""
@@ -72,6 +393,405 @@ class IGV():
             return True
         return False
 
+    def snapshot(self, filename=""):
+        """Return "True" if IGV answered "OK" to a snapshot command."""
+
+        response = self.command("snapshot {}".format(filename).strip())
+
+        if response.startswith("OK"):
+            return True
+        return False
+
+
+class Pipeline():
+
+    """Queue commands for IGV and send them all at once.
+
+    Use it as a context manager to send the queue on exit::
+
+        >>> with igv.pipeline() as pipe:
+        ...     pipe.goto("chr1:123456")
+        ...     pipe.snapshot("chr1_123456.png")
+        >>> pipe.results
+        [CommandResult(command='goto chr1:123456', response='OK', ok=True),
+         CommandResult(command='snapshot chr1_123456.png', ...)]
+
+    """
+
+    def __init__(self, igv):
+        self.igv = igv
+        self.commands = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.execute()
+
+    def __len__(self):
+        return len(self.commands)
+
+    def command(self, command):
+        """Queue a raw command."""
+        self.commands.append(command)
+        return self
+
+    def goto(self, position):
+        return self.command("goto {}".format(position))
+
+    def load(self, filepath):
+        return self.command("load {}".format(filepath))
+
+    def snapshot(self, filename=""):
+        return self.command("snapshot {}".format(filename).strip())
+
+    def execute(self):
+        """Send the queued commands and return their CommandResults."""
+        self.results = self.igv.batch(self.commands)
+        self.commands = []
+
+        return self.results
+
+
+def open_text(filename):
+    """Open filename to read text, decompressing it if it's gzipped."""
+    if tabix.is_gzip(filename):
+        return gzip.open(filename, "rt")
+    return open(filename)
+
+
+class LineIndex():
+
+    """Random access to the variants in the data lines of a text file.
+
+    The file can be plain or bgzipped, but not just gzipped.
+
+    The byte offset of every data line is recorded the first time the file
+    is read past it, so going back to a line is a single seek. The file is
+    never read beyond the furthest variant asked for (or its length).
+
+    parse turns a line into a variant, and skip(line, line_number) tells
+    the header lines apart. If on_complete is given, every variant is also
+    parsed into a VariantStore while scanning, and on_complete(store) is
+    called once the end of the file is reached.
+    """
+
+    def __init__(self, filename, parse, skip, on_complete=None):
+        self.filename = filename
+        self.parse = parse
+        self.skip = skip
+        self.on_complete = on_complete
+        self.store = VariantStore() if on_complete else None
+        self.offsets = array("Q")
+        self.complete = False
+        self.lock = threading.Lock()
+        self._line_number = 0
+        self._offset = 0
+        self._size = os.path.getsize(filename)
+        if tabix.is_bgzf(filename):
+            # Offsets are BGZF virtual offsets, as tell() returns them.
+            self._scanner = tabix.BgzfReader(filename)
+            self._reader = tabix.BgzfReader(filename)
+            self._tell = self._scanner.tell
+        else:
+            self._scanner = open(filename, "rb")
+            self._reader = open(filename, "rb")
+            self._tell = None
+
+    @property
+    def indexed(self):
+        """Return how many variants have been found so far."""
+        return len(self.offsets)
+
+    @property
+    def progress(self):
+        """Return the fraction of the file scanned so far, from 0 to 1."""
+        if self.complete or not self._size:
+            return 1.0
+        # The offset of the BGZF block, in the upper bits of the virtual one.
+        offset = self._offset >> 16 if self._tell is not None else \
+            self._offset
+
+        return min(offset / self._size, 1.0)
+
+    def __len__(self):
+        self.scan()
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+
+        with self.lock:
+            self._scan(index)
+            if not 0 <= index < len(self.offsets):
+                raise IndexError("variant index out of range")
+
+            self._reader.seek(self.offsets[index])
+            return self.parse(self._decode(self._reader.readline()))
+
+    def scan(self, index=None):
+        """Index the lines up to variant index, or the whole file."""
+        with self.lock:
+            self._scan(index)
+
+    def close(self):
+        self._scanner.close()
+        self._reader.close()
+
+    def _scan(self, index=None):
+        while not self.complete and (
+                index is None or len(self.offsets) <= index):
+            if self._tell is not None:
+                self._offset = self._tell()
+            line = self._scanner.readline()
+            if not line:
+                self.complete = True
+                if self.on_complete:
+                    self.on_complete(self.store)
+                    self.store = None
+                break
+
+            decoded = self._decode(line)
+            if not self.skip(decoded, self._line_number):
+                self.offsets.append(self._offset)
+                if self.store is not None:
+                    self.store.append(*self.parse(decoded))
+            self._line_number += 1
+            self._offset += len(line)
+
+    @staticmethod
+    def _decode(line):
+        return line.decode("utf-8", "replace").replace("\r\n", "\n")
+
+
+def chrom_key(chrom):
+    """Return a sort key putting chromosomes in their natural order.
+
+    chr1, chr2 ... chr10 ... chr22, chrX, chrY, chrM, then any other
+    contig in alphabetical order. The "chr" prefix is optional.
+    """
+    name = chrom[3:] if chrom.lower().startswith("chr") else chrom
+    if name.isdigit():
+        return (0, int(name), "")
+    if name.upper() in ("X", "Y", "M", "MT"):
+        return (1, "XYMT".index(name.upper()[0]), "")
+    return (2, 0, name)
+
+
+def typecode(values):
+    """Return the typecode of values, an array or a memoryview."""
+    return getattr(values, "typecode", None) or values.format
+
+
+class Locus():
+
+    """A variant in a VariantStore.
+
+    It iterates, indexes and compares like the ("chr1", "123456") tuples
+    the generators in Variants yield, so ":".join(locus) gives the IGV
+    locus. The locus string is only built when asked for.
+    """
+
+    __slots__ = ("chrom", "pos")
+
+    def __init__(self, chrom, pos):
+        self.chrom = chrom
+        self.pos = int(pos)
+
+    def __iter__(self):
+        yield self.chrom
+        yield str(self.pos)
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return "Locus({!r}, {!r})".format(self.chrom, self.pos)
+
+    def __str__(self):
+        return "{}:{}".format(self.chrom, self.pos)
+
+
+class VariantStore():
+
+    """Variants held in two arrays: chromosome codes and positions.
+
+    Each chromosome name is stored once and every variant costs a couple
+    of bytes for its chromosome code and four for its position, instead
+    of a tuple of two strings. Items are returned as Locus objects::
+
+        >>> store = VariantStore.from_iterable([("chr1", "123456")])
+        >>> store[0]
+        Locus('chr1', 123456)
+        >>> ":".join(store[0])
+        'chr1:123456'
+
+    It has the LineIndex interface, so it can index a Variants.
+    """
+
+    complete = True
+
+    def __init__(self):
+        self.chroms = []
+        self.codes = array("H")
+        self.positions = array("I")
+        self._chrom_codes = {}
+
+    @classmethod
+    def from_arrays(cls, chroms, codes, positions):
+        """Return a VariantStore over existing arrays of codes and positions.
+
+        They can be read-only memoryviews too, e.g. over a mmap.
+        """
+        store = cls()
+        store.chroms = list(chroms)
+        store._chrom_codes = dict((c, i) for i, c in enumerate(store.chroms))
+        store.codes = codes
+        store.positions = positions
+
+        return store
+
+    @classmethod
+    def from_iterable(cls, variants):
+        """Return a VariantStore with the (chrom, position) in variants."""
+        store = cls()
+        store.extend(variants)
+
+        return store
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(*index.indices(len(self))))
+
+        return Locus(self.chroms[self.codes[index]], self.positions[index])
+
+    def __iter__(self):
+        chroms = self.chroms
+        for code, position in zip(self.codes, self.positions):
+            yield Locus(chroms[code], position)
+
+    @property
+    def indexed(self):
+        return len(self)
+
+    def scan(self, index=None):
+        pass
+
+    def code(self, chrom):
+        """Return the code for chrom, adding it to the known ones."""
+        try:
+            return self._chrom_codes[chrom]
+        except KeyError:
+            code = self._chrom_codes[chrom] = len(self.chroms)
+            self.chroms.append(chrom)
+            if code > 0xFFFF and typecode(self.codes) == "H":
+                self.codes = array("I", self.codes)
+            return code
+
+    def append(self, chrom, position):
+        self.codes.append(self.code(chrom))
+        self.positions.append(int(position))
+
+    def extend(self, variants):
+        for chrom, position in variants:
+            self.append(chrom, position)
+
+    def locus(self, index):
+        """Return the "chrom:position" string IGV expects for index."""
+        return "{}:{}".format(self.chroms[self.codes[index]],
+                              self.positions[index])
+
+    def take(self, indices):
+        """Return a new VariantStore with the variants at indices."""
+        store = self._empty_copy()
+        store.codes.extend([self.codes[_] for _ in indices])
+        store.positions.extend([self.positions[_] for _ in indices])
+
+        return store
+
+    def select(self, mask):
+        """Return a new VariantStore with the variants where mask is true."""
+        store = self._empty_copy()
+        store.codes.extend(compress(self.codes, mask))
+        store.positions.extend(compress(self.positions, mask))
+
+        return store
+
+    def sort(self):
+        """Sort by natural chromosome order, then position, in place."""
+        ranked = sorted(range(len(self.chroms)),
+                        key=lambda _: chrom_key(self.chroms[_]))
+        rank = [0] * len(ranked)
+        for r, code in enumerate(ranked):
+            rank[code] = r
+
+        # One integer per variant sorts much faster than tuples.
+        keys = sorted([rank[c] << 32 | p
+                       for c, p in zip(self.codes, self.positions)])
+
+        self.codes = array(typecode(self.codes),
+                           [ranked[_ >> 32] for _ in keys])
+        self.positions = array("I", [_ & 0xFFFFFFFF for _ in keys])
+
+    def unique(self):
+        """Drop the repeated variants of a sorted store, in place."""
+        keep = [True] * len(self)
+        for i in range(1, len(self)):
+            keep[i] = (self.positions[i] != self.positions[i - 1] or
+                       self.codes[i] != self.codes[i - 1])
+
+        unique = self.select(keep)
+        self.codes, self.positions = unique.codes, unique.positions
+
+    @classmethod
+    def merge(cls, stores):
+        """Return a VariantStore with the variants of every store."""
+        merged = cls()
+        for store in stores:
+            codes = [merged.code(_) for _ in store.chroms]
+            merged.codes.extend([codes[_] for _ in store.codes])
+            merged.positions.extend(store.positions)
+
+        return merged
+
+    def as_numpy(self):
+        """Return (codes, positions) as NumPy arrays sharing this memory."""
+        import numpy
+
+        return (numpy.frombuffer(self.codes, dtype=typecode(self.codes)),
+                numpy.frombuffer(self.positions,
+                                 dtype=typecode(self.positions)))
+
+    def _empty_copy(self):
+        store = type(self)()
+        store.chroms = list(self.chroms)
+        store._chrom_codes = dict(self._chrom_codes)
+        store.codes = array(typecode(self.codes))
+
+        return store
+
 
 class Variants():
 
@@ -89,11 +809,36 @@ class Variants():
         ("chr1", "123456")
         ("chr1", "456789")
 
+    Or access them by index, reading the file only as far as needed::
+
+        >>> variants[1]
+        ("chr1", "456789")
+
+    With a cache.VariantCache as cache, the parsed variants are kept on
+    disk and later opens of the same file skip the parsing.
+
+    Excel files are read from the first sheet, with the chromosome and the
+    position in the first two columns, unless told otherwise by sheet
+    (index or name) and columns (0-based).
+
+    VCF and TAB files can be gzipped. With a region ("chr7:1-2000000")
+    only the variants in it are kept, and if the file is bgzipped with a
+    tabix or CSI index only the parts of the file holding them are read.
+
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, cache=None, region=None, sheet=0,
+                 columns=(0, 1)):
         self.filename = filename
+        # The cache holds whole files, not regions or other columns.
+        self.cache = cache if (
+            region, sheet, tuple(columns)) == (None, 0, (0, 1)) else None
+        self.region = region
+        self.sheet = sheet
+        self.columns = tuple(columns)
         self.variants = None
+        self.format = None
+        self._index = None
         self.load()
 
     def __iter__(self):
@@ -105,6 +850,93 @@ class Variants():
     def next(self):
         return self.__next__()
 
+    def __len__(self):
+        """Return the number of variants. This reads the whole file."""
+        return len(self.index)
+
+    def __getitem__(self, index):
+        return self.index[index]
+
+    @property
+    def index(self):
+        """Return the LineIndex (or VariantStore) giving random access."""
+        if self._index is None and self.cache is not None:
+            self._index = self.cache.get(self.filename)
+
+        if self._index is None:
+            # Fill the cache once the whole file has been read.
+            on_complete = self._cache_store if self.cache is not None else None
+            if not self.seekable:
+                # No offsets to seek to: keep the variants in memory.
+                self._index = self.to_store()
+            elif self.format == "vcf":
+                self._index = LineIndex(
+                    self.filename, self.vcf_locus,
+                    lambda line, number: line.startswith("#"), on_complete)
+            else:
+                self._index = LineIndex(
+                    self.filename, self.tab_locus,
+                    lambda line, number: number == 0 and
+                    self.is_tab_header(line), on_complete)
+
+        return self._index
+
+    @property
+    def seekable(self):
+        """Return True if the variants are read from the file as needed.
+
+        Otherwise, the first access to a variant reads them all.
+        """
+        return self.format in ("vcf", "tab") and self.region is None and \
+            not (tabix.is_gzip(self.filename) and
+                 not tabix.is_bgzf(self.filename))
+
+    @property
+    def indexed(self):
+        """Return how many variants have been found so far."""
+        return self.index.indexed
+
+    @property
+    def complete(self):
+        """Return True if the number of variants is already known."""
+        return self.index.complete
+
+    def to_store(self, progress=None, every=10000):
+        """Return all the variants in a compact VariantStore.
+
+        progress, if given, is called with the number of variants read
+        every so many of them. It can raise to stop reading.
+        """
+        if self.cache is not None:
+            store = self.cache.get(self.filename)
+            if store is not None:
+                return store
+
+        if progress is None:
+            store = VariantStore.from_iterable(self.load_generator())
+        else:
+            store = VariantStore()
+            for count, (chrom, position) in enumerate(
+                    self.load_generator(), 1):
+                store.append(chrom, position)
+                if not count % every:
+                    progress(count)
+        self._cache_store(store)
+
+        return store
+
+    def _cache_store(self, store):
+        if self.cache is not None:
+            self.cache.put(self.filename, store)
+
+    def load_generator(self):
+        """Return a fresh generator over all the variants."""
+        previous = self.variants
+        self.load()
+        generator, self.variants = self.variants, previous
+
+        return generator
+
     def load(self):
         """Set a generator from a filetab if it's a VCF or a TAB file."""
         if self.filename.endswith((".xls", ".xlsx")):
@@ -112,52 +944,165 @@ class Variants():
         elif not self.loadvcf():
             self.loadtab()
 
+        if self.region is not None:
+            self.variants = self.region_generator(self.variants)
+
     def loadtab(self):
         """Return a generator if the filepath is a valid VCF 4.0 file."""
-        with open(self.filename) as tabfile:
+        with open_text(self.filename) as tabfile:
             first_line = tabfile.readline().split("\t")
             if len(first_line) < 5:
                 # This doesn't seem to be a valid tab file.
                 return False
 
         self.variants = self.tab_generator()
+        self.format = "tab"
         return True
 
     def loadvcf(self):
         """Return a generator if the filepath is a valid VCF 4.0 file."""
-        vcf_reader = vcf.Reader(open(self.filename), prepend_chr=True)
-
-        if vcf_reader.infos:
-            # It seems to be a valid VCF file
-            self.variants = self.vcf_generator(vcf_reader)
+        if self.is_vcf(self.filename):
+            # Only CHROM and POS are needed: don't decode whole records.
+            self.variants = self.vcf_line_generator()
+            self.format = "vcf"
             return True
 
         return False
 
+    def records(self):
+        """Return a vcf.Reader over the whole records, with every field.
+
+        Much slower than iterating the variants: use it only when fields
+        other than the chromosome and position are needed.
+        """
+        # PyVCF is slow to import, and only needed here.
+        import vcf
+
+        return vcf.Reader(open_text(self.filename), prepend_chr=True)
+
     def loadxls(self):
         """Return True if it can set a generator with the filename."""
-        from xlrd import open_workbook
+        if self.filename.endswith(".xlsx"):
+            # Streamed, where xlrd would load the whole workbook.
+            reader = xlsx.XlsxReader(self.filename)
+            self.variants = self.rows_generator(reader.rows(self.sheet),
+                                                self.columns)
+        else:
+            from xlrd import open_workbook
 
-        book = open_workbook(self.filename)
+            book = open_workbook(self.filename, on_demand=True)
+            if isinstance(self.sheet, int):
+                sheet = book.sheet_by_index(self.sheet)
+            else:
+                sheet = book.sheet_by_name(self.sheet)
 
-        self.variants = self.xls_generator(book.sheet_by_index(0))
+            self.variants = self.xls_generator(sheet, self.columns)
+        self.format = "xls"
 
         return True
 
+    def region_generator(self, variants):
+        """Yield the variants in self.region.
+
+        A bgzipped VCF or TAB file with an index is queried through it.
+        Otherwise the variants are read and filtered.
+        """
+        chrom, start, end = tabix.parse_region(self.region)
+
+        index = None
+        if self.format in ("vcf", "tab") and tabix.is_bgzf(self.filename):
+            index = tabix.TabixIndex.find(self.filename)
+
+        if index is not None:
+            locus = self.vcf_locus if self.format == "vcf" else self.tab_locus
+            for line in index.fetch(self.filename, chrom, start, end):
+                yield locus(line)
+        else:
+            names = tabix.chrom_aliases(chrom)
+            for variant in variants:
+                if variant[0] in names and start <= int(variant[1]) <= end:
+                    yield variant
+
     def tab_generator(self):
         """Yield line by line from a tab file except the header line."""
-        first_line = False
-        with open(self.filename) as tabfile:
-            for line in tabfile:
-                s_line = tuple(line.split("\t")[:2])
-                if first_line:
-                    yield s_line
-                else:
-                    first_line = line.lower().split("\t")
-                    if not any([_ in first_line for _ in
-                                ["start", "end", "alt", "ref"]]):
-                        # This file doesn't have a header
-                        yield s_line
+        with open_text(self.filename) as tabfile:
+            for number, line in enumerate(tabfile):
+                if number > 0 or not self.is_tab_header(line):
+                    yield self.tab_locus(line)
+
+    @staticmethod
+    def is_tab_header(line):
+        """Return True if line looks like the header of a tab file.
+
+        That is, if it names a column as headers do ("Start", "Pos"...) or
+        has no number where the position goes.
+        """
+        first_line = line.rstrip("\r\n").lower().split("\t")
+        return any([_ in first_line for _ in HEADER_WORDS]) or \
+            len(first_line) < 2 or not first_line[1].strip().isdigit()
+
+    @staticmethod
+    def tab_locus(line):
+        """Return the (chrom, position) in a line of a tab file."""
+        return tuple(line.split("\t")[:2])
+
+    @staticmethod
+    def vcf_locus(line):
+        """Return the (chrom, position) in a data line of a VCF file."""
+        fields = line.split("\t", 2)
+        # Same as vcf.Reader with prepend_chr=True
+        return ("chr" + fields[0], str(int(fields[1])))
+
+    def vcf_line_generator(self):
+        """Yield the (chrom, position) of each data line of the VCF.
+
+        Lines are cut at the third column, leaving INFO, FORMAT and the
+        samples unparsed.
+        """
+        with open_text(self.filename) as vcffile:
+            for line in vcffile:
+                if not line.startswith("#"):
+                    yield self.vcf_locus(line)
+
+    def vcf_lines(self):
+        """Yield the data lines of the VCF, those in self.region if set."""
+        names = None
+        if self.region is not None:
+            chrom, start, end = tabix.parse_region(self.region)
+            index = None
+            if tabix.is_bgzf(self.filename):
+                index = tabix.TabixIndex.find(self.filename)
+            if index is not None:
+                for line in index.fetch(self.filename, chrom, start, end):
+                    yield line
+                return
+            names = tabix.chrom_aliases(chrom)
+
+        with open_text(self.filename) as vcffile:
+            for line in vcffile:
+                if line.startswith("#"):
+                    continue
+                if names is not None:
+                    fields = line.split("\t", 2)
+                    if fields[0] not in names or \
+                            not start <= int(fields[1]) <= end:
+                        continue
+                yield line
+
+    @staticmethod
+    def is_vcf(filename):
+        """Return True if filename starts with a VCF header with INFO lines.
+
+        The same files vcf.Reader finds any INFO in.
+        """
+        with open_text(filename) as vcffile:
+            for line in vcffile:
+                if not line.startswith("##"):
+                    return False
+                if line.startswith("##INFO="):
+                    return True
+
+        return False
 
     @staticmethod
     def vcf_generator(generator):
@@ -166,22 +1111,146 @@ class Variants():
             yield (variant.CHROM, str(variant.POS))
 
     @staticmethod
-    def xls_generator(sheet):
+    def xls_generator(sheet, columns=(0, 1)):
         """Yield only the fields we are interested in from the XLS."""
-        first_line = False
-        for row in sheet.get_rows():
-            chrom = row[0].value
+        return Variants.rows_generator(
+            ([_.value for _ in row] for row in sheet.get_rows()), columns)
+
+    @staticmethod
+    def rows_generator(rows, columns=(0, 1)):
+        """Yield the (chrom, position) in columns of spreadsheet rows."""
+        first_line = True
+        for row in rows:
+            # Trailing empty cells may be missing from the row.
+            chrom, position = [row[_] if _ < len(row) else ""
+                               for _ in columns]
+            if chrom == "" and position == "":
+                # A blank row, or one with other columns only.
+                continue
+            if isinstance(chrom, float) and chrom.is_integer():
+                # Chromosome 1 in a numeric cell.
+                chrom = int(chrom)
             try:
-                position = int(row[1].value)
+                position = int(float(position))
             except ValueError:
-                # This must be the header with "Start"
-                position = row[1].value
-            s_line = tuple([chrom, str(position)])
+                if first_line:
+                    # This must be the header with "Start" or "Position"
+                    first_line = False
+                    continue
             if first_line:
-                yield s_line
-            else:
-                first_line = [_.value.lower() for _ in row]
-                if not any([_ in first_line for _ in
-                            ["start", "end", "alt", "ref"]]):
-                    # This file doesn't have a header
-                    yield s_line
+                first_line = False
+                if any([str(_).lower() in HEADER_WORDS for _ in row]):
+                    continue
+            yield (str(chrom), str(position))
+
+
+def expand_paths(patterns):
+    """Return the files matching the glob patterns, sorted, in order.
+
+    Patterns matching nothing are returned as they are.
+    """
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    return paths
+
+
+def _load_store(filename, options, variant_filter=None):
+    """Return the variants in filename as (chroms, codes, positions).
+
+    options are the keyword arguments of Variants. variant_filter, a
+    filters.VariantFilter, keeps only some.
+    """
+    variants = Variants(filename, **options)
+    if variant_filter is None:
+        store = variants.to_store()
+    else:
+        store = variant_filter.apply(variants)
+
+    # Stores read from the cache are memoryviews, which can't be pickled.
+    return (store.chroms, array(typecode(store.codes), store.codes),
+            array(typecode(store.positions), store.positions))
+
+
+class VariantSet():
+
+    """The variants of many files, as one sorted and deduplicated list.
+
+    Files are parsed in a pool of processes (one per core by default) and
+    their variants merged in natural chromosome order, then position::
+
+        >>> variants = VariantSet(["sample1.vcf", "calls/*.tab"])
+        >>> variants[0]
+        Locus('chr1', 123456)
+
+    cache, region, sheet and columns apply to every file, as in Variants.
+    A filters.VariantFilter as variant_filter is applied to each file in
+    the pool. progress, if given, is called with (files read, files) as
+    each one is done. It can raise to stop reading: the files being read
+    are dropped, without waiting for them.
+    """
+
+    complete = True
+
+    def __init__(self, paths, cache=None, region=None, processes=None,
+                 sheet=0, columns=(0, 1), variant_filter=None, progress=None):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.filenames = expand_paths(paths)
+        self.cache = cache
+        self.region = region
+        self.sheet = sheet
+        self.columns = tuple(columns)
+        self.variant_filter = variant_filter
+        self.store = self.load(processes, progress)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        return self.store[index]
+
+    def __iter__(self):
+        return iter(self.store)
+
+    @property
+    def indexed(self):
+        return len(self.store)
+
+    def load(self, processes=None, progress=None):
+        """Return the merged VariantStore of all the files."""
+        options = {"cache": self.cache, "region": self.region,
+                   "sheet": self.sheet, "columns": self.columns}
+        arguments = [(_, options, self.variant_filter)
+                     for _ in self.filenames]
+        if processes == 1 or len(arguments) < 2:
+            loaded = []
+            for argument in arguments:
+                loaded.append(_load_store(*argument))
+                if progress is not None:
+                    progress(len(loaded), len(arguments))
+        else:
+            # Loads multiprocessing, only needed for several files.
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(processes)
+            futures = [executor.submit(_load_store, *_) for _ in arguments]
+            try:
+                for done, _ in enumerate(as_completed(futures), 1):
+                    if progress is not None:
+                        progress(done, len(futures))
+                loaded = [_.result() for _ in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=False)
+                raise
+            executor.shutdown()
+
+        store = VariantStore.merge(
+            VariantStore.from_arrays(*_) for _ in loaded)
+        store.sort()
+        store.unique()
+
+        return store
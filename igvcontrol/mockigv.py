@@ -0,0 +1,278 @@
+"""A stand-in for the batch port of IGV, to test and load test against.
+
+It answers like IGV ("echo" to echo, "OK" to the commands it knows) over
+connections kept open for as many commands as the client sends, taking a
+configurable time to answer and failing on demand::
+
+    >>> with MockIGV(latency="normal:0.05:0.01", errors=0.01) as igv:
+    ...     client = helpers.IGV(port=igv.port)
+    ...     client.goto("chr1:123456")
+
+Run it on its own to point igvcontrol at it::
+
+    $ python -m igvcontrol.mockigv --port 60151 --latency goto=0.05,load=2
+"""
+import argparse
+from collections import namedtuple
+import random
+import socketserver
+import threading
+import time
+
+# Commands answered "OK". Any other is an "ERROR", as IGV does.
+COMMANDS = frozenset(["goto", "load", "genome", "snapshot",
+                      "snapshotDirectory", "new", "collapse", "expand",
+                      "squish", "sort", "region", "maxPanelHeight",
+                      "setSleepInterval", "preference", "viewaspairs",
+                      "exit"])
+# Seconds a stalled command waits before the connection is closed.
+STALL = 3600.0
+
+Request = namedtuple("Request", ["time", "client", "command", "response",
+                                 "seconds"])
+
+
+def parse_latency(spec):
+    """Return a function of a random.Random giving latencies, from spec.
+
+    spec is seconds ("0.05") or a distribution: "uniform:LOW:HIGH",
+    "normal:MEAN:SD" (never below 0) or "exponential:MEAN". Raise
+    ValueError if it's none of them.
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: spec
+
+    name, _, arguments = spec.partition(":")
+    try:
+        values = [float(_) for _ in arguments.split(":")] if arguments \
+            else [float(name)]
+    except ValueError:
+        raise ValueError("Bad latency: {}".format(spec))
+
+    if not arguments:
+        return lambda rng: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if name == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(*values))
+    if name == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] \
+            else 0.0
+
+    raise ValueError("Bad latency: {}".format(spec))
+
+
+def parse_latencies(spec):
+    """Return {verb: latency function} for "goto=0.05,load=uniform:1:3".
+
+    The latency without a verb ("0.01", or "0.01,load=2") is that of every
+    other command, under the key None.
+    """
+    latencies = {None: parse_latency(0)}
+    for part in spec.split(","):
+        verb, _, latency = part.rpartition("=")
+        latencies[verb or None] = parse_latency(latency.strip())
+
+    return latencies
+
+
+class MockIGVHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        """Answer every command received until the client hangs up."""
+        client = "{}:{}".format(*self.client_address[:2])
+        logging = self.server.logging
+        for line in self.rfile:
+            command = line.decode("ascii", "replace").strip()
+            started = time.time() if logging else None
+            response = self.server.answer(command)
+            if logging:
+                self.server.log(Request(started, client, command, response,
+                                        time.time() - started))
+            if response is None:
+                # Dropped or stalled: hang up without answering.
+                return
+            self.wfile.write(response.encode("ascii") + b"\n")
+
+
+class MockIGV(socketserver.ThreadingMixIn, socketserver.TCPServer):
+
+    """A batch port of IGV answering after a latency, failing at will.
+
+    latency is the seconds to answer each command: a number, a spec of
+    parse_latency, or a dict of them by verb, None for the rest. Of the
+    commands, a fraction errors is answered "ERROR", a fraction drops
+    hangs up the connection and a fraction stalls never gets an answer
+    (the connection is closed after stall seconds, or on stop()). seed
+    makes the failures and latencies repeat from run to run.
+
+    With serial, commands are answered one at a time, even from several
+    connections, as IGV does. Every command is kept in requests, if
+    keep_requests, and written to log_file, as tab separated Request
+    fields.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    # Many clients connecting at once would overflow the default backlog
+    # of 5, and wait a second to retry.
+    request_queue_size = 128
+
+    def __init__(self, address=("localhost", 0), latency=0, errors=0.0,
+                 drops=0.0, stalls=0.0, stall=STALL, serial=False,
+                 seed=None, keep_requests=True, log_file=None):
+        super().__init__(address, MockIGVHandler)
+        if not isinstance(latency, dict):
+            latency = {None: latency}
+        self.latencies = dict((verb, parse_latency(_) if not callable(_)
+                               else _) for verb, _ in latency.items())
+        self.latencies.setdefault(None, parse_latency(0))
+        self.errors = errors
+        self.drops = drops
+        self.stalls = stalls
+        self.stall = stall
+        self.random = random.Random(seed)
+        self.requests = [] if keep_requests else None
+        self.log_file = log_file
+        self.stopping = threading.Event()
+        self._serial = threading.Lock() if serial else None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def logging(self):
+        return self.requests is not None or self.log_file is not None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def commands(self):
+        """The commands received so far, in order."""
+        with self._lock:
+            return [_.command for _ in self.requests or []]
+
+    def start(self):
+        """Serve in a background thread, and return self."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """Stop serving, releasing stalled connections, and close."""
+        self.stopping.set()
+        if self._thread is not None:
+            self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _draw(self, verb):
+        """Return the latency and the fate of the next command of verb."""
+        with self._lock:
+            latency = self.latencies.get(verb, self.latencies[None])(
+                self.random)
+            if not (self.stalls or self.drops or self.errors):
+                return latency, "ok"
+            chance = self.random.random()
+
+        for fate, fraction in (("stall", self.stalls), ("drop", self.drops),
+                               ("error", self.errors)):
+            if chance < fraction:
+                return latency, fate
+            chance -= fraction
+
+        return latency, "ok"
+
+    def answer(self, command):
+        """Return the response to command, or None to hang up instead."""
+        words = command.split()
+        verb = words[0] if words else ""
+        latency, fate = self._draw(verb)
+
+        if self._serial is not None:
+            with self._serial:
+                return self._answer(verb, latency, fate)
+        return self._answer(verb, latency, fate)
+
+    def _answer(self, verb, latency, fate):
+        if fate == "stall":
+            self.stopping.wait(self.stall)
+            return None
+        if latency:
+            self.stopping.wait(latency)
+        if fate == "drop":
+            return None
+        if fate == "error":
+            return "ERROR injected failure"
+
+        if verb == "echo":
+            return "echo"
+        if verb in COMMANDS:
+            return "OK"
+        return "ERROR Unknown command: {}".format(verb)
+
+    def log(self, request):
+        with self._lock:
+            if self.requests is not None:
+                self.requests.append(request)
+            if self.log_file is not None:
+                self.log_file.write("{:.6f}\t{}\t{}\t{}\t{:.6f}\n".format(
+                    *request))
+                # Kept if the server is killed.
+                self.log_file.flush()
+
+
+def parse_args(argv=None):
+    """Return the options in argv (sys.argv by default)."""
+    parser = argparse.ArgumentParser(
+        description="Answer on a port as the batch port of IGV does.")
+    parser.add_argument("--port", type=int, default=60151,
+                        help="Port to listen on. Defaults to 60151")
+    parser.add_argument("--latency", type=parse_latencies, default="0",
+                        help="Seconds to answer, or a distribution: " +
+                        "uniform:LOW:HIGH, normal:MEAN:SD or " +
+                        "exponential:MEAN. Prefix VERB= to set them by " +
+                        "command, e.g. goto=0.05,load=uniform:1:3")
+    parser.add_argument("--errors", type=float, default=0.0,
+                        help="Fraction of the commands answered ERROR")
+    parser.add_argument("--drops", type=float, default=0.0,
+                        help="Fraction of the commands hanging up instead")
+    parser.add_argument("--stalls", type=float, default=0.0,
+                        help="Fraction of the commands never answered")
+    parser.add_argument("--serial", action="store_true",
+                        help="Answer one command at a time, as IGV does")
+    parser.add_argument("--seed", type=int,
+                        help="Repeat the same latencies and failures")
+    parser.add_argument("--log",
+                        help="Write every command, its answer and time " +
+                        "to this file")
+
+    return parser.parse_args(argv)
+
+
+def main(cmd_args):
+    log_file = open(cmd_args.log, "a") if cmd_args.log else None
+    server = MockIGV(("localhost", cmd_args.port), cmd_args.latency,
+                     cmd_args.errors, cmd_args.drops, cmd_args.stalls,
+                     serial=cmd_args.serial, seed=cmd_args.seed,
+                     keep_requests=False, log_file=log_file)
+    print("Mock IGV listening on localhost:{}".format(server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if log_file is not None:
+            log_file.close()
+
+
+if __name__ == "__main__":
+    main(parse_args())
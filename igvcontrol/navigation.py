@@ -0,0 +1,177 @@
+"""Jump straight to a variant, by its number or its place in the genome."""
+from array import array
+from bisect import bisect_left
+import re
+
+try:
+    from igvcontrol import filters
+except ImportError:
+    import filters
+
+LOCUS = re.compile(r"^\s*([^\s:]+)(?::([\d,]+)(?:-[\d,]+)?)?\s*$")
+
+
+class LocusIndex():
+
+    """The variants of a list, sorted by position on each chromosome.
+
+    Each chromosome keeps the positions of its variants, sorted, and their
+    indexes in the list, so a locus is found by bisecting::
+
+        >>> index = LocusIndex(variants)
+        >>> index.find("chr12", 25398284)
+        40211
+
+    Chromosomes match with or without their "chr" prefix.
+    """
+
+    def __init__(self, variants):
+        by_chrom = {}
+        for i, (chrom, position) in enumerate(self._loci(variants)):
+            by_chrom.setdefault(filters.chrom_name(chrom), []).append(
+                (position, i))
+
+        self.positions = {}
+        self.indexes = {}
+        for chrom, loci in by_chrom.items():
+            loci.sort()
+            self.positions[chrom] = array("I", (_[0] for _ in loci))
+            self.indexes[chrom] = array("L", (_[1] for _ in loci))
+
+    @staticmethod
+    def _loci(variants):
+        """Yield the (chrom, start) of variants, the fastest way they offer.
+
+        Variants read as needed are read whole, from the cache if they are
+        in it.
+        """
+        if hasattr(variants, "to_store"):
+            variants = variants.to_store()
+        elif hasattr(variants, "store"):
+            variants = variants.store
+
+        starts = getattr(variants, "positions", getattr(variants, "starts",
+                                                        None))
+        if starts is not None and hasattr(variants, "codes"):
+            chroms = variants.chroms
+            for code, start in zip(variants.codes, starts):
+                yield chroms[code], start
+            return
+
+        for chrom, position in variants:
+            # Spans of sorting.Clusters are "start-end".
+            yield chrom, int(str(position).split("-")[0])
+
+    def __len__(self):
+        return sum(len(_) for _ in self.positions.values())
+
+    def find(self, chrom, position=0):
+        """Return the index of the first variant at or after a position.
+
+        None if there is none on chrom after position.
+        """
+        positions = self.positions.get(filters.chrom_name(chrom))
+        if positions is None:
+            return None
+
+        i = bisect_left(positions, position)
+        if i == len(positions):
+            return None
+
+        return self.indexes[filters.chrom_name(chrom)][i]
+
+    def after(self, chrom, position):
+        """Return the index of the first variant past position on chrom."""
+        return self.find(chrom, position + 1)
+
+
+class Navigator():
+
+    """Turn what the user types into the index of a variant to view.
+
+    A query can be:
+
+    * a number, 1-based: "40000", "#40,000" (type chromosome 20 as
+      "chr20");
+    * a locus, for the first variant at or after it: "chr12:25398284",
+      "12:25,398,000-25,399,000";
+    * a chromosome, for the next variant on it after the one on screen:
+      "chr12".
+
+    Anything else (a gene name) isn't in the list of variants: jump() gives
+    None, for IGV to look it up itself. The LocusIndex is built on the
+    first search by locus.
+    """
+
+    def __init__(self, variants):
+        self.variants = variants
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = LocusIndex(self.variants)
+        return self._index
+
+    def jump(self, query, current=None):
+        """Return the index of the variant query asks for, or None.
+
+        current is the index of the variant on screen, if any. Raise
+        ValueError if the query is a number or locus without variants.
+        """
+        text = query.strip().lstrip("#")
+        if text.replace(",", "").isdigit():
+            number = int(text.replace(",", ""))
+            if number < 1:
+                raise ValueError("Variants are numbered from 1")
+            try:
+                # Reads a lazy list of variants as far as needed.
+                self.variants[number - 1]
+            except IndexError:
+                raise ValueError("There are only {} variants".format(
+                    len(self.variants)))
+            return number - 1
+
+        match = LOCUS.match(query)
+        if match is None:
+            return None
+        chrom, position = match.groups()
+        if filters.chrom_name(chrom) not in self.index.positions:
+            if position is None and not self._looks_like_chrom(chrom):
+                # A gene name.
+                return None
+            raise ValueError("No variants on {}".format(chrom))
+
+        if position is not None:
+            found = self.index.find(chrom, int(position.replace(",", "")))
+            if found is None:
+                raise ValueError("No variants on {} from {}".format(
+                    chrom, position))
+            return found
+
+        on_screen = self._on_screen(current)
+        if on_screen is not None and filters.chrom_name(
+                on_screen[0]) == filters.chrom_name(chrom):
+            found = self.index.after(chrom, on_screen[1])
+        else:
+            found = self.index.find(chrom)
+        if found is None:
+            raise ValueError("No more variants on {}".format(chrom))
+
+        return found
+
+    def _on_screen(self, current):
+        """Return the (chrom, start) of variant current, or None."""
+        if current is None:
+            return None
+        try:
+            chrom, position = self.variants[current]
+        except IndexError:
+            return None
+
+        return chrom, int(str(position).split("-")[0])
+
+    @staticmethod
+    def _looks_like_chrom(name):
+        name = filters.chrom_name(name)
+        return name.isdigit() or name.upper() in ("X", "Y", "M", "MT")
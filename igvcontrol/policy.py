@@ -0,0 +1,195 @@
+"""Decide how long to wait for IGV, and when to try again."""
+import socket
+import threading
+import time
+
+# Seconds to wait for an answer before any has been seen for a command.
+DEFAULT_TIMEOUTS = {"load": 120.0, "snapshot": 30.0, "goto": 10.0,
+                    "echo": 2.0, None: 10.0}
+# Commands that can be sent twice without harm. A second load, for one,
+# would add the track twice.
+IDEMPOTENT = frozenset(["echo", "goto", "snapshot", "snapshotDirectory",
+                        "genome", "collapse", "expand", "squish",
+                        "maxPanelHeight", "setSleepInterval", "preference",
+                        "viewaspairs", "sort", "region"])
+
+
+class IGVUnavailable(ConnectionError):
+
+    """IGV failed too many times in a row, and isn't being tried for now."""
+
+
+def command_verb(command):
+    """Return the name of command: "goto" for "goto chr1:1\\n"."""
+    words = command.split(None, 1)
+    return words[0] if words else ""
+
+
+class AdaptiveTimeout():
+
+    """Timeouts per command that follow the latency seen for each.
+
+    Like the retransmission timeout of TCP, the timeout of a command is its
+    smoothed latency plus k times the smoothed deviation, so a steady "goto"
+    times out soon after it's late while a "load" of a big BAM gets all it
+    usually needs. Until a command is seen, its DEFAULT_TIMEOUTS entry (or
+    the one in initial) is used. Every timeout doubles the next one, until
+    an answer comes in time.
+    """
+
+    def __init__(self, initial=None, minimum=0.5, maximum=600.0,
+                 alpha=0.125, beta=0.25, k=4):
+        self.initial = dict(DEFAULT_TIMEOUTS)
+        self.initial.update(initial or {})
+        self.minimum = minimum
+        self.maximum = maximum
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self.estimates = {}
+        self.backoffs = {}
+        self.lock = threading.Lock()
+
+    def timeout(self, verb):
+        """Return the seconds to wait for an answer to a verb command."""
+        with self.lock:
+            if verb in self.estimates:
+                latency, deviation = self.estimates[verb]
+                timeout = latency + self.k * deviation
+            else:
+                timeout = self.initial.get(verb, self.initial[None])
+            timeout *= self.backoffs.get(verb, 1)
+
+        return min(max(timeout, self.minimum), self.maximum)
+
+    def observe(self, verb, seconds):
+        """Take into account that a verb command was answered in seconds."""
+        with self.lock:
+            if verb not in self.estimates:
+                self.estimates[verb] = (seconds, seconds / 2.0)
+            else:
+                latency, deviation = self.estimates[verb]
+                deviation += self.beta * (abs(latency - seconds) - deviation)
+                latency += self.alpha * (seconds - latency)
+                self.estimates[verb] = (latency, deviation)
+            self.backoffs.pop(verb, None)
+
+    def expired(self, verb):
+        """Double the timeout of verb, as it wasn't enough."""
+        with self.lock:
+            self.backoffs[verb] = min(self.backoffs.get(verb, 1) * 2, 64)
+
+
+class CircuitBreaker():
+
+    """Stop trying IGV for cooldown seconds after failures errors in a row.
+
+    While open, check() raises IGVUnavailable at once, instead of waiting
+    for a connection to time out on every keypress. After the cooldown one
+    call goes through: a success closes the breaker, a failure opens it for
+    another cooldown.
+    """
+
+    def __init__(self, failures=3, cooldown=10.0):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.errors = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def check(self):
+        """Raise IGVUnavailable if IGV shouldn't be tried now."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+
+            left = self.cooldown - (time.time() - self.opened_at)
+            if left > 0:
+                raise IGVUnavailable(
+                    "IGV failed {} times in a row. Trying again in "
+                    "{:.0f} seconds".format(self.errors, left))
+            # Let this call try, and hold the others for a cooldown more.
+            self.opened_at = time.time()
+
+    def success(self):
+        with self.lock:
+            self.errors = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.errors += 1
+            if self.errors >= self.failures:
+                self.opened_at = time.time()
+
+
+class Policy():
+
+    """The timeouts, retries and circuit breaker of an IGV client.
+
+    Give it to helpers.IGV or asyncigv.AsyncIGV as policy::
+
+        >>> igv = IGV(policy=Policy(retries=3, initial={"load": 300}))
+
+    Commands whose verbs are all IDEMPOTENT are retried up to retries times
+    on timeouts and connection errors, waiting backoff seconds, doubled on
+    every retry up to max_backoff. Answers from IGV, even "ERROR", aren't
+    failures. initial sets the timeouts of commands not seen yet (see
+    AdaptiveTimeout), and adaptive=False keeps them fixed.
+    """
+
+    def __init__(self, initial=None, adaptive=True, retries=2, backoff=0.2,
+                 max_backoff=5.0, failures=3, cooldown=10.0):
+        self.initial = initial
+        self.timeouts = AdaptiveTimeout(initial)
+        self.adaptive = adaptive
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failures, cooldown)
+
+    def copy(self):
+        """Return a Policy with the same settings, for another IGV."""
+        return Policy(self.initial, self.adaptive, self.retries, self.backoff,
+                      self.max_backoff, self.breaker.failures,
+                      self.breaker.cooldown)
+
+    def start(self, commands):
+        """Return the timeout to answer commands, run one after the other.
+
+        Raise IGVUnavailable if IGV is not being tried now.
+        """
+        self.breaker.check()
+
+        return sum(self.timeouts.timeout(command_verb(_)) for _ in commands)
+
+    def succeeded(self, commands, seconds):
+        """Take into account that commands were answered in seconds."""
+        self.breaker.success()
+        if self.adaptive and len(commands) == 1:
+            # The time of each command in a list is unknown.
+            self.timeouts.observe(command_verb(commands[0]), seconds)
+
+    def failed(self, commands, error, attempt):
+        """Return the seconds to wait before retrying commands, or None.
+
+        attempt is the number of retries done so far.
+        """
+        self.breaker.failure()
+        if isinstance(error, socket.timeout) and self.adaptive:
+            for verb in set(command_verb(_) for _ in commands):
+                self.timeouts.expired(verb)
+
+        if (attempt >= self.retries or self.breaker.state == "open" or
+                not all(command_verb(_) in IDEMPOTENT for _ in commands)):
+            return None
+
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
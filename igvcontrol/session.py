@@ -0,0 +1,263 @@
+"""Save where a review is and what was decided, to resume or export it."""
+import hashlib
+import os
+
+try:
+    from igvcontrol import cache, helpers
+except ImportError:
+    import cache
+    import helpers
+
+MAGIC = "#igvcontrol session 1"
+MARKS = ("reviewed", "flagged")
+SUFFIX = ".session"
+# Bytes read from each end of a source to fingerprint it.
+SAMPLE = 64 * 1024
+
+
+def fingerprint(filename):
+    """Return a hash of the size and the first and last bytes of filename.
+
+    Unlike the modification time, it survives copying the file, and unlike
+    hashing all of it, it's instant on files of gigabytes.
+    """
+    size = os.path.getsize(filename)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(filename, "rb") as source:
+        digest.update(source.read(SAMPLE))
+        if size > SAMPLE:
+            source.seek(max(size - SAMPLE, SAMPLE))
+            digest.update(source.read(SAMPLE))
+
+    return digest.hexdigest()
+
+
+def default_path(sources, directory=None):
+    """Return the session file of a review of sources, in the cache dir."""
+    name = hashlib.sha1("\n".join(
+        os.path.abspath(_) for _ in sources).encode("utf-8")).hexdigest()
+
+    return os.path.join(directory or cache.default_directory(), "sessions",
+                        name + SUFFIX)
+
+
+def sources_of(path):
+    """Return the variant files reviewed in the session file path."""
+    with open(path) as session_file:
+        return [_.rstrip("\n").split("\t")[1] for _ in session_file
+                if _.startswith("#source\t")]
+
+
+class Session():
+
+    """The state of a review, kept in a file as it changes.
+
+    The position (index of the variant on screen) and the marks given to
+    variants (see MARKS) are appended to the file as one line each, so
+    saving them is a write of a few bytes and a flush::
+
+        >>> session = Session("review.session", ["calls.vcf"], resume=True)
+        >>> session.index
+        40211
+        >>> session.mark(("chr12", "25398284"), "flagged")
+        >>> session.moved(40212, ("chr12", "25398290"))
+
+    Marks are kept by locus, so they hold even if the list is filtered or
+    sorted differently next time, and are loaded from an existing file
+    whether resuming or not. Only with resume does the review start at the
+    saved position. A file that isn't a session of the same sources is
+    never overwritten: ValueError is raised. sources whose contents
+    changed since the session began are listed in changed.
+    """
+
+    def __init__(self, path, sources, resume=False):
+        self.path = path
+        self.sources = [os.path.abspath(_) for _ in sources]
+        self.index = 0
+        self.locus = None
+        self.marks = {}
+        self.changed = []
+        self._file = None
+        self._lines = 0
+        # Nothing saved yet: the file is left as is until something is.
+        self._new = True
+
+        if not os.path.exists(path):
+            return
+        if not self._read():
+            raise ValueError("{} is not a session of {}".format(
+                path, ", ".join(self.sources)))
+
+        self._new = False
+        if not resume:
+            # Another pass over the same files, keeping the marks.
+            self.index, self.locus = 0, None
+            self._write()
+        elif self._lines > 2 * (len(self.marks) + len(self.sources)) + 1000:
+            # Mostly moves: keep the last one.
+            self._write()
+
+    def _read(self):
+        """Load the file. Return False if it's not a session of sources."""
+        saved = {}
+        with open(self.path, errors="replace") as session_file:
+            if session_file.readline().rstrip("\n") != MAGIC:
+                return False
+            for line in session_file:
+                fields = line.rstrip("\n").split("\t")
+                self._lines += 1
+                if fields[0] == "#source":
+                    saved[fields[1]] = fields[2]
+                elif fields[0] == "at" and len(fields) == 3:
+                    self.index, self.locus = int(fields[1]), fields[2]
+                elif fields[0] == "mark" and len(fields) == 3:
+                    if fields[2]:
+                        self.marks[fields[1]] = fields[2]
+                    else:
+                        self.marks.pop(fields[1], None)
+
+        if sorted(saved) != sorted(self.sources):
+            return False
+
+        self.changed = [_ for _ in self.sources
+                        if not os.path.exists(_) or fingerprint(_) != saved[_]]
+        return True
+
+    def _write(self):
+        """Write the file afresh with the current state."""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as session_file:
+            session_file.write(MAGIC + "\n")
+            for source in self.sources:
+                session_file.write("#source\t{}\t{}\n".format(
+                    source, fingerprint(source)))
+            if self.locus is not None:
+                session_file.write("at\t{}\t{}\n".format(self.index,
+                                                         self.locus))
+            for locus, mark in self.marks.items():
+                session_file.write("mark\t{}\t{}\n".format(locus, mark))
+        os.replace(temp_path, self.path)
+        self._new = False
+
+    def _append(self, *fields):
+        if self._new:
+            # The whole state, this change included.
+            self._write()
+            return
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write("\t".join(fields) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def moved(self, index, variant):
+        """Save that variant, at index in the list, is now on screen."""
+        locus = ":".join(variant)
+        if (index, locus) != (self.index, self.locus):
+            self.index, self.locus = index, locus
+            self._append("at", str(index), locus)
+
+    def mark(self, variant, mark=None):
+        """Give variant a mark in MARKS, or clear its mark with None."""
+        if mark is not None and mark not in MARKS:
+            raise ValueError("Marks are {}".format(", ".join(MARKS)))
+
+        locus = ":".join(variant)
+        if mark is None:
+            self.marks.pop(locus, None)
+        else:
+            self.marks[locus] = mark
+        self._append("mark", locus, mark or "")
+
+    def restore(self, navigator):
+        """Return the index of the variant on screen when saved, or None.
+
+        It's the saved index if the same variant is still there, else the
+        first variant at or after its locus, found by navigator.
+        """
+        if self.locus is None:
+            return None
+        try:
+            if ":".join(navigator.variants[self.index]) == self.locus:
+                return self.index
+        except IndexError:
+            pass
+
+        try:
+            return navigator.jump(self.locus)
+        except ValueError:
+            return None
+
+    def mark_of(self, variant):
+        """Return the mark of variant, or None."""
+        return self.marks.get(":".join(variant))
+
+    def export(self, filename, marks=MARKS):
+        """Save the variants with one of marks to filename, .tab or .vcf.
+
+        A TAB file lists their chromosome, position and mark, in genomic
+        order. A VCF file keeps the header and the lines of the sources,
+        which must be VCF files, adding the mark as INFO/REVIEW. Return
+        the number of variants saved.
+        """
+        marked = dict((locus, mark) for locus, mark in self.marks.items()
+                      if mark in marks)
+        if filename.endswith(".vcf"):
+            return self._export_vcf(filename, marked)
+
+        def key(locus):
+            chrom, _, position = locus.rpartition(":")
+            return helpers.chrom_key(chrom), int(position.split("-")[0])
+
+        with open(filename, "w") as export_file:
+            export_file.write("Chr\tPosition\tMark\n")
+            for locus in sorted(marked, key=key):
+                chrom, _, position = locus.rpartition(":")
+                export_file.write("{}\t{}\t{}\n".format(
+                    chrom, position, marked[locus]))
+
+        return len(marked)
+
+    def _export_vcf(self, filename, marked):
+        for source in self.sources:
+            if not helpers.Variants.is_vcf(source):
+                raise ValueError("Only VCF files can be exported as VCF: "
+                                 "{}".format(source))
+
+        count = 0
+        with open(filename, "w") as export_file:
+            for number, source in enumerate(self.sources):
+                with helpers.open_text(source) as vcf_file:
+                    for line in vcf_file:
+                        if line.startswith("#"):
+                            if number:
+                                continue
+                            if line.startswith("#CHROM"):
+                                export_file.write(
+                                    '##INFO=<ID=REVIEW,Number=1,Type=String,'
+                                    'Description="Mark given reviewing in '
+                                    'igvcontrol">\n')
+                            export_file.write(line)
+                            continue
+
+                        mark = marked.get(":".join(
+                            helpers.Variants.vcf_locus(line)))
+                        if mark is None:
+                            continue
+                        fields = line.rstrip("\n").split("\t")
+                        review = "REVIEW=" + mark
+                        fields[7] = review if fields[7] == "." else \
+                            fields[7] + ";" + review
+                        export_file.write("\t".join(fields) + "\n")
+                        count += 1
+
+        return count
@@ -0,0 +1,142 @@
+"""Save a snapshot of every variant with IGV, without anybody clicking."""
+import asyncio
+from collections import deque, namedtuple
+import os
+import socket
+import time
+
+try:
+    from igvcontrol import asyncigv
+except ImportError:
+    import asyncigv
+
+JOURNAL = "snapshots.done"
+
+SnapshotReport = namedtuple("SnapshotReport", ["done", "skipped", "failed"])
+
+
+def snapshot_name(index, variant):
+    """Return the image name of variants[index]: "000001_chr1_123.png"."""
+    return "{:06d}_{}.png".format(index + 1, "_".join(variant))
+
+
+class SnapshotJob():
+
+    """Save a PNG of every variant in directory, using several IGVs at once.
+
+    Each IGV (one per (host, port) in endpoints) takes the next variant
+    left, goes to it and saves the snapshot. Finished images are recorded
+    in a journal in directory, so running the same job again resumes where
+    it stopped::
+
+        >>> job = SnapshotJob(variants, "snapshots",
+        ...                   [("localhost", 60151), ("otherhost", 60151)])
+        >>> job.run()
+        SnapshotReport(done=8990, skipped=0, failed=['000042_chr1_123.png'])
+
+    directory is given to IGV as an absolute path, so it must be the same
+    for IGV and for this job. progress, if given, is called after every
+    variant with the number of variants finished, their total and the
+    snapshots per second so far. stats times the commands, as in AsyncIGV.
+    With a policy.Policy, each IGV gets a copy of it instead of the fixed
+    timeout.
+    """
+
+    def __init__(self, variants, directory,
+                 endpoints=(("localhost", 60151),), timeout=60, progress=None,
+                 stats=None, policy=None):
+        self.variants = variants
+        self.directory = os.path.abspath(directory)
+        self.clients = [
+            asyncigv.AsyncIGV(host, port,
+                              timeout=None if policy else timeout,
+                              stats=stats,
+                              policy=policy.copy() if policy else None)
+            for host, port in endpoints]
+        self.progress = progress
+        self.total = 0
+        self.done = 0
+        self.skipped = 0
+        self.failed = []
+        self._start = None
+
+    @property
+    def journal(self):
+        return os.path.join(self.directory, JOURNAL)
+
+    def finished(self):
+        """Return the names of the snapshots already saved."""
+        try:
+            with open(self.journal) as journal:
+                return set(_.strip() for _ in journal)
+        except (IOError, OSError):
+            return set()
+
+    def run(self):
+        """Save the snapshots left and return a SnapshotReport."""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_async())
+        finally:
+            loop.close()
+
+    async def run_async(self):
+        """Coroutine version of run()."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        finished = self.finished()
+        queue = deque()
+        for index, variant in enumerate(self.variants):
+            name = snapshot_name(index, variant)
+            if name in finished:
+                self.skipped += 1
+            else:
+                queue.append((variant, name))
+        self.total = self.skipped + len(queue)
+
+        self._start = time.time()
+        with open(self.journal, "a") as journal:
+            await asyncio.gather(*[self._worker(_, queue, journal)
+                                   for _ in self.clients])
+        for client in self.clients:
+            await client.close()
+
+        # Left when no IGV could be reached.
+        self.failed.extend(name for _, name in queue)
+
+        return SnapshotReport(self.done, self.skipped, self.failed)
+
+    async def _worker(self, client, queue, journal):
+        while queue:
+            variant, name = queue.popleft()
+            # The directory is sent every time, as it's lost on reconnecting.
+            commands = ["snapshotDirectory {}".format(self.directory),
+                        "goto {}".format(":".join(variant)),
+                        "snapshot {}".format(name)]
+            try:
+                results = await client.batch(commands)
+            except socket.timeout:
+                self.failed.append(name)
+            except (OSError, EOFError, asyncio.TimeoutError):
+                # This IGV is gone. Leave the variant to the others.
+                queue.appendleft((variant, name))
+                return
+            else:
+                if all(_.ok for _ in results):
+                    journal.write(name + "\n")
+                    journal.flush()
+                    self.done += 1
+                else:
+                    self.failed.append(name)
+
+            self._report()
+
+    def _report(self):
+        if self.progress is None:
+            return
+
+        finished = self.skipped + self.done + len(self.failed)
+        elapsed = time.time() - self._start
+        rate = (self.done + len(self.failed)) / elapsed if elapsed else 0.0
+        self.progress(finished, self.total, rate)
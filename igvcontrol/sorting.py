@@ -0,0 +1,205 @@
+"""Put variants in genomic order, and gather the close ones in one view."""
+from array import array
+import heapq
+import mmap
+import os
+import tempfile
+
+try:
+    from igvcontrol import cache, helpers
+except ImportError:
+    import cache
+    import helpers
+
+# Variants sorted in memory at once: about 40 bytes each while sorting.
+CHUNK_SIZE = 4000000
+
+
+def _spill(store, directory):
+    """Sort store and save it to a temporary file. Return its path."""
+    store.sort()
+    handle, path = tempfile.mkstemp(suffix=cache.SUFFIX, dir=directory)
+    with os.fdopen(handle, "wb") as chunk:
+        cache.VariantCache._dump(store, chunk)
+
+    return path
+
+
+def _read_chunk(path):
+    """Yield (sort key, position, chrom) for the variants saved in path."""
+    with open(path, "rb") as chunk:
+        buffer = mmap.mmap(chunk.fileno(), 0, access=mmap.ACCESS_READ)
+
+    store = cache.VariantCache._load(buffer)
+    keys = [helpers.chrom_key(_) for _ in store.chroms]
+    chroms = store.chroms
+    for code, position in zip(store.codes, store.positions):
+        yield keys[code], position, chroms[code]
+
+
+def external_sort(variants, chunk_size=CHUNK_SIZE, directory=None):
+    """Yield the (chrom, position) in variants in genomic order.
+
+    Natural chromosome order (see helpers.chrom_key), then position. At
+    most chunk_size variants are sorted in memory: beyond that, sorted
+    chunks are saved to temporary files in directory and merged, reading
+    them through mmap.
+    """
+    chunks = []
+    store = helpers.VariantStore()
+    try:
+        for chrom, position in variants:
+            store.append(chrom, position)
+            if len(store) >= chunk_size:
+                chunks.append(_spill(store, directory))
+                store = helpers.VariantStore()
+
+        if not chunks:
+            store.sort()
+            for variant in store:
+                yield variant
+            return
+
+        if len(store):
+            chunks.append(_spill(store, directory))
+        for _, position, chrom in heapq.merge(
+                *[_read_chunk(_) for _ in chunks]):
+            yield helpers.Locus(chrom, position)
+    finally:
+        for chunk in chunks:
+            try:
+                os.remove(chunk)
+            except OSError:
+                pass
+
+
+def sort_variants(variants, chunk_size=CHUNK_SIZE, directory=None):
+    """Return a VariantStore with variants in genomic order.
+
+    variants can be a Variants, a VariantSet (already sorted) or any
+    iterable of (chrom, position).
+    """
+    if isinstance(variants, helpers.VariantSet):
+        return variants.store
+    if isinstance(variants, helpers.Variants):
+        # A cached file is read at once, and is small in a VariantStore.
+        variants = (variants.to_store() if variants.cache is not None
+                    else variants.load_generator())
+
+    return helpers.VariantStore.from_iterable(
+        external_sort(variants, chunk_size, directory))
+
+
+class Span():
+
+    """Nearby variants shown together, as "chr1:100-250" in IGV.
+
+    Like Locus, it iterates as (chrom, "start-end"), so ":".join(span)
+    gives the IGV locus.
+    """
+
+    __slots__ = ("chrom", "start", "end", "count")
+
+    def __init__(self, chrom, start, end, count):
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.count = count
+
+    def __iter__(self):
+        yield self.chrom
+        yield "{}-{}".format(self.start, self.end)
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return "Span({!r}, {!r}, {!r}, {!r})".format(
+            self.chrom, self.start, self.end, self.count)
+
+    def __str__(self):
+        return ":".join(self)
+
+
+class Clusters():
+
+    """The variants of a sorted VariantStore, gathered in IGV windows.
+
+    Consecutive variants on a chromosome spanning at most width bases are
+    one item: a Span padded by padding bases on each side, so none sits
+    on the edge of the view. Lone variants stay as Locus, for IGV to
+    zoom as usual::
+
+        >>> clusters = Clusters(store, width=200)
+        >>> clusters[0]
+        Span('chr1', 980, 1220, 3)
+        >>> ":".join(clusters[1])
+        'chr1:50000'
+
+    Each cluster costs 14 bytes, in arrays like VariantStore's.
+    """
+
+    complete = True
+
+    def __init__(self, store, width=200, padding=20):
+        self.chroms = list(store.chroms)
+        self.width = width
+        self.padding = padding
+        self.codes = array(helpers.typecode(store.codes))
+        self.starts = array("I")
+        self.ends = array("I")
+        self.counts = array("H")
+
+        codes, positions = store.codes, store.positions
+        for i in range(len(store)):
+            code, position = codes[i], positions[i]
+            if (self.codes and self.codes[-1] == code and
+                    position - self.starts[-1] <= width and
+                    self.counts[-1] < 0xFFFF):
+                self.ends[-1] = position
+                self.counts[-1] += 1
+            else:
+                self.codes.append(code)
+                self.starts.append(position)
+                self.ends.append(position)
+                self.counts.append(1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        chrom = self.chroms[self.codes[index]]
+        if self.counts[index] == 1:
+            return helpers.Locus(chrom, self.starts[index])
+
+        return Span(chrom, max(self.starts[index] - self.padding, 1),
+                    self.ends[index] + self.padding, self.counts[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def indexed(self):
+        return len(self)
+
+    @property
+    def variants(self):
+        """Return the number of variants in the clusters."""
+        return sum(self.counts)
@@ -0,0 +1,162 @@
+"""Measure where the time goes when talking to IGV."""
+from array import array
+from collections import Counter
+import csv
+import json
+import math
+import threading
+import time
+
+# Times since a call started, when it was connected, written, got its first
+# answer and all of them. Connecting is skipped by reused connections.
+PHASES = ("connect", "write", "first_byte", "total")
+OUTCOMES = ("ok", "igv_error", "timeout", "error", "cancelled")
+TRACE_FIELDS = ("time", "host", "port", "command", "commands",
+                "reused") + PHASES + ("outcome",)
+# Upper bounds (ms) of the histogram buckets.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Timer():
+
+    """The timings of one call to IGV (one command or a pipelined list).
+
+    Transports call mark() as the call goes through each phase.
+    """
+
+    __slots__ = ("started", "wall", "reused", "connect", "write",
+                 "first_byte", "total")
+
+    def __init__(self, reused=False):
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.reused = reused
+        self.connect = None
+        self.write = None
+        self.first_byte = None
+        self.total = None
+
+    def mark(self, phase):
+        """Set phase to the seconds since the call started."""
+        setattr(self, phase, time.perf_counter() - self.started)
+
+    def mark_once(self, phase):
+        """Like mark(), unless the phase was already marked."""
+        if getattr(self, phase) is None:
+            self.mark(phase)
+
+
+def percentile(samples, percent):
+    """Return the percent percentile (nearest rank) of the sorted samples."""
+    if not samples:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(samples)))
+
+    return samples[max(rank, 1) - 1]
+
+
+class Stats():
+
+    """Latency samples and counters of the calls to IGV.
+
+    Give it to helpers.IGV or asyncigv.AsyncIGV as stats. Every call is then
+    timed by phase (see PHASES) and counted by outcome::
+
+        >>> igv_stats = Stats(trace=True)
+        >>> igv = AsyncIGV(stats=igv_stats)
+        ...
+        >>> print(igv_stats.summary())
+        >>> igv_stats.export("trace.csv")
+
+    With trace, every call is also kept, to export them as JSON or CSV.
+    Samples are kept in arrays of doubles, 8 bytes each per phase.
+    """
+
+    def __init__(self, trace=False):
+        self.samples = dict((_, array("d")) for _ in PHASES)
+        self.counters = Counter()
+        self.trace = [] if trace else None
+        self.lock = threading.Lock()
+
+    def timer(self, reused=False):
+        return Timer(reused)
+
+    def record(self, host, port, commands, timer, outcome):
+        """Add the timings of a call sending commands, ended in outcome."""
+        timer.mark_once("total")
+        with self.lock:
+            self.counters["calls"] += 1
+            self.counters["commands"] += len(commands)
+            self.counters[outcome] += 1
+            if timer.connect is not None:
+                self.counters["connections"] += 1
+            elif timer.reused:
+                self.counters["reused"] += 1
+
+            for phase in PHASES:
+                value = getattr(timer, phase)
+                if value is not None:
+                    self.samples[phase].append(value)
+
+            if self.trace is not None:
+                self.trace.append(dict(
+                    zip(TRACE_FIELDS,
+                        (timer.wall, host, port,
+                         commands[0].strip() if commands else "",
+                         len(commands), timer.reused) +
+                        tuple(getattr(timer, _) for _ in PHASES) +
+                        (outcome,))))
+
+    def percentiles(self, phase, percents=(50, 95, 99)):
+        """Return the percentiles of phase, in seconds."""
+        with self.lock:
+            samples = sorted(self.samples[phase])
+
+        return [percentile(samples, _) for _ in percents]
+
+    def histogram(self, phase, buckets=BUCKETS):
+        """Return [(upper bound in ms, count)], the last one unbounded."""
+        counts = [0] * (len(buckets) + 1)
+        with self.lock:
+            samples = list(self.samples[phase])
+
+        for sample in samples:
+            milliseconds = sample * 1000
+            for i, bound in enumerate(buckets):
+                if milliseconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+
+        return list(zip(tuple(buckets) + (None,), counts))
+
+    def summary(self):
+        """Return the counters and the p50/p95/p99 of each phase, as text."""
+        lines = ["{:<12}{:>10}{:>10}{:>10}{:>10}".format(
+            "phase (ms)", "p50", "p95", "p99", "samples")]
+        for phase in PHASES:
+            values = ["{:.1f}".format(_ * 1000) if _ is not None else "-"
+                      for _ in self.percentiles(phase)]
+            lines.append("{:<12}{:>10}{:>10}{:>10}{:>10}".format(
+                phase, *values + [len(self.samples[phase])]))
+
+        lines.append(", ".join("{} {}".format(_, self.counters[_]) for _ in
+                               ("calls", "commands", "connections", "reused")
+                               + OUTCOMES))
+
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Write the trace to path, as CSV or, if it ends in .json, JSON."""
+        with self.lock:
+            trace = list(self.trace or [])
+
+        with open(path, "w", newline="") as handle:
+            if path.endswith(".json"):
+                json.dump(trace, handle, indent=1)
+            else:
+                writer = csv.DictWriter(handle, TRACE_FIELDS)
+                writer.writeheader()
+                writer.writerows(trace)
@@ -0,0 +1,314 @@
+"""Read bgzipped files, and query them by region with a tabix/CSI index."""
+import gzip
+import os
+import re
+import struct
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+TBI_MAGIC = b"TBI\x01"
+CSI_MAGIC = b"CSI\x01"
+
+
+def is_gzip(filename):
+    """Return True if filename is gzipped (bgzipped or not)."""
+    with open(filename, "rb") as handle:
+        return handle.read(2) == GZIP_MAGIC
+
+
+def is_bgzf(filename):
+    """Return True if filename is bgzipped, i.e. it can be seeked into."""
+    with open(filename, "rb") as handle:
+        header = handle.read(14)
+
+    # gzip with FEXTRA set, whose first extra subfield is "BC"
+    return header[:4] == GZIP_MAGIC + b"\x08\x04" and header[12:14] == b"BC"
+
+
+def parse_region(region):
+    """Return (chrom, start, end) for "chr7:1-2,000,000", 1-based inclusive.
+
+    A region without positions ("chr7") spans the whole chromosome, and one
+    without end ("chr7:1000") goes to its end.
+    """
+    match = re.match(r"^([^:]+)(?::([\d,]+)(?:-([\d,]+))?)?$",
+                     region.strip())
+    if not match:
+        raise ValueError("Not a region: {}".format(region))
+
+    chrom, start, end = match.groups()
+    start = int(start.replace(",", "")) if start else 1
+    end = int(end.replace(",", "")) if end else 2 ** 31 - 1
+
+    return chrom, start, end
+
+
+def chrom_aliases(chrom):
+    """Return chrom with and without the "chr" prefix."""
+    if chrom.lower().startswith("chr"):
+        return [chrom, chrom[3:]]
+    return [chrom, "chr" + chrom]
+
+
+class BgzfReader():
+
+    """Binary file-like reader of a BGZF file, seeking by virtual offset.
+
+    A virtual offset is the offset of a compressed block in the file,
+    shifted 16 bits left, plus an offset in the uncompressed block. tell()
+    and seek() use them, as do the chunks in tabix and CSI indexes.
+    """
+
+    def __init__(self, filename):
+        self.handle = open(filename, "rb")
+        self._block_offset = 0
+        self._next_block = 0
+        self._data = b""
+        self._within = 0
+        self._load_block(0)
+
+    def close(self):
+        self.handle.close()
+
+    def tell(self):
+        return self._block_offset << 16 | self._within
+
+    def seek(self, virtual_offset):
+        block_offset = virtual_offset >> 16
+        if block_offset != self._block_offset or not self._data:
+            self._load_block(block_offset)
+        self._within = virtual_offset & 0xFFFF
+
+    def readline(self):
+        """Return the next line, b"" at the end of the file."""
+        pieces = []
+        while self._data:
+            end = self._data.find(b"\n", self._within)
+            if end < 0:
+                pieces.append(self._data[self._within:])
+                self._load_block(self._next_block)
+                continue
+
+            pieces.append(self._data[self._within:end + 1])
+            self._within = end + 1
+            if self._within == len(self._data):
+                # Point at the start of the next block, as indexes do.
+                self._load_block(self._next_block)
+            break
+
+        return b"".join(pieces)
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def _load_block(self, offset):
+        # Skip empty blocks, like the one marking the end of the file.
+        self._data = b""
+        self._within = 0
+        while not self._data:
+            self._block_offset = offset
+            self.handle.seek(offset)
+            header = self.handle.read(12)
+            if len(header) < 12:
+                self._next_block = offset
+                return
+
+            extra = self.handle.read(struct.unpack("<H", header[10:12])[0])
+            block_size = None
+            i = 0
+            while i + 4 <= len(extra):
+                length = struct.unpack("<H", extra[i + 2:i + 4])[0]
+                if extra[i:i + 2] == b"BC":
+                    block_size = struct.unpack(
+                        "<H", extra[i + 4:i + 6])[0] + 1
+                i += 4 + length
+
+            if block_size is None:
+                raise ValueError("Not a BGZF block at {}".format(offset))
+
+            rest = self.handle.read(block_size - 12 - len(extra))
+            self._data = zlib.decompress(rest[:-8], -15)
+            offset = self._next_block = offset + block_size
+
+
+class TabixIndex():
+
+    """A tabix (.tbi) or CSI (.csi) index of a bgzipped file.
+
+    Use find() to get the index next to a file, and fetch() to read the
+    lines of a region::
+
+        >>> index = TabixIndex.find("variants.vcf.gz")
+        >>> lines = index.fetch("variants.vcf.gz", "chr7", 1, 2000000)
+
+    """
+
+    def __init__(self, path):
+        with gzip.open(path, "rb") as index:
+            data = index.read()
+
+        if data[:4] == TBI_MAGIC:
+            self._parse_tbi(data)
+        elif data[:4] == CSI_MAGIC:
+            self._parse_csi(data)
+        else:
+            raise ValueError("Not a tabix or CSI index: {}".format(path))
+
+    @classmethod
+    def find(cls, filename):
+        """Return the index of filename, or None if it has none."""
+        for suffix in (".tbi", ".csi"):
+            if os.path.exists(filename + suffix):
+                return cls(filename + suffix)
+        return None
+
+    def tid(self, chrom):
+        """Return the number of chrom in the index, or None."""
+        for name in chrom_aliases(chrom):
+            if name in self.names:
+                return self.names.index(name)
+        return None
+
+    def chunks(self, tid, start, end):
+        """Return the (start, end) virtual offsets to read for a region.
+
+        start and end are 0-based, end excluded. Chunks are merged, sorted
+        and begin no earlier than the linear index allows.
+        """
+        bins, min_offsets, linear = self.references[tid]
+        if linear is not None:
+            window = start >> self.min_shift
+            min_offset = linear[min(window, len(linear) - 1)] if linear else 0
+        else:
+            # CSI: the smallest bin covering start that holds any data.
+            bin_ = self._first_bin(self.depth) + (start >> self.min_shift)
+            while bin_ not in min_offsets and bin_ > 0:
+                bin_ = (bin_ - 1) >> 3
+            min_offset = min_offsets.get(bin_, 0)
+
+        chunks = sorted(
+            chunk for bin_ in self.region_bins(start, end)
+            for chunk in bins.get(bin_, []) if chunk[1] > min_offset)
+
+        merged = []
+        for chunk_start, chunk_end in chunks:
+            chunk_start = max(chunk_start, min_offset)
+            if merged and chunk_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], chunk_end)
+            else:
+                merged.append([chunk_start, chunk_end])
+
+        return [tuple(_) for _ in merged]
+
+    def region_bins(self, start, end):
+        """Return the bins that may hold data overlapping start-end."""
+        end -= 1
+        bins = []
+        shift = self.min_shift + self.depth * 3
+        for level in range(self.depth + 1):
+            first = self._first_bin(level)
+            bins.extend(range(first + (start >> shift),
+                              first + (end >> shift) + 1))
+            shift -= 3
+
+        return bins
+
+    def fetch(self, filename, chrom, start, end):
+        """Yield the lines of filename on chrom with start <= pos <= end.
+
+        Positions are 1-based. Lines are returned as str, EOL included.
+        """
+        tid = self.tid(chrom)
+        if tid is None:
+            return
+
+        name = self.names[tid].encode("utf-8")
+        meta = self.meta.encode("utf-8")
+        offset = 1 if self.zero_based else 0
+        reader = BgzfReader(filename)
+        try:
+            for chunk_start, chunk_end in self.chunks(tid, start - 1, end):
+                reader.seek(chunk_start)
+                while reader.tell() < chunk_end:
+                    line = reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(meta):
+                        continue
+
+                    fields = line.split(b"\t", max(self.col_seq,
+                                                   self.col_beg))
+                    if fields[self.col_seq - 1] != name:
+                        continue
+                    position = int(fields[self.col_beg - 1]) + offset
+                    if position > end:
+                        break
+                    if position >= start:
+                        yield line.decode("utf-8", "replace")
+        finally:
+            reader.close()
+
+    @staticmethod
+    def _first_bin(level):
+        return ((1 << level * 3) - 1) // 7
+
+    def _parse_header(self, data, offset):
+        (fmt, self.col_seq, self.col_beg, self.col_end, meta, self.skip,
+         names_size) = struct.unpack_from("<7i", data, offset)
+        self.zero_based = bool(fmt & 0x10000)
+        self.meta = chr(meta)
+        offset += 28
+        names = data[offset:offset + names_size].split(b"\0")
+        self.names = [_.decode("utf-8") for _ in names if _]
+
+        return offset + names_size
+
+    def _parse_tbi(self, data):
+        self.min_shift, self.depth = 14, 5
+        n_ref = struct.unpack_from("<i", data, 4)[0]
+        offset = self._parse_header(data, 8)
+
+        self.references = []
+        for _ in range(n_ref):
+            bins, offset = self._parse_bins(data, offset, with_loffset=False)
+            n_intervals = struct.unpack_from("<i", data, offset)[0]
+            linear = list(struct.unpack_from(
+                "<{}Q".format(n_intervals), data, offset + 4))
+            offset += 4 + 8 * n_intervals
+            self.references.append((bins, {}, linear))
+
+    def _parse_csi(self, data):
+        self.min_shift, self.depth, aux_size = struct.unpack_from(
+            "<3i", data, 4)
+        self._parse_header(data, 16)
+        offset = 16 + aux_size
+        n_ref = struct.unpack_from("<i", data, offset)[0]
+        offset += 4
+
+        self.references = []
+        for _ in range(n_ref):
+            (bins, min_offsets), offset = self._parse_bins(
+                data, offset, with_loffset=True)
+            self.references.append((bins, min_offsets, None))
+
+    @staticmethod
+    def _parse_bins(data, offset, with_loffset):
+        n_bins = struct.unpack_from("<i", data, offset)[0]
+        offset += 4
+        bins = {}
+        min_offsets = {}
+        for _ in range(n_bins):
+            bin_ = struct.unpack_from("<I", data, offset)[0]
+            offset += 4
+            if with_loffset:
+                min_offsets[bin_] = struct.unpack_from("<Q", data, offset)[0]
+                offset += 8
+            n_chunks = struct.unpack_from("<i", data, offset)[0]
+            chunks = struct.unpack_from(
+                "<{}Q".format(2 * n_chunks), data, offset + 4)
+            bins[bin_] = list(zip(chunks[::2], chunks[1::2]))
+            offset += 4 + 16 * n_chunks
+
+        if with_loffset:
+            return (bins, min_offsets), offset
+        return bins, offset
@@ -0,0 +1,312 @@
+"""Tests for the asyncio IGV client."""
+import asyncio
+import socket
+import threading
+import time
+from unittest import TestCase
+
+from igvcontrol import asyncigv
+from igvcontrol.tests.test_helpers import TCPRequestHandler, TCPServer
+
+
+class SlowTCPRequestHandler(TCPRequestHandler):
+    def handle(self):
+        """Answer every command after a delay."""
+        for data in self.rfile:
+            time.sleep(self.server.latency)
+            self.wfile.write(b"OK\n")
+
+
+class RecordingTCPRequestHandler(TCPRequestHandler):
+    def handle(self):
+        """Keep every command received, and answer it after a delay."""
+        for data in self.rfile:
+            self.server.commands.append(data.decode("ascii").strip())
+            time.sleep(self.server.latency)
+            self.wfile.write(b"OK\n")
+
+
+def start_server(handler=TCPRequestHandler, latency=0):
+    server = TCPServer(("localhost", 0), handler)
+    server.latency = latency
+    server.commands = []
+
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    return server
+
+
+class TestAsyncIGV(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.igv_server = start_server()
+        self.igv_client = asyncigv.AsyncIGV(
+            port=self.igv_server.server_address[1])
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.igv_client.close())
+        self.loop.close()
+        self.igv_server.shutdown()
+        self.igv_server.server_close()
+        super().tearDown()
+
+    def run_until_complete(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_check_igv_is_running(self):
+        self.assertTrue(self.run_until_complete(self.igv_client.check_igv()))
+
+    def test_we_can_send_goto_and_load_signals(self):
+        self.assertTrue(
+            self.run_until_complete(self.igv_client.goto("chr1:123456")))
+        self.assertTrue(
+            self.run_until_complete(self.igv_client.load("file.bam")))
+
+    def test_commands_reuse_the_connection(self):
+        self.run_until_complete(self.igv_client.check_igv())
+        writer = self.igv_client.writer
+        self.run_until_complete(self.igv_client.goto("chr1:123456"))
+
+        self.assertIs(self.igv_client.writer, writer)
+
+    def test_batch_returns_results_in_order(self):
+        results = self.run_until_complete(
+            self.igv_client.batch(["echo", "bogus", "goto chr1:1"]))
+
+        self.assertEqual([_.ok for _ in results], [True, False, True])
+
+    def test_unreachable_igv_raises_oserror(self):
+        self.igv_server.shutdown()
+        self.igv_server.server_close()
+        igv_client = asyncigv.AsyncIGV(port=self.igv_server.server_address[1])
+
+        with self.assertRaises(OSError):
+            self.run_until_complete(igv_client.check_igv())
+
+
+class TestTimeoutsAndConcurrency(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.servers = [start_server(SlowTCPRequestHandler, latency=0.3)
+                        for _ in range(3)]
+        self.clients = [asyncigv.AsyncIGV(port=_.server_address[1])
+                        for _ in self.servers]
+        self.dispatcher = asyncigv.Dispatcher()
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        super().tearDown()
+
+    def test_timeout_raises_and_drops_the_connection(self):
+        with self.assertRaises(OSError):
+            self.dispatcher.run(self.clients[0].goto("chr1:1", timeout=0.05))
+
+        self.assertFalse(self.clients[0].is_open)
+
+    def test_cancelled_command_drops_the_connection(self):
+        future = self.dispatcher.submit(self.clients[0].goto("chr1:1"))
+        time.sleep(0.1)
+        future.cancel()
+        time.sleep(0.05)
+
+        self.assertFalse(self.clients[0].is_open)
+
+    def test_submit_does_not_block(self):
+        start = time.time()
+        future = self.dispatcher.submit(self.clients[0].goto("chr1:1"))
+
+        self.assertLess(time.time() - start, 0.1)
+        self.assertTrue(future.result(2))
+
+    def test_several_igvs_are_driven_concurrently(self):
+        start = time.time()
+        responses = self.dispatcher.run(
+            asyncigv.broadcast(self.clients, "goto chr1:1"))
+
+        self.assertEqual(responses, ["OK"] * 3)
+        # One round-trip, not three.
+        self.assertLess(time.time() - start, 0.6)
+
+
+class TestIGVGroup(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.servers = [start_server(SlowTCPRequestHandler, latency=_)
+                        for _ in (0.1, 0.2, 0.3)]
+        self.group = asyncigv.make_controller(
+            [_.server_address for _ in self.servers],
+            on_straggler=self.straggler)
+        self.late = []
+        self.dispatcher = asyncigv.Dispatcher()
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        super().tearDown()
+
+    def straggler(self, client, error):
+        self.late.append((client.port, type(error)))
+
+    def test_a_step_takes_as_long_as_the_slowest_igv(self):
+        start = time.time()
+        self.assertTrue(self.dispatcher.run(self.group.goto("chr1:1")))
+
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(self.late, [])
+
+    def test_stragglers_miss_the_deadline_and_are_reported(self):
+        slowest = self.group.clients[2]
+
+        start = time.time()
+        response = self.dispatcher.run(
+            self.group.command("goto chr1:1", timeout=0.25))
+
+        self.assertLess(time.time() - start, 0.3)
+        self.assertTrue(response.startswith(
+            "ERROR {}".format(slowest.endpoint)))
+        self.assertEqual(self.late, [(slowest.port, socket.timeout)])
+        self.assertEqual(self.group.stragglers, {slowest.endpoint: 1})
+        # A late answer can't be taken for the next one.
+        self.assertFalse(slowest.is_open)
+
+    def test_the_group_fails_if_no_igv_answers(self):
+        with self.assertRaises(OSError):
+            self.dispatcher.run(self.group.goto("chr1:1", timeout=0.05))
+
+        self.assertEqual(len(self.late), 3)
+
+    def test_an_error_in_one_igv_is_the_answer_of_the_group(self):
+        server = start_server()
+        self.servers.append(server)
+        self.group.clients.append(
+            asyncigv.AsyncIGV(port=server.server_address[1]))
+
+        results = self.dispatcher.run(self.group.batch(["goto 1:1", "bogus"]))
+
+        self.assertEqual([_.ok for _ in results], [True, False])
+        self.assertEqual(results[1].response, "ERROR")
+
+    def test_one_endpoint_is_a_plain_client(self):
+        self.assertIsInstance(asyncigv.make_controller([("localhost", 1)]),
+                              asyncigv.AsyncIGV)
+
+
+class TestCoalescer(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = start_server(RecordingTCPRequestHandler, latency=0.2)
+        self.dispatcher = asyncigv.Dispatcher()
+        self.coalescer = asyncigv.Coalescer(
+            asyncigv.AsyncIGV(port=self.server.server_address[1]),
+            self.dispatcher)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def test_a_burst_only_sends_its_first_and_last_gotos(self):
+        futures = [self.coalescer.goto("chr1:0")]
+        while not self.server.commands:
+            time.sleep(0.01)
+        # Held key: IGV is still busy with chr1:0.
+        futures += [self.coalescer.goto("chr1:{}".format(_))
+                    for _ in range(1, 20)]
+
+        self.assertTrue(futures[-1].result(2))
+        self.assertEqual(self.server.commands,
+                         ["goto chr1:0", "goto chr1:19"])
+        self.assertTrue(all(_.cancelled() for _ in futures[1:-1]))
+        self.assertEqual((self.coalescer.sent, self.coalescer.dropped),
+                         (2, 18))
+
+    def test_gotos_spaced_out_are_all_sent(self):
+        for i in range(3):
+            self.assertTrue(self.coalescer.goto("chr1:{}".format(i)).result(
+                2))
+
+        self.assertEqual(len(self.server.commands), 3)
+
+    def test_errors_dont_stop_the_next_gotos(self):
+        self.coalescer.client.port = 1
+        with self.assertRaises(OSError):
+            self.coalescer.goto("chr1:1").result(2)
+
+        self.coalescer.client.port = self.server.server_address[1]
+        self.assertTrue(self.coalescer.goto("chr1:2").result(2))
+
+
+class TestPrefetcher(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = start_server(RecordingTCPRequestHandler, latency=0.05)
+        self.dispatcher = asyncigv.Dispatcher()
+        self.prefetcher = asyncigv.Prefetcher(
+            asyncigv.AsyncIGV(port=self.server.server_address[1]),
+            self.dispatcher, window=3)
+        self.variants = [("chr1", str(_)) for _ in range(100)]
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def wait_for_commands(self, count, timeout=2):
+        start = time.time()
+        while len(self.server.commands) < count:
+            if time.time() - start > timeout:
+                break
+            time.sleep(0.01)
+        # Nothing else should come.
+        time.sleep(0.1)
+
+        return self.server.commands
+
+    def test_warms_the_next_loci_in_order(self):
+        self.prefetcher.update(self.variants, 10)
+
+        self.assertEqual(self.wait_for_commands(3),
+                         ["goto chr1:11", "goto chr1:12", "goto chr1:13"])
+
+    def test_stepping_forward_warms_only_the_new_locus(self):
+        self.prefetcher.update(self.variants, 10)
+        self.wait_for_commands(3)
+        self.prefetcher.update(self.variants, 11)
+
+        self.assertEqual(self.wait_for_commands(4)[3:], ["goto chr1:14"])
+
+    def test_window_stops_at_the_last_variant(self):
+        self.prefetcher.update(self.variants, 98)
+
+        self.assertEqual(self.wait_for_commands(3), ["goto chr1:99"])
+
+    def test_jumping_drops_the_previous_window(self):
+        self.server.latency = 0.3
+        self.prefetcher.update(self.variants, 10)
+        time.sleep(0.1)
+        self.prefetcher.update(self.variants, 50)
+
+        commands = self.wait_for_commands(4)
+        self.assertEqual(commands[0], "goto chr1:11")
+        self.assertNotIn("goto chr1:12", commands)
+        self.assertEqual(commands[1:], ["goto chr1:51", "goto chr1:52",
+                                        "goto chr1:53"])
+
+    def test_missing_igv_is_not_an_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        self.prefetcher.update(self.variants, 10).result(1)
+        time.sleep(0.1)
+
+        self.assertIsNone(self.prefetcher._current)
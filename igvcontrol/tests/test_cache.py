@@ -0,0 +1,71 @@
+"""Tests for the on-disk cache of parsed variants."""
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from igvcontrol import cache, helpers
+
+
+class TestVariantCache(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = cache.VariantCache(os.path.join(self.directory, "cache"))
+
+        self.tab_file = os.path.join(self.directory, "example.tab")
+        shutil.copy(os.path.join(os.path.dirname(__file__),
+                                 "files", "example.tab"), self.tab_file)
+        self.vcf_file = os.path.join(os.path.dirname(__file__),
+                                     "files", "example-4.0.vcf")
+
+    def test_store_round_trip(self):
+        store = helpers.Variants(self.vcf_file).to_store()
+        self.cache.put(self.vcf_file, store)
+
+        cached = self.cache.get(self.vcf_file)
+        self.assertEqual(list(cached), list(store))
+        self.assertEqual(cached.chroms, ["chr20"])
+
+    def test_missing_entry(self):
+        self.assertIsNone(self.cache.get(self.vcf_file))
+
+    def test_variants_fill_and_use_the_cache(self):
+        variants = helpers.Variants(self.vcf_file, cache=self.cache)
+        self.assertIsInstance(variants.index, helpers.LineIndex)
+        self.assertEqual(len(variants), 5)
+
+        reopened = helpers.Variants(self.vcf_file, cache=self.cache)
+        self.assertIsInstance(reopened.index, helpers.VariantStore)
+        self.assertTrue(reopened.complete)
+        self.assertEqual([reopened[_] for _ in range(5)],
+                         list(helpers.Variants(self.vcf_file)))
+
+    def test_changed_source_invalidates_the_entry(self):
+        helpers.Variants(self.tab_file, cache=self.cache).to_store()
+
+        with open(self.tab_file, "a") as tabfile:
+            tabfile.write("chr2\t100\t100\tA\tC\n")
+        os.utime(self.tab_file, (time.time() + 10, time.time() + 10))
+
+        self.assertIsNone(self.cache.get(self.tab_file))
+        store = helpers.Variants(self.tab_file, cache=self.cache).to_store()
+        self.assertEqual(len(store), 4)
+        # The stale entry was replaced, not kept alongside.
+        self.assertEqual(len(os.listdir(self.cache.directory)), 1)
+
+    def test_eviction_keeps_the_cache_bounded(self):
+        store = helpers.Variants(self.vcf_file).to_store()
+        self.cache.put(self.vcf_file, store)
+        size = os.path.getsize(self.cache.path(self.vcf_file))
+        self.cache.max_bytes = size
+
+        old_time = time.time() - 100
+        os.utime(self.cache.path(self.vcf_file), (old_time, old_time))
+        self.cache.put(self.tab_file,
+                       helpers.Variants(self.tab_file).to_store())
+
+        self.assertIsNone(self.cache.get(self.vcf_file))
+        self.assertIsNotNone(self.cache.get(self.tab_file))
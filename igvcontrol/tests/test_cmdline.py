@@ -1,12 +1,14 @@
 """Tests for the command line interface."""
 import os
+import shutil
+import tempfile
 from unittest import TestCase
 try:
     from unittest import mock
 except ImportError:
     import mock
 
-from igvcontrol import cmdline
+from igvcontrol import cmdline, helpers, navigation, session, sorting
 
 try:
     import builtins
@@ -14,6 +16,8 @@ try:
 except ImportError:
     input_module = "__builtin__.input"
 
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
 
 def _fake_input(*args):
     return "fake/path"
@@ -23,16 +27,15 @@ class TestMain(TestCase):
     @mock.patch("igvcontrol.cmdline.text_mode")
     @mock.patch("igvcontrol.helpers.Variants")
     def test_main_launches_commandline(self, variants_mock, text_mode_mock):
-        args = mock.Mock()
-        args.gui = False
         sample_path = os.path.join(os.path.dirname(__file__),
                                    "files", "example.tab")
-        args.variants = sample_path
+        args = cmdline.parse_args(["--variants", sample_path, "--no-cache"])
 
         text_mode_mock.return_value = True
         cmdline.main(args)
 
-        variants_mock.assert_called_with(sample_path)
+        variants_mock.assert_called_with(sample_path, cache=None, region=None,
+                                         sheet=0, columns=(0, 1))
 
     @mock.patch("igvcontrol.cmdline.text_mode")
     @mock.patch("igvcontrol.helpers.Variants")
@@ -41,16 +44,286 @@ class TestMain(TestCase):
                                                         input_mock,
                                                         variants_mock,
                                                         text_mode_mock):
-        args = mock.Mock()
-        args.gui = False
-        args.variants = False
+        args = cmdline.parse_args(["--no-cache"])
 
         input_mock.return_value = "fake/path"
         text_mode_mock.return_value = True
 
         cmdline.main(args)
 
-        variants_mock.assert_called_with("fake/path")
+        variants_mock.assert_called_with("fake/path", cache=None,
+                                         region=None, sheet=0,
+                                         columns=(0, 1))
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.VariantSet")
+    def test_main_merges_several_files(self, variant_set_mock,
+                                       text_mode_mock):
+        files = os.path.join(os.path.dirname(__file__), "files")
+        args = cmdline.parse_args(["--variants",
+                                   os.path.join(files, "*.tab"),
+                                   os.path.join(files, "example.xls"),
+                                   "--processes", "2"])
+
+        cmdline.main(args)
+
+        self.assertEqual(variant_set_mock.call_args[0][0],
+                         [os.path.join(files, "example.tab"),
+                          os.path.join(files, "example_noheader.tab"),
+                          os.path.join(files, "example.xls")])
+        self.assertEqual(variant_set_mock.call_args[1]["processes"], 2)
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_passes_the_region(self, variants_mock, text_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path.vcf.gz",
+                                   "--region", "chr7:1-2000000"])
+
+        cmdline.main(args)
+
+        self.assertEqual(variants_mock.call_args[1]["region"],
+                         "chr7:1-2000000")
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_caches_variants_in_cache_dir(self, variants_mock,
+                                               text_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path",
+                                   "--cache-dir", "fake/cache"])
+
+        cmdline.main(args)
+
+        variants_cache = variants_mock.call_args[1]["cache"]
+        self.assertEqual(variants_cache.directory, "fake/cache")
+
+    @mock.patch("igvcontrol.guimode.guimode")
+    def test_main_passes_the_cache_and_session_to_the_gui(self,
+                                                          guimode_mock):
+        cmdline.main(cmdline.parse_args([
+            "--gui", "--cache-dir", "fake/cache", "--no-cache",
+            "--session", "fake/review.session", "--resume"]))
+
+        self.assertEqual(guimode_mock.call_args[0][6:],
+                         (True, "fake/cache", True, "fake/review.session"))
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_passes_the_sheet_and_columns(self, variants_mock,
+                                               text_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path.xlsx",
+                                   "--sheet", "Filtered",
+                                   "--columns", "C,AA"])
+
+        cmdline.main(args)
+
+        self.assertEqual(variants_mock.call_args[1]["sheet"], "Filtered")
+        self.assertEqual(variants_mock.call_args[1]["columns"], (2, 26))
+
+    @mock.patch("igvcontrol.cmdline.snapshot_mode")
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_saves_snapshots_instead_of_browsing(self, variants_mock,
+                                                      text_mode_mock,
+                                                      snapshot_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path",
+                                   "--snapshot-dir", "fake/snapshots",
+                                   "--igv", "60151", "otherhost:60152"])
+
+        cmdline.main(args)
+
+        self.assertEqual(snapshot_mode_mock.call_args[0][:4],
+                         (variants_mock.return_value, "fake/snapshots",
+                          [("localhost", 60151), ("otherhost", 60152)],
+                          None))
+        self.assertFalse(text_mode_mock.called)
+
+    @mock.patch("igvcontrol.cmdline.report_stats")
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_reports_stats_on_exit(self, variants_mock, text_mode_mock,
+                                        report_stats_mock):
+        args = cmdline.parse_args(["--variants", "fake/path",
+                                   "--trace", "fake/trace.csv"])
+
+        cmdline.main(args)
+
+        igv_stats = text_mode_mock.call_args[0][3]
+        report_stats_mock.assert_called_with(igv_stats, "fake/trace.csv")
+        self.assertIsNotNone(igv_stats.trace)
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    def test_main_sorts_and_clusters_the_variants(self, text_mode_mock):
+        args = cmdline.parse_args(["--variants", os.path.join(
+            FILES, "example.tab"), "--no-cache", "--cluster", "1000"])
+
+        cmdline.main(args)
+
+        clusters = text_mode_mock.call_args[0][0]
+        self.assertIsInstance(clusters, sorting.Clusters)
+        self.assertEqual(clusters.variants, len(helpers.Variants(
+            os.path.join(FILES, "example.tab"))))
+
+    def test_timeouts_and_retries_make_the_policy(self):
+        igv_policy = cmdline.make_policy(cmdline.parse_args(
+            ["--timeout", "3", "--load-timeout", "600", "--retries", "5",
+             "--fixed-timeouts"]))
+
+        self.assertEqual(igv_policy.timeouts.timeout("goto"), 3)
+        self.assertEqual(igv_policy.timeouts.timeout("load"), 600)
+        self.assertEqual(igv_policy.retries, 5)
+        self.assertFalse(igv_policy.adaptive)
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_browses_with_several_igvs(self, variants_mock,
+                                            text_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path",
+                                   "--igv", "60151", "otherhost:60152",
+                                   "--deadline", "2"])
+
+        cmdline.main(args)
+
+        self.assertEqual(text_mode_mock.call_args[0][5:7],
+                         ([("localhost", 60151), ("otherhost", 60152)], 2))
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    def test_main_resumes_the_session(self, text_mode_mock):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "review.session")
+        vcf = os.path.join(FILES, "example-4.0.vcf")
+        session.Session(path, [vcf]).moved(2, ("chr20", "1110696"))
+
+        cmdline.main(cmdline.parse_args(["--resume", "--session", path,
+                                         "--no-cache"]))
+
+        variants, review = [text_mode_mock.call_args[0][_] for _ in (0, 7)]
+        self.assertEqual(variants.filename, vcf)
+        self.assertEqual(review.index, 2)
+
+    def test_main_exports_the_marks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tab = os.path.join(FILES, "example.tab")
+        session.Session(session.default_path([tab], directory), [tab]).mark(
+            ("chr1", "17330"), "flagged")
+        export = os.path.join(directory, "marks.tab")
+
+        with mock.patch("sys.stdout"):
+            self.assertTrue(cmdline.main(cmdline.parse_args([
+                "--variants", tab, "--cache-dir", directory,
+                "--export", export])))
+
+        with open(export) as export_file:
+            self.assertEqual(export_file.read().splitlines()[1:],
+                             ["chr1\t17330\tflagged"])
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    @mock.patch("igvcontrol.helpers.Variants")
+    def test_main_loads_the_tracks(self, variants_mock, text_mode_mock):
+        args = cmdline.parse_args(["--variants", "fake/path", "--no-cache",
+                                   "--tracks", "/data/a.bam", "hg19.genome",
+                                   "/data/a.bam"])
+
+        cmdline.main(args)
+
+        self.assertEqual(
+            [(_.verb, _.path) for _ in text_mode_mock.call_args[0][8]],
+            [("genome", "hg19.genome"), ("load", "/data/a.bam")])
+
+    def test_main_load_tests_a_mock_igv(self):
+        with mock.patch("sys.stdout") as stdout:
+            self.assertTrue(cmdline.main(cmdline.parse_args([
+                "--load-test", "3", "--load-test-commands", "5",
+                "--mock-latency", "uniform:0:0.01"])))
+            self.assertFalse(cmdline.main(cmdline.parse_args([
+                "--load-test", "2", "--load-test-commands", "5",
+                "--mock-errors", "1"])))
+
+        printed = "".join(_[0][0] for _ in stdout.write.call_args_list)
+        self.assertIn("3 clients sent 15 commands", printed)
+        self.assertIn("10 failed: 10 answered ERROR", printed)
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    def test_field_filters_on_tab_files_are_usage_errors(self,
+                                                         text_mode_mock):
+        args = cmdline.parse_args(["--variants",
+                                   os.path.join(FILES, "example.tab"),
+                                   "--no-cache", "--filter", "QUAL>=30"])
+
+        with mock.patch("sys.stderr") as stderr:
+            with self.assertRaises(SystemExit) as raised:
+                cmdline.main(args)
+
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn("need a VCF file", "".join(
+            _[0][0] for _ in stderr.write.call_args_list))
+        self.assertFalse(text_mode_mock.called)
+
+    @mock.patch("igvcontrol.cmdline.text_mode")
+    def test_bad_files_are_not_usage_errors(self, text_mode_mock):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tab = os.path.join(directory, "bad.tab")
+        with open(tab, "w") as tabfile:
+            tabfile.write("Chr\tStart\tEnd\tRef\tAlt\n"
+                          "chr1\tNA\tNA\tA\tC\n")
+        args = cmdline.parse_args(["--variants", tab, "--no-cache",
+                                   "--chroms", "1"])
+
+        with self.assertRaises(ValueError) as raised:
+            cmdline.main(args)
+        self.assertIn("NA", str(raised.exception))
+
+    def test_igvs_need_a_port(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                cmdline.parse_args(["--igv", "otherhost"])
+
+    def test_sheets_can_be_given_by_number(self):
+        self.assertEqual(cmdline.parse_args(["--sheet", "1"]).sheet, 1)
+
+
+class TestMaxIndex(TestCase):
+    def test_lists_are_bounded_by_their_length(self):
+        self.assertEqual(cmdline.max_index([("chr1", "1"), ("chr1", "2")]),
+                         2)
+
+    def test_partially_read_variants_are_unbounded(self):
+        variants = helpers.Variants(os.path.join(os.path.dirname(__file__),
+                                                 "files", "example.tab"))
+        variants[0]
+        self.assertGreater(cmdline.max_index(variants), 3)
+
+        variants.index.scan()
+        self.assertEqual(cmdline.max_index(variants), 3)
+
+
+class TestAskJump(TestCase):
+    def setUp(self):
+        self.navigator = navigation.Navigator(
+            [("chr1", "100"), ("chr1", "200"), ("chr2", "50")])
+        self.sent = []
+
+    def ask(self, answer, index=0):
+        with mock.patch(input_module, return_value=answer):
+            return cmdline.ask_jump(self.navigator, index, self.sent.append)
+
+    def test_jumps_to_the_variant_asked_for(self):
+        self.assertEqual(self.ask("3"), 2)
+        self.assertEqual(self.ask("chr1:150"), 1)
+        self.assertEqual(self.ask("chr2"), 2)
+        self.assertEqual(self.sent, [])
+
+    def test_genes_are_sent_to_igv(self):
+        self.assertIsNone(self.ask("TP53"))
+        self.assertEqual(self.sent, ["TP53"])
+
+    def test_bad_answers_stay_put(self):
+        with mock.patch("sys.stdout"):
+            self.assertIsNone(self.ask("9"))
+        self.assertIsNone(self.ask(""))
+        self.assertEqual(self.sent, [])
 
 
 class TODO_TestTextMode(TestCase):
@@ -0,0 +1,133 @@
+"""Tests for the filters of variants."""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import filters, helpers
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestIntervalIndex(TestCase):
+    def setUp(self):
+        self.index = filters.IntervalIndex.from_intervals([
+            ("chr1", 100, 200), ("chr1", 150, 300), ("chr1", 500, 600),
+            ("2", 0, 10)])
+
+    def test_overlapping_intervals_are_merged(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(list(self.index.ends["1"]), [300, 600])
+
+    def test_bed_intervals_are_0_based_and_end_excluded(self):
+        self.assertNotIn(("chr1", 100), self.index)
+        self.assertIn(("chr1", 101), self.index)
+        self.assertIn(("chr1", 300), self.index)
+        self.assertNotIn(("chr1", 301), self.index)
+        self.assertNotIn(("chr1", 50), self.index)
+
+    def test_chr_prefixes_are_optional(self):
+        self.assertIn(("1", 550), self.index)
+        self.assertIn(("chr2", 1), self.index)
+        self.assertNotIn(("chr3", 1), self.index)
+
+    def test_reads_bed_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            bed = os.path.join(directory, "regions.bed")
+            with open(bed, "w") as bedfile:
+                bedfile.write("track name=exome\n"
+                              "# A comment\n"
+                              "chr20\t14000\t15000\tgene1\n"
+                              "chr20\t1230000\t1240000\n")
+            index = filters.IntervalIndex.from_bed(bed)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(len(index), 2)
+        self.assertIn(("20", 14370), index)
+
+
+class TestFieldPredicate(TestCase):
+    def matches(self, expression, qual=".", filters_=".", info=None):
+        return filters.FieldPredicate(expression).matches(qual, filters_,
+                                                          info or {})
+
+    def test_qual(self):
+        self.assertTrue(self.matches("QUAL>=30", qual="1e+03"))
+        self.assertFalse(self.matches("QUAL>=30", qual="29"))
+        self.assertFalse(self.matches("QUAL>=30", qual="."))
+
+    def test_filter(self):
+        self.assertTrue(self.matches("FILTER==PASS", filters_="PASS"))
+        self.assertTrue(self.matches("FILTER==q10", filters_="s50;q10"))
+        self.assertTrue(self.matches("FILTER!=q10", filters_="PASS"))
+        self.assertFalse(self.matches("FILTER!=q10", filters_="s50;q10"))
+
+    def test_info(self):
+        info = {"DP": "14", "AF": "0.333,0.667", "DB": True, "AA": "T"}
+
+        self.assertTrue(self.matches("INFO/DP>10", info=info))
+        self.assertTrue(self.matches("INFO.AF>0.5", info=info))
+        self.assertTrue(self.matches("INFO/AA==T", info=info))
+        self.assertTrue(self.matches("INFO/DB", info=info))
+        self.assertFalse(self.matches("INFO/SOMATIC", info=info))
+        self.assertFalse(self.matches("INFO/NS>1", info=info))
+
+    def test_bad_expressions(self):
+        for expression in ("QUAL", "DP>10", "QUAL>>3"):
+            with self.assertRaises(ValueError):
+                filters.FieldPredicate(expression)
+
+
+class TestVariantFilter(TestCase):
+    def setUp(self):
+        self.vcf = helpers.Variants(os.path.join(FILES, "example-4.0.vcf"))
+
+    def test_expressions_filter_vcf_records(self):
+        variant_filter = filters.VariantFilter(
+            expressions=["FILTER==PASS", "INFO/DP>=10", "QUAL>20"])
+
+        self.assertEqual(list(variant_filter.apply(self.vcf)),
+                         [("chr20", "14370"), ("chr20", "1110696"),
+                          ("chr20", "1230237")])
+
+    def test_locations_filter_the_store(self):
+        variant_filter = filters.VariantFilter(
+            regions=filters.IntervalIndex.from_intervals(
+                [("20", 1000000, 1300000), ("X", 0, 100)]),
+            chroms=["chr20"])
+
+        self.assertEqual(list(variant_filter.apply(self.vcf)),
+                         [("chr20", "1110696"), ("chr20", "1230237"),
+                          ("chr20", "1234567")])
+
+    def test_chroms_filter_tab_files(self):
+        tab = helpers.Variants(os.path.join(FILES, "example-regions.tab.gz"))
+
+        store = filters.VariantFilter(chroms=["X"]).apply(tab)
+
+        self.assertEqual(len(store), 3000)
+        self.assertEqual(set(_[0] for _ in store), set(["chrX"]))
+
+    def test_expressions_read_only_the_region(self):
+        variants = helpers.Variants(
+            os.path.join(FILES, "example-regions.vcf.gz"),
+            region="chr2:1-20000")
+        store = filters.VariantFilter(expressions=["QUAL>0"]).apply(variants)
+
+        self.assertEqual(list(store), list(variants.to_store()))
+
+    def test_expressions_need_a_vcf(self):
+        tab = helpers.Variants(os.path.join(FILES, "example.tab"))
+
+        with self.assertRaises(filters.NotVCFError):
+            filters.VariantFilter(expressions=["QUAL>20"]).apply(tab)
+
+    def test_variant_sets_are_filtered_file_by_file(self):
+        variant_set = helpers.VariantSet(
+            [os.path.join(FILES, "example-4.0.vcf"),
+             os.path.join(FILES, "example-regions.vcf.gz")], processes=2,
+            variant_filter=filters.VariantFilter(expressions=["INFO/AA"]))
+
+        self.assertEqual(len(variant_set), 3)
@@ -1,40 +1,46 @@
 """Tests for the helper classes."""
 import os
+import shutil
+import tempfile
 try:
     import socketserver
 except ImportError:
     import SocketServer as socketserver
 import threading
+import time
 from unittest import TestCase
 
-from igvcontrol import helpers
+from igvcontrol import cache, helpers, xlsx
 
 
-class TCPRequestHandler(socketserver.BaseRequestHandler):
+class TCPRequestHandler(socketserver.StreamRequestHandler):
     def handle(self):
-        """Return the same it receives."""
-        data = self.request.recv(1024)
-        try:
-            data = str(data, 'ascii')
-        except TypeError:
-            pass
-
+        """Answer every command received until the client hangs up."""
         responses = {"echo": "echo",
                      "goto": "OK",
                      "load": "OK",
+                     "snapshot": "OK",
                      "": "ERROR"}
 
-        response_text = responses.get(data.split()[0] if data else "")
-        try:
-            response_text = bytes("{}".format(response_text), 'ascii')
-        except TypeError:
-            pass
+        for data in self.rfile:
+            try:
+                data = str(data, 'ascii')
+            except TypeError:
+                pass
 
-        self.request.sendall(response_text)
+            response_text = responses.get(data.split()[0] if data.split()
+                                          else "", "ERROR")
+            try:
+                response_text = bytes("{}\n".format(response_text), 'ascii')
+            except TypeError:
+                response_text = "{}\n".format(response_text)
 
+            self.wfile.write(response_text)
 
-class TCPServer(socketserver.TCPServer):
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    daemon_threads = True
 
 
 class TestCmd(TestCase):
@@ -52,6 +58,7 @@ class TestCmd(TestCase):
         self.igv_client = helpers.IGV()
 
     def tearDown(self):
+        self.igv_client.close()
         self.igv_server.shutdown()
         self.igv_server.server_close()
         try:
@@ -78,6 +85,83 @@ class TestCmd(TestCase):
     def test_we_can_send_through_command_method(self):
         self.assertEqual(self.igv_client.command("echo"), "echo")
 
+    def test_we_can_send_snapshot_signal(self):
+        self.assertTrue(self.igv_client.snapshot("chr1_123456.png"))
+
+    def test_batch_returns_results_in_order(self):
+        results = self.igv_client.batch(
+            ["echo", "goto chr1:123456", "bogus", "load file.bam"])
+
+        self.assertEqual([_.response for _ in results],
+                         ["echo", "OK", "ERROR", "OK"])
+        self.assertEqual([_.ok for _ in results], [True, True, False, True])
+        self.assertEqual(results[1].command, "goto chr1:123456")
+
+    def test_batch_longer_than_the_window(self):
+        results = self.igv_client.connection.send_many(
+            ["goto chr1:{}\n".format(_) for _ in range(500)], window=16)
+
+        self.assertEqual(results, ["OK"] * 500)
+
+    def test_pipeline_sends_on_exit(self):
+        with self.igv_client.pipeline() as pipe:
+            pipe.goto("chr1:123456").snapshot("chr1_123456.png")
+            self.assertEqual(len(pipe), 2)
+
+        self.assertEqual(len(pipe), 0)
+        self.assertTrue(all(_.ok for _ in pipe.results))
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        try:
+            super().setUp()
+        except TypeError:
+            super(TestConnectionPool, self).setUp()
+        self.igv_server = TCPServer(("localhost", 0), TCPRequestHandler)
+        self.port = self.igv_server.server_address[1]
+
+        server_thread = threading.Thread(target=self.igv_server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+        self.pool = helpers.ConnectionPool()
+        self.igv_client = helpers.IGV(port=self.port, pool=self.pool)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.igv_server.shutdown()
+        self.igv_server.server_close()
+        try:
+            super().tearDown()
+        except TypeError:
+            super(TestConnectionPool, self).tearDown()
+
+    def test_commands_reuse_the_same_session(self):
+        self.assertTrue(self.igv_client.check_igv())
+        session = self.igv_client.connection.telnet
+        self.assertTrue(self.igv_client.goto("chr1:12345"))
+        self.assertIs(self.igv_client.connection.telnet, session)
+
+    def test_clients_to_same_port_share_the_connection(self):
+        other_client = helpers.IGV(port=self.port, pool=self.pool)
+        self.assertIs(self.igv_client.connection, other_client.connection)
+
+    def test_reconnects_when_the_session_is_dropped(self):
+        self.assertTrue(self.igv_client.check_igv())
+        # Break the socket under the pool's feet.
+        self.igv_client.connection.telnet.sock.close()
+        self.assertTrue(self.igv_client.goto("chr1:12345"))
+
+    def test_idle_sessions_are_evicted(self):
+        self.assertTrue(self.igv_client.check_igv())
+        self.pool.idle_timeout = 0
+        time.sleep(0.01)
+
+        self.assertEqual(self.pool.evict_idle(), 1)
+        self.assertFalse(self.igv_client.connection.is_open)
+        self.assertTrue(self.igv_client.check_igv())
+
 
 class TestVCFandTAB(TestCase):
     def setUp(self):
@@ -108,6 +192,19 @@ class TestVCFandTAB(TestCase):
 
         self.assertEqual(len([_ for _ in self.variants_tab]), 3)
 
+    def test_vcf_line_generator_matches_pyvcf(self):
+        self.assertEqual(
+            list(self.variants_vcf.vcf_line_generator()),
+            list(self.variants_vcf.vcf_generator(
+                self.variants_vcf.records())))
+
+    def test_records_give_every_field(self):
+        record = next(self.variants_vcf.records())
+
+        self.assertEqual(record.CHROM, "chr20")
+        self.assertEqual(record.QUAL, 29)
+        self.assertEqual(len(record.samples), 3)
+
     def test_tab_generator(self):
         self.assertEqual(
             len([_ for _ in self.variants_tab.tab_generator()]), 3)
@@ -162,3 +259,201 @@ class TestXLSandODF(TestCase):
                           ("chr1", "7572645"),
                           ("chr1", "7573472")],
                          [_ for _ in self.variants_xlsx])
+
+
+class TestRandomAccess(TestCase):
+    def setUp(self):
+        try:
+            super().setUp()
+        except TypeError:
+            super(TestRandomAccess, self).setUp()
+        self.vcf_file = os.path.join(os.path.dirname(__file__),
+                                     "files/example-4.0.vcf")
+        self.tab_file = os.path.join(os.path.dirname(__file__),
+                                     "files/example.tab")
+        self.xls_file = os.path.join(os.path.dirname(__file__),
+                                     "files/example.xls")
+
+    def test_index_matches_iteration(self):
+        for path in (self.vcf_file, self.tab_file, self.xls_file):
+            variants = helpers.Variants(path)
+            self.assertEqual([variants[_] for _ in range(len(variants))],
+                             list(helpers.Variants(path)))
+
+    def test_index_is_built_as_needed(self):
+        variants = helpers.Variants(self.vcf_file)
+
+        self.assertEqual(variants[1], ("chr20", "17330"))
+        self.assertEqual(variants.indexed, 2)
+        self.assertFalse(variants.complete)
+
+        self.assertEqual(variants[0], ("chr20", "14370"))
+        self.assertEqual(variants[-1], ("chr20", "1234567"))
+        self.assertTrue(variants.complete)
+
+    def test_index_out_of_range(self):
+        variants = helpers.Variants(self.tab_file)
+
+        with self.assertRaises(IndexError):
+            variants[3]
+        self.assertEqual(len(variants), 3)
+
+    def test_first_variant_does_not_read_the_whole_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".tab",
+                                         delete=False) as tabfile:
+            tabfile.write("Chr\tStart\tEnd\tRef\tAlt\n")
+            for i in range(100000):
+                tabfile.write("chr1\t{0}\t{0}\tA\tC\n".format(i + 1))
+        self.addCleanup(os.remove, tabfile.name)
+
+        variants = helpers.Variants(tabfile.name)
+
+        self.assertEqual(variants[0], ("chr1", "1"))
+        self.assertEqual(variants.indexed, 1)
+        self.assertEqual(len(variants), 100000)
+        self.assertEqual(variants[99999], ("chr1", "100000"))
+
+    def test_index_reports_the_fraction_scanned(self):
+        variants = helpers.Variants(self.vcf_file)
+        variants[1]
+
+        self.assertTrue(0 < variants.index.progress < 1)
+        len(variants)
+        self.assertEqual(variants.index.progress, 1)
+
+    def test_only_plain_and_bgzipped_text_files_are_seekable(self):
+        self.assertTrue(helpers.Variants(self.vcf_file).seekable)
+        self.assertFalse(helpers.Variants(self.xls_file).seekable)
+        self.assertTrue(helpers.Variants(os.path.join(
+            os.path.dirname(__file__),
+            "files/example-regions.vcf.gz")).seekable)
+        self.assertFalse(helpers.Variants(self.vcf_file,
+                                          region="chr20").seekable)
+
+    def test_other_headers_are_skipped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tab = os.path.join(directory, "genes.tab")
+        with open(tab, "w") as tabfile:
+            tabfile.write("CHROM\tPOS\tID\tGENE\tEFFECT\n"
+                          "chr1\t123\t.\tTP53\tmissense\n")
+        book = os.path.join(directory, "genes.xlsx")
+        xlsx.write_xlsx(book, [("genes", [("Chr", "Position", "Gene"),
+                                          ("chr2", 456, "BRCA2")])])
+
+        for path, variant in ((tab, ("chr1", "123")),
+                              (book, ("chr2", "456"))):
+            variants_cache = cache.VariantCache(directory)
+            self.assertEqual(list(helpers.Variants(path)), [variant])
+            variants = helpers.Variants(path, cache=variants_cache)
+            self.assertEqual((len(variants), variants[0]), (1, variant))
+
+    def test_to_store_reports_the_variants_read(self):
+        counts = []
+        store = helpers.Variants(self.vcf_file).to_store(counts.append,
+                                                         every=2)
+
+        self.assertEqual(counts, [2, 4])
+        self.assertEqual(len(store), 5)
+
+
+class TestVariantStore(TestCase):
+    def setUp(self):
+        try:
+            super().setUp()
+        except TypeError:
+            super(TestVariantStore, self).setUp()
+        self.store = helpers.VariantStore.from_iterable(
+            [("chr10", "500"), ("chr2", "300"), ("chrX", "5"),
+             ("chr2", "100"), ("chr1", "900")])
+
+    def test_chromosomes_are_stored_once(self):
+        self.assertEqual(self.store.chroms, ["chr10", "chr2", "chrX", "chr1"])
+        self.assertEqual(len(self.store), 5)
+
+    def test_items_behave_like_tuples(self):
+        self.assertEqual(self.store[1], ("chr2", "300"))
+        self.assertEqual(":".join(self.store[1]), "chr2:300")
+        self.assertEqual(self.store.locus(1), "chr2:300")
+        self.assertEqual(str(self.store[-1]), "chr1:900")
+
+    def test_sort_in_natural_chromosome_order(self):
+        self.store.sort()
+
+        self.assertEqual([str(_) for _ in self.store],
+                         ["chr1:900", "chr2:100", "chr2:300", "chr10:500",
+                          "chrX:5"])
+
+    def test_select_and_take(self):
+        on_chr2 = self.store.select(
+            [_ == self.store.code("chr2") for _ in self.store.codes])
+
+        self.assertEqual(list(on_chr2), [("chr2", "300"), ("chr2", "100")])
+        self.assertEqual(list(self.store[3:]), [("chr2", "100"),
+                                                ("chr1", "900")])
+
+    def test_variants_to_store(self):
+        variants = helpers.Variants(os.path.join(os.path.dirname(__file__),
+                                                 "files/example-4.0.vcf"))
+        store = variants.to_store()
+
+        self.assertEqual(list(store), list(variants))
+        self.assertEqual(store.positions.itemsize, 4)
+
+
+class TestVariantSet(TestCase):
+    def setUp(self):
+        try:
+            super().setUp()
+        except TypeError:
+            super(TestVariantSet, self).setUp()
+        self.files = os.path.join(os.path.dirname(__file__), "files")
+        self.paths = [os.path.join(self.files, _) for _ in
+                      ("example.tab", "example-4.0.vcf", "example.xls")]
+
+    def test_files_are_merged_sorted_and_deduplicated(self):
+        variants = helpers.VariantSet(self.paths, processes=2)
+
+        # The TAB and XLS files hold the same three variants.
+        self.assertEqual(len(variants), 8)
+        self.assertEqual([str(_) for _ in variants][:4],
+                         ["chr1:7571115", "chr1:7572645", "chr1:7573472",
+                          "chr20:14370"])
+        self.assertTrue(variants.complete)
+
+    def test_same_result_in_one_process(self):
+        self.assertEqual(list(helpers.VariantSet(self.paths, processes=1)),
+                         list(helpers.VariantSet(self.paths, processes=2)))
+
+    def test_progress_is_reported_per_file(self):
+        for processes in (1, 2):
+            done = []
+            helpers.VariantSet(self.paths, processes=processes,
+                               progress=lambda *_: done.append(_))
+
+            self.assertEqual(done, [(1, 3), (2, 3), (3, 3)])
+
+    def test_progress_can_stop_the_reading(self):
+        def stop(done, total):
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            helpers.VariantSet(self.paths, processes=2, progress=stop)
+
+    def test_globs_are_expanded(self):
+        variants = helpers.VariantSet(os.path.join(self.files, "example*.tab"))
+
+        self.assertEqual(variants.filenames,
+                         [os.path.join(self.files, "example.tab"),
+                          os.path.join(self.files, "example_noheader.tab")])
+        self.assertEqual(len(variants), 3)
+
+    def test_store_merge_and_unique(self):
+        store = helpers.VariantStore.merge([
+            helpers.VariantStore.from_iterable([("chr2", 5), ("chr1", 9)]),
+            helpers.VariantStore.from_iterable([("chr1", 9), ("chr3", 1)])])
+        store.sort()
+        store.unique()
+
+        self.assertEqual([str(_) for _ in store],
+                         ["chr1:9", "chr2:5", "chr3:1"])
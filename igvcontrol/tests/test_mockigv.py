@@ -0,0 +1,146 @@
+"""Tests for the mock IGV batch port."""
+import asyncio
+import io
+import random
+import socket
+import time
+from unittest import TestCase
+
+from igvcontrol import asyncigv, helpers, mockigv
+
+
+class TestParseLatency(TestCase):
+    def test_fixed_and_distributions(self):
+        rng = random.Random(0)
+
+        self.assertEqual(mockigv.parse_latency("0.05")(rng), 0.05)
+        self.assertEqual(mockigv.parse_latency(2)(rng), 2)
+        self.assertTrue(1 <= mockigv.parse_latency("uniform:1:3")(rng) <= 3)
+        self.assertGreaterEqual(mockigv.parse_latency("normal:0:1")(rng), 0)
+        self.assertGreater(mockigv.parse_latency("exponential:1")(rng), 0)
+
+    def test_bad_specs(self):
+        for spec in ("fast", "uniform:1", "normal:a:b", "gamma:1:2"):
+            with self.assertRaises(ValueError):
+                mockigv.parse_latency(spec)
+
+    def test_latencies_by_command(self):
+        latencies = mockigv.parse_latencies("0.01,load=2")
+
+        self.assertEqual(latencies[None](None), 0.01)
+        self.assertEqual(latencies["load"](None), 2)
+
+
+class TestMockIGV(TestCase):
+    def start(self, **options):
+        igv = mockigv.MockIGV(**options).start()
+        self.addCleanup(igv.stop)
+        return igv
+
+    def test_answers_like_igv_on_one_connection(self):
+        igv = self.start()
+        client = helpers.IGV(port=igv.port, pool=helpers.ConnectionPool())
+        self.addCleanup(client.close)
+
+        results = client.batch(["echo", "goto chr1:1", "bogus"])
+
+        self.assertEqual([_.response for _ in results],
+                         ["echo", "OK", "ERROR Unknown command: bogus"])
+        self.assertEqual(len(set(_.client for _ in igv.requests)), 1)
+        self.assertEqual(igv.commands, ["echo", "goto chr1:1", "bogus"])
+
+    def test_small_batches_dont_wait_for_acknowledgements(self):
+        igv = self.start(keep_requests=False)
+        client = helpers.IGV(port=igv.port, pool=helpers.ConnectionPool())
+        self.addCleanup(client.close)
+
+        started = time.time()
+        for _ in range(20):
+            client.batch(["goto chr1:{}".format(_) for _ in range(10)])
+
+        # The mock, as IGV may, waits for the ACK of an answer to write
+        # the next one. Each batch would take a delayed ACK, 40 ms.
+        self.assertLess(time.time() - started, 0.4)
+
+    def test_small_async_batches_dont_wait_for_acknowledgements(self):
+        igv = self.start(keep_requests=False)
+        client = asyncigv.AsyncIGV(port=igv.port)
+
+        async def batches():
+            for _ in range(20):
+                await client.batch(["goto chr1:{}".format(_)
+                                    for _ in range(10)])
+            await client.close()
+
+        started = time.time()
+        asyncio.new_event_loop().run_until_complete(batches())
+
+        self.assertLess(time.time() - started, 0.4)
+
+    def test_latency_by_command(self):
+        igv = self.start(latency={"load": 0.3})
+        with socket.create_connection(("localhost", igv.port)) as sock:
+            stream = sock.makefile("rwb")
+            stream.write(b"goto chr1:1\nload a.bam\n")
+            stream.flush()
+            stream.readline()
+            started = time.time()
+            stream.readline()
+
+        self.assertGreater(time.time() - started, 0.2)
+        self.assertGreater(igv.requests[1].seconds, 0.29)
+
+    def test_injected_failures_repeat_with_the_seed(self):
+        fates = []
+        for _ in range(2):
+            igv = self.start(errors=0.3, drops=0.2, seed=1)
+            fates.append([igv._draw("goto")[1] for _ in range(50)])
+
+        self.assertEqual(fates[0], fates[1])
+        self.assertEqual(set(fates[0]), {"ok", "error", "drop"})
+
+    def test_drops_and_stalls_hang_up(self):
+        igv = self.start(drops=1)
+        with self.assertRaises(EOFError):
+            asyncio.new_event_loop().run_until_complete(
+                asyncigv.AsyncIGV(port=igv.port).command("goto chr1:1"))
+
+        igv = self.start(stalls=1, stall=0.2)
+        client = asyncigv.AsyncIGV(port=igv.port, timeout=0.1)
+        with self.assertRaises(socket.timeout):
+            asyncio.new_event_loop().run_until_complete(
+                client.command("goto chr1:1"))
+
+    def test_hammer_counts_hang_ups(self):
+        igv = self.start(drops=0.3, seed=2)
+        clients = [asyncigv.AsyncIGV(port=igv.port) for _ in range(3)]
+
+        outcomes = asyncio.new_event_loop().run_until_complete(
+            asyncigv.hammer(clients, 50))
+
+        self.assertEqual(sum(outcomes.values()), 150)
+        self.assertGreater(outcomes["error"], 0)
+
+    def test_serial_igvs_answer_one_command_at_a_time(self):
+        for serial, slowest in ((False, 0.5), (True, 0.6)):
+            igv = self.start(latency=0.2, serial=serial)
+            clients = [asyncigv.AsyncIGV(port=igv.port) for _ in range(4)]
+            started = time.time()
+            outcomes = asyncio.new_event_loop().run_until_complete(
+                asyncigv.hammer(clients, 1))
+
+            self.assertEqual(outcomes["ok"], 4)
+            if serial:
+                self.assertGreater(time.time() - started, slowest)
+            else:
+                self.assertLess(time.time() - started, slowest)
+
+    def test_requests_are_logged(self):
+        log_file = io.StringIO()
+        igv = self.start(log_file=log_file, keep_requests=False)
+        helpers.IGV(port=igv.port).goto("chr1:1")
+        igv.stop()
+
+        fields = log_file.getvalue().rstrip("\n").split("\t")
+        self.assertEqual(fields[2:4], ["goto chr1:1", "OK"])
+        self.assertIsNone(igv.requests)
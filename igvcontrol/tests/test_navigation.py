@@ -0,0 +1,77 @@
+"""Tests for the jumps to a variant."""
+import os
+from unittest import TestCase
+
+from igvcontrol import helpers, navigation, sorting
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestLocusIndex(TestCase):
+    def setUp(self):
+        self.variants = [("chr2", "500"), ("chr1", "300"), ("chr1", "100"),
+                         ("chrX", "7"), ("chr1", "200")]
+        self.index = navigation.LocusIndex(self.variants)
+
+    def test_finds_the_first_variant_at_or_after_a_position(self):
+        self.assertEqual(self.index.find("chr1", 150), 4)
+        self.assertEqual(self.index.find("chr1", 200), 4)
+        self.assertEqual(self.index.find("chr1"), 2)
+        self.assertIsNone(self.index.find("chr1", 301))
+        self.assertIsNone(self.index.find("chr3"))
+
+    def test_chr_prefixes_are_optional(self):
+        self.assertEqual(self.index.find("X"), 3)
+        self.assertEqual(self.index.after("1", 200), 1)
+
+    def test_stores_and_clusters_are_indexed_from_their_arrays(self):
+        store = helpers.VariantStore.from_iterable(self.variants)
+        self.assertEqual(len(navigation.LocusIndex(store)), 5)
+
+        store.sort()
+        clusters = sorting.Clusters(store, width=150)
+        index = navigation.LocusIndex(clusters)
+        self.assertEqual(index.find("chr1", 250), 1)
+        self.assertEqual(len(index), len(clusters))
+
+
+class TestNavigator(TestCase):
+    def setUp(self):
+        self.variants = helpers.Variants(os.path.join(FILES,
+                                                      "example-4.0.vcf"))
+        self.navigator = navigation.Navigator(self.variants)
+
+    def test_numbers_are_1_based(self):
+        self.assertEqual(self.navigator.jump("3"), 2)
+        self.assertEqual(self.navigator.jump(" #5 "), 4)
+
+    def test_numbers_only_read_as_far_as_needed(self):
+        self.navigator.jump("2")
+
+        self.assertFalse(self.variants.complete)
+        self.assertIsNone(self.navigator._index)
+
+    def test_numbers_out_of_the_list(self):
+        for query in ("0", "6", "1,000"):
+            with self.assertRaises(ValueError):
+                self.navigator.jump(query)
+
+    def test_loci(self):
+        self.assertEqual(self.navigator.jump("chr20:1,110,000"), 2)
+        self.assertEqual(self.navigator.jump("20:1230237-1240000"), 3)
+        with self.assertRaises(ValueError):
+            self.navigator.jump("chr20:2000000")
+        with self.assertRaises(ValueError):
+            self.navigator.jump("chr7:1")
+
+    def test_chromosomes_go_to_the_next_variant_on_them(self):
+        self.assertEqual(self.navigator.jump("chr20"), 0)
+        self.assertEqual(self.navigator.jump("chr20", 2), 3)
+        with self.assertRaises(ValueError):
+            self.navigator.jump("chr20", 4)
+        with self.assertRaises(ValueError):
+            self.navigator.jump("chr13")
+
+    def test_gene_names_are_left_for_igv(self):
+        self.assertIsNone(self.navigator.jump("KRAS"))
+        self.assertIsNone(self.navigator.jump("BRCA1 BRCA2"))
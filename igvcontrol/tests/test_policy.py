@@ -0,0 +1,145 @@
+"""Tests for the timeouts, retries and circuit breaker of the clients."""
+import asyncio
+import socket
+import time
+from unittest import TestCase
+
+from igvcontrol import asyncigv, helpers, policy
+from igvcontrol.tests.test_asyncigv import SlowTCPRequestHandler, start_server
+
+
+class DroppingTCPRequestHandler(SlowTCPRequestHandler):
+    def handle(self):
+        """Hang up on the first connections, then answer as IGV."""
+        if self.server.drops:
+            self.server.drops -= 1
+            return
+        super().handle()
+
+
+class TestAdaptiveTimeout(TestCase):
+    def setUp(self):
+        self.timeouts = policy.AdaptiveTimeout({"load": 300})
+
+    def test_unseen_commands_use_the_initial_timeouts(self):
+        self.assertEqual(self.timeouts.timeout("load"), 300)
+        self.assertEqual(self.timeouts.timeout("goto"), 10)
+        self.assertEqual(self.timeouts.timeout("bogus"), 10)
+
+    def test_timeouts_follow_the_latency(self):
+        for _ in range(50):
+            self.timeouts.observe("goto", 1.0)
+
+        self.assertAlmostEqual(self.timeouts.timeout("goto"), 1.0, places=2)
+
+        self.timeouts.observe("goto", 3.0)
+        self.assertGreater(self.timeouts.timeout("goto"), 2.0)
+
+    def test_timeouts_are_bounded(self):
+        self.timeouts.observe("goto", 0.001)
+
+        self.assertEqual(self.timeouts.timeout("goto"), 0.5)
+
+    def test_expired_timeouts_double_until_answered(self):
+        self.timeouts.expired("goto")
+        self.timeouts.expired("goto")
+        self.assertEqual(self.timeouts.timeout("goto"), 40)
+
+        self.timeouts.observe("goto", 2.0)
+        self.assertEqual(self.timeouts.timeout("goto"), 6.0)
+
+
+class TestCircuitBreaker(TestCase):
+    def test_opens_after_failures_in_a_row(self):
+        breaker = policy.CircuitBreaker(failures=2, cooldown=60)
+        breaker.failure()
+        breaker.check()
+        breaker.failure()
+
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(policy.IGVUnavailable):
+            breaker.check()
+
+    def test_lets_one_call_try_after_the_cooldown(self):
+        breaker = policy.CircuitBreaker(failures=1, cooldown=0.05)
+        breaker.failure()
+        time.sleep(0.06)
+
+        breaker.check()
+        with self.assertRaises(policy.IGVUnavailable):
+            breaker.check()
+        breaker.success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestPolicy(TestCase):
+    def test_idempotent_commands_are_retried_with_backoff(self):
+        igv_policy = policy.Policy(retries=3, backoff=0.1, max_backoff=0.3,
+                                   failures=10)
+        commands = ["goto chr1:1\n"]
+
+        self.assertEqual([igv_policy.failed(commands, OSError(), _)
+                          for _ in range(4)], [0.1, 0.2, 0.3, None])
+
+    def test_loads_are_not_retried(self):
+        igv_policy = policy.Policy()
+
+        self.assertIsNone(igv_policy.failed(["goto chr1:1\n", "load a.bam\n"],
+                                            OSError(), 0))
+
+    def test_copies_have_their_own_state(self):
+        igv_policy = policy.Policy(failures=1)
+        igv_policy.failed(["echo"], OSError(), 0)
+
+        self.assertEqual(igv_policy.copy().breaker.state, "closed")
+
+
+class TestClientsWithPolicy(TestCase):
+    def setUp(self):
+        self.server = start_server(DroppingTCPRequestHandler)
+        self.server.drops = 0
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_dropped_commands_are_retried(self):
+        self.server.drops = 2
+        igv = helpers.IGV(port=self.port, pool=helpers.ConnectionPool(),
+                          policy=policy.Policy(backoff=0.01))
+
+        self.assertTrue(igv.goto("chr1:1"))
+        igv.close()
+
+    def test_slow_answers_time_out(self):
+        self.server.latency = 1
+        igv = helpers.IGV(port=self.port, pool=helpers.ConnectionPool(),
+                          policy=policy.Policy({"goto": 0.5}, retries=0))
+
+        start = time.time()
+        with self.assertRaises(socket.timeout):
+            igv.goto("chr1:1")
+        self.assertLess(time.time() - start, 0.9)
+
+    def test_igv_down_fails_fast(self):
+        self.server.shutdown()
+        self.server.server_close()
+        igv = helpers.IGV(port=self.port, pool=helpers.ConnectionPool(),
+                          policy=policy.Policy(backoff=0.01, failures=3))
+
+        with self.assertRaises(OSError):
+            igv.goto("chr1:1")
+        with self.assertRaises(policy.IGVUnavailable):
+            igv.goto("chr1:1")
+
+    def test_async_dropped_commands_are_retried(self):
+        self.server.drops = 1
+        igv = asyncigv.AsyncIGV(port=self.port,
+                                policy=policy.Policy(backoff=0.01))
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertTrue(loop.run_until_complete(igv.goto("chr1:1")))
+            loop.run_until_complete(igv.close())
+        finally:
+            loop.close()
@@ -0,0 +1,136 @@
+"""Tests for saving and resuming reviews."""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import helpers, navigation, session
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestSession(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vcf = os.path.join(self.directory, "calls.vcf")
+        shutil.copy(os.path.join(FILES, "example-4.0.vcf"), self.vcf)
+        self.path = os.path.join(self.directory, "review.session")
+        self.variants = list(helpers.Variants(self.vcf))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, resume=True):
+        return session.Session(self.path, [self.vcf], resume=resume)
+
+    def test_the_review_is_resumed(self):
+        review = self.open()
+        review.moved(3, self.variants[3])
+        review.mark(self.variants[1], "flagged")
+        review.mark(self.variants[2], "reviewed")
+        review.mark(self.variants[2])
+        review.close()
+
+        review = self.open()
+        self.assertEqual(review.index, 3)
+        self.assertEqual(review.locus, ":".join(self.variants[3]))
+        self.assertEqual(review.marks, {":".join(self.variants[1]):
+                                        "flagged"})
+        self.assertEqual(review.changed, [])
+
+    def test_changes_are_appended(self):
+        review = self.open()
+        review.moved(1, self.variants[1])
+        size = os.path.getsize(self.path)
+        review.moved(2, self.variants[2])
+
+        with open(self.path) as session_file:
+            session_file.seek(size)
+            self.assertEqual(session_file.read(), "at\t2\t{}\n".format(
+                ":".join(self.variants[2])))
+
+    def test_without_resume_only_the_position_starts_over(self):
+        review = self.open()
+        review.moved(3, self.variants[3])
+        review.mark(self.variants[1], "flagged")
+        review.close()
+
+        review = self.open(resume=False)
+        self.assertEqual((review.index, review.locus), (0, None))
+        review.moved(1, self.variants[1])
+        review.close()
+
+        review = self.open()
+        self.assertEqual(review.index, 1)
+        self.assertEqual(review.marks, {":".join(self.variants[1]):
+                                        "flagged"})
+
+    def test_other_files_are_never_overwritten(self):
+        review = self.open()
+        review.mark(self.variants[1], "flagged")
+        review.close()
+        with open(self.path) as session_file:
+            saved = session_file.read()
+
+        for resume in (True, False):
+            with self.assertRaises(ValueError):
+                session.Session(self.path, [os.path.join(FILES,
+                                                         "example.tab")],
+                                resume=resume)
+        with open(self.path) as session_file:
+            self.assertEqual(session_file.read(), saved)
+
+    def test_changed_sources_are_told(self):
+        self.open().moved(1, self.variants[1])
+        with open(self.vcf, "a") as vcf_file:
+            vcf_file.write("20\t1234570\t.\tA\tT\t50\tPASS\tNS=1\n")
+
+        self.assertEqual(self.open().changed, [self.vcf])
+
+    def test_sources_of(self):
+        self.open().moved(1, self.variants[1])
+
+        self.assertEqual(session.sources_of(self.path), [self.vcf])
+
+    def test_restore_finds_the_variant_if_the_list_changed(self):
+        review = self.open()
+        review.moved(3, self.variants[3])
+        navigator = navigation.Navigator(self.variants)
+        self.assertEqual(review.restore(navigator), 3)
+
+        navigator = navigation.Navigator(self.variants[2:])
+        self.assertEqual(review.restore(navigator), 1)
+
+    def test_unknown_marks(self):
+        with self.assertRaises(ValueError):
+            self.open().mark(self.variants[1], "maybe")
+
+    def test_export_tab(self):
+        review = self.open()
+        review.mark(self.variants[3], "reviewed")
+        review.mark(self.variants[1], "flagged")
+        tab = os.path.join(self.directory, "marks.tab")
+
+        self.assertEqual(review.export(tab), 2)
+        with open(tab) as tab_file:
+            self.assertEqual(tab_file.read().splitlines(), [
+                "Chr\tPosition\tMark",
+                "\t".join(self.variants[1] + ("flagged",)),
+                "\t".join(self.variants[3] + ("reviewed",))])
+
+    def test_export_vcf(self):
+        review = self.open()
+        review.mark(self.variants[1], "flagged")
+        vcf = os.path.join(self.directory, "marks.vcf")
+
+        self.assertEqual(review.export(vcf, marks=("flagged",)), 1)
+        exported = helpers.Variants(vcf)
+        self.assertEqual(list(exported), [self.variants[1]])
+        self.assertEqual(next(exported.records()).INFO["REVIEW"], "flagged")
+
+    def test_only_vcf_files_export_as_vcf(self):
+        review = session.Session(self.path,
+                                 [os.path.join(FILES, "example.tab")])
+
+        with self.assertRaises(ValueError):
+            review.export(os.path.join(self.directory, "marks.vcf"))
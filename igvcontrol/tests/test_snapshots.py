@@ -0,0 +1,104 @@
+"""Tests for the unattended snapshot mode."""
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from igvcontrol import snapshots
+from igvcontrol.tests.test_asyncigv import (RecordingTCPRequestHandler,
+                                            start_server)
+
+
+class FailingTCPRequestHandler(RecordingTCPRequestHandler):
+    def handle(self):
+        """Answer ERROR to goto chr1:3, as IGV does for unknown loci."""
+        for data in self.rfile:
+            command = data.decode("ascii").strip()
+            self.server.commands.append(command)
+            time.sleep(self.server.latency)
+            if command == "goto chr1:3":
+                self.wfile.write(b"ERROR\n")
+            else:
+                self.wfile.write(b"OK\n")
+
+
+class TestSnapshotJob(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.servers = [start_server(RecordingTCPRequestHandler,
+                                     latency=0.01) for _ in range(2)]
+        self.endpoints = [("localhost", _.server_address[1])
+                          for _ in self.servers]
+        self.variants = [("chr1", str(_)) for _ in range(1, 21)]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def snapshots_taken(self):
+        return sorted(_.split(" ", 1)[1] for server in self.servers
+                      for _ in server.commands if _.startswith("snapshot "))
+
+    def test_snapshot_names_keep_the_order(self):
+        self.assertEqual(snapshots.snapshot_name(0, ("chr1", "123")),
+                         "000001_chr1_123.png")
+
+    def test_every_variant_is_snapshotted_once(self):
+        report = snapshots.SnapshotJob(self.variants, self.directory,
+                                       self.endpoints).run()
+
+        self.assertEqual(report, (20, 0, []))
+        self.assertEqual(self.snapshots_taken(), sorted(
+            snapshots.snapshot_name(*_) for _ in enumerate(self.variants)))
+        self.assertIn("snapshotDirectory {}".format(self.directory),
+                      self.servers[0].commands)
+
+    def test_the_igvs_share_the_work(self):
+        snapshots.SnapshotJob(self.variants, self.directory,
+                              self.endpoints).run()
+
+        self.assertTrue(all(_.commands for _ in self.servers))
+
+    def test_runs_resume_from_the_journal(self):
+        snapshots.SnapshotJob(self.variants[:12], self.directory,
+                              self.endpoints).run()
+        for server in self.servers:
+            del server.commands[:]
+
+        report = snapshots.SnapshotJob(self.variants, self.directory,
+                                       self.endpoints).run()
+
+        self.assertEqual(report, (8, 12, []))
+        self.assertEqual(len(self.snapshots_taken()), 8)
+
+    def test_failed_variants_are_reported_and_retried(self):
+        failing = start_server(FailingTCPRequestHandler)
+        self.servers.append(failing)
+        job = snapshots.SnapshotJob(self.variants[:5], self.directory,
+                                    [("localhost",
+                                      failing.server_address[1])])
+
+        self.assertEqual(job.run(), (4, 0, ["000003_chr1_3.png"]))
+        self.assertNotIn("000003_chr1_3.png", job.finished())
+
+    def test_a_missing_igv_leaves_the_work_to_the_others(self):
+        self.servers[1].shutdown()
+        self.servers[1].server_close()
+        del self.servers[1].commands[:]
+
+        report = snapshots.SnapshotJob(self.variants, self.directory,
+                                       self.endpoints).run()
+
+        self.assertEqual(report, (20, 0, []))
+
+    def test_reports_progress(self):
+        progress = []
+        snapshots.SnapshotJob(self.variants, self.directory, self.endpoints,
+                              progress=lambda *_: progress.append(_)).run()
+
+        self.assertEqual([_[:2] for _ in progress],
+                         [(_, 20) for _ in range(1, 21)])
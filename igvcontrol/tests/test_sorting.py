@@ -0,0 +1,87 @@
+"""Tests for the genomic sort and the clusters of variants."""
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import helpers, sorting
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestSort(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.variants = [("chr{}".format(random.choice(["1", "2", "10",
+                                                         "X"])),
+                          str(random.randint(1, 10000)))
+                         for _ in range(1000)]
+        self.expected = sorted(
+            self.variants, key=lambda _: (helpers.chrom_key(_[0]),
+                                          int(_[1])))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sorts_in_memory(self):
+        self.assertEqual(list(sorting.external_sort(self.variants)),
+                         self.expected)
+
+    def test_sorts_in_chunks_on_disk(self):
+        spilled = []
+        spill = sorting._spill
+
+        def recording_spill(store, directory):
+            spilled.append(spill(store, directory))
+            return spilled[-1]
+
+        sorting._spill = recording_spill
+        try:
+            result = list(sorting.external_sort(
+                self.variants, chunk_size=64, directory=self.directory))
+        finally:
+            sorting._spill = spill
+
+        self.assertEqual(result, self.expected)
+        self.assertEqual(len(spilled), 16)
+        # Temporary chunks are removed.
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sorts_variants_files(self):
+        variants = helpers.Variants(os.path.join(FILES, "example.tab"))
+        store = sorting.sort_variants(variants, chunk_size=2)
+
+        self.assertEqual(list(store), sorted(
+            helpers.Variants(os.path.join(FILES, "example.tab")),
+            key=lambda _: (helpers.chrom_key(_[0]), int(_[1]))))
+
+
+class TestClusters(TestCase):
+    def setUp(self):
+        self.store = helpers.VariantStore.from_iterable([
+            ("chr1", "1000"), ("chr1", "1100"), ("chr1", "1200"),
+            ("chr1", "1300"), ("chr1", "50000"), ("chr2", "50010")])
+
+    def test_close_variants_are_viewed_together(self):
+        clusters = sorting.Clusters(self.store, width=200, padding=20)
+
+        self.assertEqual(len(clusters), 4)
+        self.assertEqual(clusters.variants, 6)
+        self.assertEqual(":".join(clusters[0]), "chr1:980-1220")
+        self.assertEqual(clusters[0].count, 3)
+        self.assertEqual(":".join(clusters[1]), "chr1:1300")
+        self.assertEqual(":".join(clusters[2]), "chr1:50000")
+
+    def test_clusters_stay_on_one_chromosome(self):
+        clusters = sorting.Clusters(self.store, width=100000)
+
+        self.assertEqual([_[0] for _ in clusters], ["chr1", "chr2"])
+
+    def test_navigators_see_a_sequence(self):
+        clusters = sorting.Clusters(self.store)
+
+        self.assertTrue(clusters.complete)
+        self.assertEqual(len(list(clusters)), clusters.indexed)
+        with self.assertRaises(IndexError):
+            clusters[len(clusters)]
@@ -0,0 +1,62 @@
+"""Tests for the time the command line takes to start."""
+import os
+import subprocess
+import sys
+from unittest import TestCase, skipUnless
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+# Milliseconds to import igvcontrol.cmdline, checked only if set, as
+# timings depend on the machine. About 30 ms is usual.
+BUDGET = os.environ.get("IGVCONTROL_IMPORT_BUDGET")
+# Imported only by the modes or files needing them.
+LAZY = ("tkinter", "vcf", "xlrd", "readchar", "multiprocessing", "asyncio")
+# The igvcontrol modules each mode imports when it runs.
+MODES = ("asyncigv", "cache", "filters", "helpers", "mockigv", "navigation",
+         "session", "snapshots", "sorting", "tracks", "xlsx")
+
+
+def import_times(code):
+    """Return {module: cumulative microseconds} of running code.
+
+    As measured by python -X importtime, in a fresh interpreter.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+
+    return times
+
+
+class TestStartup(TestCase):
+    def test_cmdline_imports_only_what_it_needs(self):
+        times = import_times("import igvcontrol.cmdline")
+
+        self.assertEqual([_ for _ in times if _.split(".")[0] in LAZY], [])
+        self.assertEqual([_ for _ in times if _.startswith("igvcontrol.") and
+                          _.split(".")[1] in MODES], [])
+
+    @skipUnless(BUDGET, "IGVCONTROL_IMPORT_BUDGET not set")
+    def test_cmdline_starts_within_budget(self):
+        # The best of three, as the first run may fill the disk cache.
+        best = min(import_times("import igvcontrol.cmdline")[
+            "igvcontrol.cmdline"] for _ in range(3))
+        self.assertLess(best / 1000, float(BUDGET))
+
+    def test_tab_files_dont_import_pyvcf(self):
+        times = import_times(
+            "from igvcontrol import helpers; "
+            "list(helpers.Variants({!r}))".format(
+                os.path.join(FILES, "example.tab")))
+
+        self.assertNotIn("vcf", times)
+        self.assertNotIn("xlrd", times)
@@ -0,0 +1,113 @@
+"""Tests for the timings of the commands sent to IGV."""
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import asyncigv, helpers, stats
+from igvcontrol.tests.test_asyncigv import SlowTCPRequestHandler, start_server
+
+
+class TestStats(TestCase):
+    def setUp(self):
+        self.stats = stats.Stats(trace=True)
+        for total in range(1, 101):
+            timer = self.stats.timer()
+            timer.total = total / 1000.0
+            self.stats.record("localhost", 60151, ["goto chr1:1\n"], timer,
+                              "ok")
+
+    def test_percentiles(self):
+        self.assertEqual(self.stats.percentiles("total"),
+                         [0.05, 0.095, 0.099])
+        self.assertEqual(self.stats.percentiles("connect"),
+                         [None, None, None])
+
+    def test_histogram(self):
+        histogram = dict(self.stats.histogram("total", buckets=(10, 50)))
+
+        self.assertEqual(histogram, {10: 10, 50: 40, None: 50})
+
+    def test_summary_has_percentiles_and_counters(self):
+        summary = self.stats.summary()
+
+        self.assertIn("50.0", summary)
+        self.assertIn("calls 100", summary)
+        self.assertIn("ok 100", summary)
+
+    def test_export_trace(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.stats.export(os.path.join(directory, "trace.json"))
+            self.stats.export(os.path.join(directory, "trace.csv"))
+
+            with open(os.path.join(directory, "trace.json")) as trace:
+                calls = json.load(trace)
+            with open(os.path.join(directory, "trace.csv")) as trace:
+                rows = list(csv.DictReader(trace))
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(len(calls), 100)
+        self.assertEqual(calls[0]["command"], "goto chr1:1")
+        self.assertEqual(rows[-1]["total"], "0.1")
+
+
+class TestInstrumentedClients(TestCase):
+    def setUp(self):
+        self.server = start_server(SlowTCPRequestHandler, latency=0.01)
+        self.port = self.server.server_address[1]
+        self.stats = stats.Stats()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse_is_counted(self):
+        igv = helpers.IGV(port=self.port, pool=helpers.ConnectionPool(),
+                          stats=self.stats)
+        for _ in range(5):
+            igv.goto("chr1:1")
+        igv.close()
+
+        self.assertEqual(self.stats.counters["connections"], 1)
+        self.assertEqual(self.stats.counters["reused"], 4)
+        self.assertEqual(len(self.stats.samples["total"]), 5)
+        self.assertEqual(len(self.stats.samples["first_byte"]), 5)
+
+    def test_phases_are_in_order(self):
+        connection = helpers.Connection(port=self.port, stats=self.stats)
+        connection.send("goto chr1:1\n")
+        connection.close()
+
+        connect, write, first_byte, total = [
+            self.stats.samples[_][0] for _ in stats.PHASES]
+        self.assertTrue(connect <= write <= first_byte <= total)
+        self.assertGreaterEqual(first_byte, 0.01)
+
+    def test_errors_are_counted(self):
+        self.server.shutdown()
+        self.server.server_close()
+        connection = helpers.Connection(port=self.port, stats=self.stats)
+
+        with self.assertRaises(OSError):
+            connection.send("goto chr1:1\n")
+
+        self.assertEqual(self.stats.counters["error"], 1)
+
+    def test_async_timeouts_are_counted(self):
+        igv = asyncigv.AsyncIGV(port=self.port, stats=self.stats)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(igv.goto("chr1:1"))
+            with self.assertRaises(OSError):
+                loop.run_until_complete(igv.goto("chr1:1", timeout=0.001))
+            loop.run_until_complete(igv.close())
+        finally:
+            loop.close()
+
+        self.assertEqual(self.stats.counters["ok"], 1)
+        self.assertEqual(self.stats.counters["timeout"], 1)
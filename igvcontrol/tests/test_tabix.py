@@ -0,0 +1,130 @@
+"""Tests for bgzipped files and their tabix/CSI indexes."""
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import helpers, tabix
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestBgzfReader(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vcf_gz = os.path.join(FILES, "example-regions.vcf.gz")
+        self.reader = tabix.BgzfReader(self.vcf_gz)
+        self.addCleanup(self.reader.close)
+
+    def test_reads_the_same_as_gzip(self):
+        with gzip.open(self.vcf_gz) as vcffile:
+            self.assertEqual(list(self.reader), vcffile.readlines())
+
+    def test_seek_to_virtual_offsets(self):
+        offsets = []
+        lines = []
+        while True:
+            offsets.append(self.reader.tell())
+            line = self.reader.readline()
+            if not line:
+                break
+            lines.append(line)
+
+        for i in (5000, 0, 8999, 3):
+            self.reader.seek(offsets[i])
+            self.assertEqual(self.reader.readline(), lines[i])
+
+    def test_detects_bgzf(self):
+        self.assertTrue(tabix.is_bgzf(self.vcf_gz))
+        self.assertTrue(tabix.is_gzip(self.vcf_gz))
+        self.assertFalse(tabix.is_bgzf(os.path.join(FILES, "example.tab")))
+
+
+class TestTabixIndex(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vcf_gz = os.path.join(FILES, "example-regions.vcf.gz")
+        self.tab_gz = os.path.join(FILES, "example-regions.tab.gz")
+
+    def scan(self, filename, chrom, start, end):
+        """Return the lines in the region, reading the whole file."""
+        with gzip.open(filename, "rt") as handle:
+            return [_ for _ in handle if _.split("\t")[0] == chrom and
+                    start <= int(_.split("\t")[1]) <= end]
+
+    def test_parse_region(self):
+        self.assertEqual(tabix.parse_region("chr7:1,000-2,000"),
+                         ("chr7", 1000, 2000))
+        self.assertEqual(tabix.parse_region("chr7")[:2], ("chr7", 1))
+        with self.assertRaises(ValueError):
+            tabix.parse_region("chr7:a-b")
+
+    def test_fetch_with_tbi(self):
+        index = tabix.TabixIndex.find(self.vcf_gz)
+
+        self.assertEqual(index.names, ["1", "2", "X"])
+        for chrom, start, end in (("2", 100000, 400000), ("X", 1, 20000),
+                                  ("1", 1234567, 1234567)):
+            self.assertEqual(list(index.fetch(self.vcf_gz, chrom, start, end)),
+                             self.scan(self.vcf_gz, chrom, start, end))
+
+    def test_fetch_with_csi(self):
+        index = tabix.TabixIndex.find(self.tab_gz)
+
+        self.assertEqual(index.min_shift, 14)
+        lines = list(index.fetch(self.tab_gz, "chr2", 100000, 400000))
+        self.assertTrue(lines)
+        self.assertEqual(lines, self.scan(self.tab_gz, "chr2", 100000, 400000))
+
+    def test_fetch_accepts_chr_prefix(self):
+        index = tabix.TabixIndex.find(self.vcf_gz)
+
+        self.assertEqual(list(index.fetch(self.vcf_gz, "chrX", 1, 20000)),
+                         list(index.fetch(self.vcf_gz, "X", 1, 20000)))
+        self.assertEqual(list(index.fetch(self.vcf_gz, "chr9", 1, 20000)), [])
+
+
+class TestCompressedVariants(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vcf_gz = os.path.join(FILES, "example-regions.vcf.gz")
+        self.tab_gz = os.path.join(FILES, "example-regions.tab.gz")
+
+    def test_bgzipped_files_are_read_and_indexed(self):
+        for path in (self.vcf_gz, self.tab_gz):
+            variants = helpers.Variants(path)
+            self.assertEqual(variants[8999], list(helpers.Variants(path))[-1])
+            self.assertEqual(variants[0][0], "chr1")
+            self.assertEqual(len(variants), 9000)
+
+    def test_plain_gzip_files_are_read(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        vcf_gz = os.path.join(directory, "example.vcf.gz")
+        with open(os.path.join(FILES, "example-4.0.vcf"), "rb") as vcffile:
+            with gzip.open(vcf_gz, "wb") as compressed:
+                compressed.write(vcffile.read())
+
+        variants = helpers.Variants(vcf_gz)
+        self.assertEqual(variants[4], ("chr20", "1234567"))
+        self.assertEqual(list(helpers.Variants(vcf_gz)),
+                         list(helpers.Variants(
+                             os.path.join(FILES, "example-4.0.vcf"))))
+
+    def test_region_is_queried_through_the_index(self):
+        region = helpers.Variants(self.vcf_gz, region="chr2:100000-400000")
+        everything = helpers.Variants(self.vcf_gz)
+
+        expected = [_ for _ in everything if _[0] == "chr2" and
+                    100000 <= int(_[1]) <= 400000]
+        self.assertEqual(list(region), expected)
+        self.assertEqual(len(helpers.Variants(
+            self.tab_gz, region="chr2:100000-400000")), len(expected))
+
+    def test_region_without_index_is_filtered(self):
+        variants = helpers.Variants(os.path.join(FILES, "example-4.0.vcf"),
+                                    region="20:17000-1200000")
+
+        self.assertEqual(list(variants), [("chr20", "17330"),
+                                          ("chr20", "1110696")])
@@ -0,0 +1,139 @@
+"""Tests for loading tracks into IGV."""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from igvcontrol import asyncigv, mockigv, tracks
+from igvcontrol.tests.test_asyncigv import (RecordingTCPRequestHandler,
+                                            start_server)
+
+
+class TestReadTracks(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.directory, "samples.txt")
+        with open(self.manifest, "w") as manifest:
+            manifest.write("# The tumour first\n"
+                           "tumour.bam index=tumour.bai name=Tumour\n"
+                           "\n"
+                           "normal.bam  # matched\n"
+                           "https://example.org/exome.bed\n"
+                           "genome hg38\n"
+                           "tumour.bam\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_manifests_list_tracks_relative_to_them(self):
+        track_list = tracks.read_tracks([self.manifest])
+
+        self.assertEqual(track_list, [
+            tracks.Track("genome", "hg38", ()),
+            tracks.Track("load", os.path.join(self.directory, "tumour.bam"),
+                         ("index=tumour.bai", "name=Tumour")),
+            tracks.Track("load", os.path.join(self.directory, "normal.bam"),
+                         ()),
+            tracks.Track("load", "https://example.org/exome.bed", ())])
+
+    def test_tracks_are_loaded_once(self):
+        track_list = tracks.read_tracks([
+            os.path.join(self.directory, "normal.bam"), self.manifest,
+            "extra.bed"])
+
+        self.assertEqual([_.path for _ in track_list], [
+            "hg38", os.path.join(self.directory, "normal.bam"),
+            os.path.join(self.directory, "tumour.bam"),
+            "https://example.org/exome.bed", os.path.abspath("extra.bed")])
+        self.assertEqual(track_list[2].options,
+                         ("index=tumour.bai", "name=Tumour"))
+
+    def test_paths_given_are_whole(self):
+        track_list = tracks.read_tracks(["/data/My Documents/tumour.bam",
+                                         "/data/run#2/a.bam"])
+
+        self.assertEqual(track_list, [
+            tracks.Track("load", "/data/My Documents/tumour.bam", ()),
+            tracks.Track("load", "/data/run#2/a.bam", ())])
+        self.assertEqual(tracks.track_command(track_list[0]),
+                         'load "/data/My Documents/tumour.bam"')
+
+
+class TestTrackLoader(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.servers = [start_server(RecordingTCPRequestHandler, latency=0.2)
+                        for _ in range(2)]
+        self.group = asyncigv.make_controller(
+            [("localhost", _.server_address[1]) for _ in self.servers])
+        self.loader = tracks.TrackLoader(self.group)
+        self.loop = asyncio.new_event_loop()
+        self.track_list = [tracks.Track("load", "/data/{}.bam".format(_), ())
+                           for _ in "ab"]
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.group.close())
+        self.loop.close()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        super().tearDown()
+
+    def load(self, track_list):
+        return self.loop.run_until_complete(self.loader.load(track_list))
+
+    def test_igvs_load_at_the_same_time(self):
+        started = time.time()
+        results = self.load(self.track_list)
+
+        # Two loads of 0.2 s each, in both IGVs at once.
+        self.assertLess(time.time() - started, 0.7)
+        self.assertEqual(sorted(results), sorted(_.endpoint for _ in
+                                                 self.group.clients))
+        for server in self.servers:
+            self.assertEqual(server.commands, ["load /data/a.bam",
+                                               "load /data/b.bam"])
+
+    def test_loaded_tracks_are_skipped(self):
+        self.load(self.track_list[:1])
+        results = self.load(self.track_list)
+
+        for server in self.servers:
+            self.assertEqual(server.commands, ["load /data/a.bam",
+                                               "load /data/b.bam"])
+        self.assertEqual(tracks.summary(results, self.track_list, 0.2),
+                         ["Loaded 2 tracks in 0.2 s, 2 already there"])
+
+    def test_genomes_drop_the_tracks(self):
+        self.load(self.track_list)
+        self.load([tracks.Track("genome", "hg19", ())] + self.track_list)
+
+        self.assertEqual(self.servers[0].commands[2:], [
+            "genome hg19", "load /data/a.bam", "load /data/b.bam"])
+
+    def test_failures_are_told_and_retried_later(self):
+        self.servers[1].shutdown()
+        self.servers[1].server_close()
+        results = self.load(self.track_list)
+
+        lines = tracks.summary(results, self.track_list, 1)
+        self.assertEqual(lines[0], "Loaded 2 tracks in 1.0 s, 2 failed")
+        self.assertIn(self.group.clients[1].endpoint, lines[1])
+        self.assertEqual(self.loader.loaded[self.group.clients[1].endpoint],
+                         set())
+
+    def test_igvs_hanging_up_are_told(self):
+        igv = mockigv.MockIGV(drops=1).start()
+        self.addCleanup(igv.stop)
+        client = asyncigv.AsyncIGV(port=igv.port)
+        loader = tracks.TrackLoader(self.group, client)
+
+        results = self.loop.run_until_complete(loader.load(self.track_list))
+
+        self.assertFalse(any(_.ok for _ in results[client.endpoint]))
+        self.assertTrue(all(_.ok for endpoint in results
+                            if endpoint != client.endpoint
+                            for _ in results[endpoint]))
+        self.loop.run_until_complete(client.close())
@@ -0,0 +1,130 @@
+"""Tests for the background work of the GUI."""
+import os
+import threading
+import time
+from unittest import TestCase
+
+from igvcontrol import helpers, worker
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestWorker(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = worker.Worker()
+
+    def tearDown(self):
+        self.worker.stop()
+        super().tearDown()
+
+    def events(self, job, timeout=5):
+        """Return the events of job, up to the last one."""
+        events = []
+        start = time.time()
+        while time.time() - start < timeout:
+            events.extend((kind, value) for kind, _, value in
+                          self.worker.poll() if _ is job)
+            if events and events[-1][0] in ("done", "error", "cancelled"):
+                break
+            time.sleep(0.01)
+
+        return events
+
+    def test_jobs_run_in_the_background(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(job):
+            started.set()
+            release.wait(5)
+            return 42
+
+        job = self.worker.submit(slow)
+        self.assertTrue(started.wait(5))
+        self.assertEqual(list(self.worker.poll()), [])
+        release.set()
+
+        self.assertEqual(self.events(job), [("done", 42)])
+
+    def test_errors_are_events(self):
+        job = self.worker.submit(lambda job: 1 / 0)
+
+        kind, error = self.events(job)[0]
+        self.assertEqual(kind, "error")
+        self.assertIsInstance(error, ZeroDivisionError)
+
+    def test_cancelled_jobs_stop_when_they_report(self):
+        cancel = threading.Event()
+
+        def count(job):
+            for i in range(1000):
+                if i == 3:
+                    cancel.set()
+                    time.sleep(0.2)
+                job.report(i, 1000)
+
+        job = self.worker.submit(count)
+        cancel.wait(5)
+        job.cancel()
+
+        events = self.events(job)
+        self.assertEqual(events[-1], ("cancelled", None))
+        self.assertEqual(len(events), 5)
+
+    def test_queued_jobs_can_be_cancelled(self):
+        release = threading.Event()
+        self.worker.submit(lambda job: release.wait(5))
+        job = self.worker.submit(lambda job: 42)
+        job.cancel()
+        release.set()
+
+        self.assertEqual(self.events(job), [("cancelled", None)])
+
+
+class TestLoadVariants(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = worker.Worker()
+
+    def tearDown(self):
+        self.worker.stop()
+        super().tearDown()
+
+    def load(self, paths, step=worker.SCAN_STEP):
+        self.worker.submit(worker.load_variants, paths, None, step)
+        events = []
+        while not events or events[-1][0] not in ("done", "error"):
+            events.extend((kind, value) for kind, _, value in
+                          self.worker.poll())
+            time.sleep(0.01)
+
+        return events
+
+    def test_seekable_files_are_ready_before_being_indexed(self):
+        events = self.load([os.path.join(FILES, "example-4.0.vcf")], step=2)
+
+        self.assertEqual(events[0][0], "ready")
+        self.assertEqual(events[-1], ("done", events[0][1]))
+        progress = [_[1] for _ in events[1:-1]]
+        self.assertEqual(set(_[0] for _ in events[1:-1]), {"progress"})
+        self.assertGreater(len(progress), 1)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], (1, 1))
+        self.assertEqual(len(events[-1][1]), 5)
+
+    def test_other_files_are_read_into_a_store(self):
+        events = self.load([os.path.join(FILES, "example.xls")])
+
+        variants = events[-1][1]
+        self.assertIsInstance(variants, helpers.VariantStore)
+        self.assertEqual(len(variants), 3)
+        self.assertEqual(events, [("done", variants)])
+
+    def test_sets_of_files_report_each_file(self):
+        events = self.load([os.path.join(FILES, "example.tab"),
+                            os.path.join(FILES, "example-4.0.vcf")])
+
+        self.assertEqual(events[:2], [("progress", (1, 2)),
+                                      ("progress", (2, 2))])
+        self.assertEqual(len(events[-1][1]), 8)
@@ -0,0 +1,72 @@
+"""Tests for the streaming XLSX reader."""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from igvcontrol import helpers, xlsx
+
+FILES = os.path.join(os.path.dirname(__file__), "files")
+
+
+class TestColumnNumber(TestCase):
+    def test_letters_are_0_based_columns(self):
+        self.assertEqual([xlsx.column_number(_) for _ in
+                          ("A1", "B7", "Z1", "AA1", "ab12")],
+                         [0, 1, 25, 26, 27])
+
+
+class TestXlsxReader(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.workbook = os.path.join(self.directory, "variants.xlsx")
+        xlsx.write_xlsx(self.workbook, [
+            ("All", [("Chr", "Start"), ("chr1", 100), ("chr2", 200)]),
+            ("Filtered", [("Gene", "Ref", "Chr", "Pos"),
+                          ("TP53", "G", "chr17", 7571115),
+                          (None, None, 3, 12.0),
+                          ("BRCA2", "A")])])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reads_the_shared_strings_like_xlrd(self):
+        reader = xlsx.XlsxReader(os.path.join(FILES, "example.xlsx"))
+
+        self.assertEqual(reader.sheet_names, ["example"])
+        self.assertEqual(list(reader.rows())[:2],
+                         [("Chr", "Start", "End", "Ref", "Alt"),
+                          ("chr1", "7571115", "7571115", "G", "C")])
+
+    def test_reads_sheets_by_name_or_number(self):
+        reader = xlsx.XlsxReader(self.workbook)
+
+        self.assertEqual(reader.sheet_names, ["All", "Filtered"])
+        self.assertEqual(list(reader.rows(1)), list(reader.rows("Filtered")))
+        self.assertEqual(list(reader.rows())[1], ("chr1", "100"))
+
+    def test_missing_cells_are_empty(self):
+        rows = list(xlsx.XlsxReader(self.workbook).rows("Filtered"))
+
+        self.assertEqual(rows[2], ("", "", "3", "12.0"))
+        self.assertEqual(rows[3], ("BRCA2", "A"))
+
+    def test_picks_columns(self):
+        rows = list(xlsx.XlsxReader(self.workbook).rows("Filtered",
+                                                        columns=(2, 3)))
+
+        self.assertEqual(rows, [("Chr", "Pos"), ("chr17", "7571115"),
+                                ("3", "12.0"), ("", "")])
+
+    def test_variants_read_sheet_and_columns(self):
+        variants = helpers.Variants(self.workbook, sheet="Filtered",
+                                    columns=(2, 3))
+
+        self.assertEqual(list(variants)[:2],
+                         [("chr17", "7571115"), ("3", "12")])
+
+    def test_variants_in_xls_read_sheet_and_columns(self):
+        variants = helpers.Variants(os.path.join(FILES, "example.xls"),
+                                    sheet="example", columns=(0, 2))
+
+        self.assertEqual(list(variants)[0], ("chr1", "7571115"))
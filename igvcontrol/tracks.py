@@ -0,0 +1,181 @@
+"""Load the genome and tracks of a review into one or several IGVs."""
+import asyncio
+from collections import namedtuple
+import os
+
+try:
+    from igvcontrol import helpers, policy
+except ImportError:
+    import helpers
+    import policy
+
+# Files listing tracks rather than being one.
+MANIFEST_SUFFIXES = (".txt", ".list", ".tracks")
+# Loaded with "genome", which replaces the genome and drops every track.
+GENOME_SUFFIXES = (".genome", ".fa", ".fasta", ".fa.gz", ".fasta.gz",
+                   ".2bit", ".json")
+
+Track = namedtuple("Track", ["verb", "path", "options"])
+
+
+def parse_track(line):
+    """Return the Track in a line of a manifest, or None for a comment.
+
+    A line is a path or URL, optionally followed by options of the IGV
+    load command: "tumour.bam index=tumour.bai name=Tumour". Genomes, by
+    their suffix or with a "genome" first word ("genome hg38"), come
+    before the tracks, as loading them drops the tracks loaded.
+    """
+    words = line.split("#", 1)[0].split()
+    if not words:
+        return None
+
+    verb = "load"
+    if words[0] == "genome" and len(words) > 1:
+        verb, words = "genome", words[1:]
+    elif words[0].lower().endswith(GENOME_SUFFIXES):
+        verb = "genome"
+
+    return Track(verb, words[0], tuple(words[1:]))
+
+
+def path_track(path):
+    """Return the Track of a path given on its own, spaces and "#" kept."""
+    verb = "genome" if path.lower().endswith(GENOME_SUFFIXES) else "load"
+
+    return Track(verb, path, ())
+
+
+def resolve(track, directory="."):
+    """Return track with its path, if relative, made absolute from directory.
+
+    URLs and genome ids ("hg38") are left as they are.
+    """
+    path = os.path.expanduser(track.path)
+    if "://" in path:
+        return track
+    path = os.path.abspath(os.path.join(directory, path))
+    if track.verb == "genome" and not os.path.exists(path):
+        return track
+
+    return track._replace(path=path)
+
+
+def read_tracks(paths):
+    """Return the Tracks in paths, which are tracks or manifests of them.
+
+    Paths given are whole paths, while the lines of a manifest are split
+    (see parse_track), with paths relative to it. Tracks appearing twice are
+    only loaded once, and the genome, if any, goes first.
+    """
+    tracks = []
+    for path in paths:
+        if not path.lower().endswith(MANIFEST_SUFFIXES):
+            tracks.append(resolve(path_track(path)))
+            continue
+        directory = os.path.dirname(os.path.abspath(path))
+        with open(path) as manifest:
+            for line in manifest:
+                track = parse_track(line)
+                if track is not None:
+                    tracks.append(resolve(track, directory))
+
+    unique = {}
+    for track in tracks:
+        unique.setdefault(track.path, track)
+
+    return sorted(unique.values(), key=lambda _: _.verb != "genome")
+
+
+def track_command(track):
+    """Return the IGV command loading track, quoting a path with spaces."""
+    path = '"{}"'.format(track.path) if " " in track.path else track.path
+
+    return " ".join((track.verb, path) + track.options)
+
+
+class TrackLoader():
+
+    """Load tracks into every IGV of some controllers, once each.
+
+    controllers are asyncigv.AsyncIGVs or IGVGroups. Every IGV loads the
+    tracks one after the other, as IGV does one command at a time, but the
+    IGVs load them at the same time::
+
+        >>> loader = TrackLoader(IGVGroup([AsyncIGV(port=60151),
+        ...                                AsyncIGV(port=60152)]))
+        >>> await loader.load(read_tracks(["samples.txt"]))
+        {'localhost:60151': [CommandResult(...), ...], ...}
+
+    The tracks loaded into each IGV are kept in loaded, and not sent again.
+    Loading a genome forgets them, as IGV drops them too. Each load gets
+    timeout seconds or, without it, what the policy of the client says
+    (policy.DEFAULT_TIMEOUTS if it has none): loads are never retried, as
+    that would add the track twice.
+    """
+
+    def __init__(self, *controllers, timeout=None):
+        self.clients = [client for controller in controllers
+                        for client in getattr(controller, "clients",
+                                              [controller])]
+        self.timeout = timeout
+        self.loaded = dict((_.endpoint, set()) for _ in self.clients)
+
+    async def load(self, tracks):
+        """Load tracks into the IGVs, and return what each of them said.
+
+        The CommandResults of the tracks sent to each IGV are returned by
+        endpoint. An IGV failing to answer, or hanging up, gets "ERROR" and
+        the error.
+        """
+        results = await asyncio.gather(
+            *[self._load_into(_, tracks) for _ in self.clients])
+
+        return dict((client.endpoint, result)
+                    for client, result in zip(self.clients, results))
+
+    async def _load_into(self, client, tracks):
+        timeout = self.timeout
+        if timeout is None and client.policy is None and \
+                client.timeout is None:
+            timeout = policy.DEFAULT_TIMEOUTS["load"]
+
+        results = []
+        loaded = self.loaded[client.endpoint]
+        for track in tracks:
+            if track.path in loaded:
+                continue
+            command = track_command(track)
+            try:
+                response = await client.command(command, timeout)
+            except (OSError, EOFError) as error:
+                response = "ERROR {}".format(error)
+            ok = helpers.is_ok(response)
+            results.append(helpers.CommandResult(command, response, ok))
+            if ok:
+                if track.verb == "genome":
+                    loaded.clear()
+                loaded.add(track.path)
+
+        return results
+
+
+def summary(results, tracks, seconds):
+    """Return the lines telling how loading tracks went, for the user."""
+    sent = sum(len(_) for _ in results.values())
+    failed = [(endpoint, _) for endpoint, endpoint_results in results.items()
+              for _ in endpoint_results if not _.ok]
+    lines = ["Loaded {} tracks in {:.1f} s".format(sent - len(failed),
+                                                   seconds)]
+    skipped = len(tracks) * len(results) - sent
+    if skipped:
+        lines[0] += ", {} already there".format(skipped)
+    if failed:
+        lines[0] += ", {} failed".format(len(failed))
+
+    for endpoint, result in failed:
+        lines.append("  {} {}: {}".format(endpoint, result.command,
+                                          result.response))
+
+    return lines
+
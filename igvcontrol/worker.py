@@ -0,0 +1,141 @@
+"""Run slow work off the Tk main loop, and hand its events back to it."""
+import queue
+import threading
+
+try:
+    from igvcontrol import helpers
+except ImportError:
+    import helpers
+
+# Lines indexed between two progress reports while scanning a file.
+SCAN_STEP = 20000
+
+
+class Cancelled(Exception):
+
+    """Raised inside a job that was cancelled, to stop it."""
+
+
+class Job():
+
+    """A function run by a Worker, with a way to report and be stopped.
+
+    The function gets the job as its first argument. job.report() posts its
+    progress, and raises Cancelled once job.cancel() has been called, so
+    a long loop only has to report from time to time to be cancellable.
+    """
+
+    def __init__(self, worker, function, args):
+        self.worker = worker
+        self.function = function
+        self.args = args
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Ask the job to stop the next time it reports or checks."""
+        self._cancelled.set()
+
+    def check(self):
+        """Raise Cancelled if the job was cancelled."""
+        if self.cancelled:
+            raise Cancelled()
+
+    def post(self, kind, value=None):
+        """Hand a (kind, job, value) event to the thread polling."""
+        self.worker.events.put((kind, self, value))
+
+    def report(self, done, total=None):
+        """Post a "progress" event with (done, total), then check."""
+        self.post("progress", (done, total))
+        self.check()
+
+
+class Worker():
+
+    """Run jobs one after the other in a background thread.
+
+    Jobs don't touch the caller's objects: they post events to a queue
+    that the caller polls, from the Tk main loop with after()::
+
+        >>> worker = Worker()
+        >>> job = worker.submit(load_variants, ["calls.vcf"])
+        >>> for kind, job, value in worker.poll():
+        ...     print(kind, value)
+        progress (0.25, 1)
+
+    Every job ends with a "done" event holding what it returned, an
+    "error" one holding the exception it raised, or a "cancelled" one.
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """Queue function(job, *args) and return its Job."""
+        job = Job(self, function, args)
+        self.jobs.put(job)
+
+        return job
+
+    def poll(self):
+        """Yield the events posted so far, without waiting for more."""
+        while True:
+            try:
+                yield self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def stop(self):
+        """Let the job running end, and drop those queued."""
+        self.jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            try:
+                job.check()
+                result = job.function(job, *job.args)
+            except Cancelled:
+                job.post("cancelled")
+            except Exception as error:
+                job.post("error", error)
+            else:
+                job.post("done", result)
+
+
+def load_variants(job, paths, cache=None, step=SCAN_STEP):
+    """Return the variants in paths, reporting the progress of job.
+
+    Files read as needed post a "ready" event with the Variants as soon as
+    they are open, so the first ones can be viewed while the rest of the
+    file is indexed to count them. Progress is the fraction of the file
+    indexed (total 1), the variants read (no total), or the files read
+    (total the number of files).
+    """
+    if len(paths) > 1:
+        return helpers.VariantSet(paths, cache=cache, progress=job.report)
+
+    variants = helpers.Variants(paths[0], cache=cache)
+    if not variants.seekable:
+        return variants.to_store(progress=job.report)
+
+    # Built before the GUI gets the variants, so both threads share the one
+    # LineIndex, whose lock keeps its scans apart.
+    index = variants.index
+    job.post("ready", variants)
+    while not index.complete:
+        index.scan(index.indexed + step)
+        job.report(index.progress, 1)
+
+    return variants
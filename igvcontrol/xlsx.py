@@ -0,0 +1,211 @@
+"""Stream the rows of an XLSX sheet without loading the workbook.
+
+write_xlsx writes the small workbooks of the tests and benchmarks.
+"""
+import posixpath
+import re
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+import zipfile
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+MAIN = "{" + MAIN_NS + "}"
+RELS = "{" + RELS_NS + "}"
+R_ID = "{" + R_NS + "}id"
+# Of the workbooks written by write_xlsx.
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels"
+ ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+</Types>"""
+
+
+def column_number(reference):
+    """Return the 0-based column of a cell reference: "C12" gives 2."""
+    number = 0
+    for letter in re.match(r"[A-Za-z]*", reference).group().upper():
+        number = number * 26 + ord(letter) - 64
+
+    return number - 1
+
+
+def column_letters(number):
+    """Return the letters of the 0-based column number: 2 gives "C"."""
+    letters = ""
+    number += 1
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+
+    return letters
+
+
+class XlsxReader():
+
+    """Read the rows of an XLSX sheet as the file is decompressed.
+
+    The sheet XML is parsed as a stream, and each row is dropped once
+    yielded, so memory stays flat however long the sheet. Only the shared
+    strings table is held in memory::
+
+        >>> reader = XlsxReader("variants.xlsx")
+        >>> reader.sheet_names
+        ['Sheet1', 'Filtered']
+        >>> for row in reader.rows("Filtered", columns=(0, 1)):
+        ...     print(row)
+        ('Chr', 'Start')
+        ('chr1', '7571115')
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with zipfile.ZipFile(filename) as book:
+            self.sheets = self._sheets(book)
+            self.shared_strings = self._shared_strings(book)
+
+    @property
+    def sheet_names(self):
+        return [_[0] for _ in self.sheets]
+
+    def rows(self, sheet=0, columns=None):
+        """Yield the rows of sheet (name or index) as tuples of strings.
+
+        Empty cells are "". With columns (0-based), only those are given.
+        """
+        if isinstance(sheet, int):
+            path = self.sheets[sheet][1]
+        else:
+            path = dict(self.sheets)[sheet]
+
+        with zipfile.ZipFile(self.filename) as book:
+            with book.open(path) as sheet_xml:
+                for row in self._rows(sheet_xml):
+                    if columns is not None:
+                        row = [row[_] if _ < len(row) else ""
+                               for _ in columns]
+                    yield tuple(row)
+
+    def _rows(self, sheet_xml):
+        sheet_data = None
+        row = []
+        for event, element in iterparse(sheet_xml, events=("start", "end")):
+            if event == "start":
+                if element.tag == MAIN + "sheetData":
+                    sheet_data = element
+                continue
+
+            if element.tag == MAIN + "c":
+                reference = element.get("r")
+                if reference:
+                    row.extend([""] * (column_number(reference) - len(row)))
+                row.append(self._value(element))
+            elif element.tag == MAIN + "row":
+                yield row
+                row = []
+                # Drop the parsed rows, so memory doesn't grow.
+                sheet_data.clear()
+
+    def _value(self, cell):
+        kind = cell.get("t")
+        if kind == "inlineStr":
+            return "".join(_.text or "" for _ in cell.iter(MAIN + "t"))
+
+        value = cell.find(MAIN + "v")
+        if value is None or value.text is None:
+            return ""
+        if kind == "s":
+            return self.shared_strings[int(value.text)]
+
+        return value.text
+
+    @staticmethod
+    def _sheets(book):
+        """Return [(name, path in the zip)] for the sheets, in order."""
+        targets = {}
+        with book.open("xl/_rels/workbook.xml.rels") as rels:
+            for _, element in iterparse(rels):
+                if element.tag == RELS + "Relationship":
+                    target = element.get("Target")
+                    if target.startswith("/"):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(
+                            posixpath.join("xl", target))
+                    targets[element.get("Id")] = target
+
+        sheets = []
+        with book.open("xl/workbook.xml") as workbook:
+            for _, element in iterparse(workbook):
+                if element.tag == MAIN + "sheet":
+                    sheets.append((element.get("name"),
+                                   targets[element.get(R_ID)]))
+
+        return sheets
+
+    @staticmethod
+    def _shared_strings(book):
+        strings = []
+        try:
+            shared = book.open("xl/sharedStrings.xml")
+        except KeyError:
+            return strings
+
+        with shared:
+            events = iterparse(shared, events=("start", "end"))
+            _, root = next(events)
+            for event, element in events:
+                if event == "end" and element.tag == MAIN + "si":
+                    strings.append("".join(
+                        _.text or "" for _ in element.iter(MAIN + "t")))
+                    root.clear()
+
+        return strings
+
+
+def write_xlsx(filename, sheets):
+    """Write a minimal workbook with sheets, a list of (name, rows).
+
+    Numbers are stored as numbers, strings as inline strings and None as a
+    missing cell.
+    """
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as book:
+        book.writestr("[Content_Types].xml", CONTENT_TYPES)
+        book.writestr("xl/workbook.xml", (
+            '<workbook xmlns="{}" xmlns:r="{}"><sheets>{}</sheets>'
+            '</workbook>').format(MAIN_NS, R_NS, "".join(
+                '<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(
+                    escape(name), i + 1, i + 1)
+                for i, (name, _) in enumerate(sheets))))
+        book.writestr("xl/_rels/workbook.xml.rels", (
+            '<Relationships xmlns="{}">{}</Relationships>').format(
+                RELS_NS, "".join(
+                    '<Relationship Id="rId{0}" Type="{1}/worksheet" '
+                    'Target="worksheets/sheet{0}.xml"/>'.format(i + 1, R_NS)
+                    for i in range(len(sheets)))))
+
+        for i, (_, rows) in enumerate(sheets):
+            with book.open("xl/worksheets/sheet{}.xml".format(i + 1),
+                           "w") as sheet:
+                sheet.write('<worksheet xmlns="{}"><sheetData>'.format(
+                    MAIN_NS).encode("utf-8"))
+                for number, row in enumerate(rows):
+                    cells = []
+                    for column, value in enumerate(row):
+                        reference = "{}{}".format(column_letters(column),
+                                                  number + 1)
+                        if value is None:
+                            continue
+                        elif isinstance(value, str):
+                            cells.append(
+                                '<c r="{}" t="inlineStr"><is><t>{}</t></is>'
+                                '</c>'.format(reference, escape(value)))
+                        else:
+                            cells.append('<c r="{}"><v>{}</v></c>'.format(
+                                reference, value))
+                    sheet.write('<row r="{}">{}</row>'.format(
+                        number + 1, "".join(cells)).encode("utf-8"))
+                sheet.write(b"</sheetData></worksheet>")
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+from setuptools import setup
 
 setup(name='IGVControl',
       version='0.2',
@@ -9,4 +9,15 @@ setup(name='IGVControl',
       author_email='xbello@gmail.com',
       url='https://github.com/xbello/igvcontrol',
       packages=['igvcontrol'],
+      # asyncio with all_tasks and current_task.
+      python_requires='>=3.7',
+      classifiers=[
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3 :: Only',
+          'Programming Language :: Python :: 3.7',
+          'Programming Language :: Python :: 3.8',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
+      ],
       )